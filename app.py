@@ -1,21 +1,211 @@
-from flask import Flask, render_template, request, jsonify, session, send_file # Добавляем send_file
+from flask import Flask, render_template, request, jsonify, session, send_file, Response, stream_with_context, g # Добавляем send_file
+import os
 import json
 import logging
 import io
-from models.llm_client import OllamaClient
-from models.ability_generator import AbilityGenerator
+import threading
+import time
+import uuid
+from models.llm_client import (get_client, set_response_cache, get_response_cache, set_single_flight, get_single_flight,
+                               set_limiter_factory, get_limiter_stats)
+from models.response_cache import ResponseCache
+from models.single_flight import SingleFlight
+from models.concurrency_limiter import AdaptiveLimiter, OverloadedError
+from models.response_parser import get_parse_stats
+from models.model_profiles import get_model_registry, UnknownProfileError
+from models.metrics import registry as metrics_registry, REQUEST_DURATION
+from models.tracing import configure_logging, set_trace_id, trace_id_from_header
+from models.ability_generator import AbilityGenerator, max_request_concurrency
+from models.state_store import create_state_store
+from models.job_queue import JobQueue, QueueFullError, create_job_store
+from models.alternates_pool import AlternatesPool
+from models.project_store import create_project_store, ProjectConflictError
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+# Настройка логирования (run.py настраивает его сам; LOG_FORMAT=json - структурированные логи)
+if not logging.getLogger().handlers:
+    configure_logging(json_format=os.environ.get('LOG_FORMAT') == 'json')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.secret_key = 'ability_generator_secret_key_2025'
 
+# Кэш ответов LLM включается переменной окружения LLM_CACHE=1
+if os.environ.get('LLM_CACHE', '').lower() in ('1', 'true', 'yes'):
+    set_response_cache(ResponseCache(
+        max_entries=int(os.environ.get('LLM_CACHE_SIZE', 1024)),
+        ttl=float(os.environ.get('LLM_CACHE_TTL', 24 * 3600)),
+        db_path=os.environ.get('LLM_CACHE_DB') or None
+    ))
+
+# Одинаковые одновременные запросы к LLM объединяются (LLM_SINGLE_FLIGHT=0 - выключить),
+# неудачный ответ повторно не запрашивается LLM_NEGATIVE_TTL секунд
+if os.environ.get('LLM_SINGLE_FLIGHT', '1').lower() not in ('0', 'false', 'no'):
+    set_single_flight(SingleFlight(negative_ttl=float(os.environ.get('LLM_NEGATIVE_TTL', 5)),
+                                   transient_errors=(OverloadedError,)))
+
+# Адаптивный лимит одновременных запросов к каждому серверу Ollama (LLM_LIMITER=0 - выключить):
+# сверх лимита запросы ждут слот до LLM_QUEUE_TIMEOUT секунд, при заполненной очереди - ответ 503
+if os.environ.get('LLM_LIMITER', '1').lower() not in ('0', 'false', 'no'):
+    set_limiter_factory(lambda url: AdaptiveLimiter(
+        name=url,
+        initial_limit=float(os.environ.get('LLM_LIMIT_INITIAL', 4)),
+        min_limit=int(os.environ.get('LLM_LIMIT_MIN', 1)),
+        max_limit=int(os.environ.get('LLM_LIMIT_MAX', 32)),
+        max_queue=int(os.environ.get('LLM_QUEUE_SIZE', 64)),
+        max_wait=float(os.environ.get('LLM_QUEUE_TIMEOUT', 10))
+    ))
+
 # Инициализация компонентов
-llm_client = OllamaClient()
+llm_client = get_client()
+
+# Профили моделей (MODEL_PROFILES - JSON-файл)
+model_registry = get_model_registry()
+# Таймаут соединения проверки профилей при запуске, сек
+PROFILE_CHECK_CONNECT_TIMEOUT = float(os.environ.get('PROFILE_CHECK_CONNECT_TIMEOUT', 1))
+
+
+def validate_model_profiles():
+    """
+    Проверяет, что модели профилей есть на сервере. Выполняется в фоне при запуске:
+    недоступный Ollama не задерживает импорт приложения (короткий таймаут, без повторов)
+    """
+    available_models = llm_client.get_available_models(connect_timeout=PROFILE_CHECK_CONNECT_TIMEOUT, retry=False)
+    if available_models:
+        model_registry.validate(available_models)
+    else:
+        logger.warning("Ollama is not available, model profiles were not checked")
+
+
+threading.Thread(target=validate_model_profiles, daemon=True, name='model-profiles-check').start()
+# Генератор без состояния - только для предпросмотра (LLM не используется)
 ability_generator = AbilityGenerator(llm_client)
 
+# Состояние генерации по сессиям/проектам: STATE_STORE=memory | sqlite:<файл> | file:<каталог>
+state_store = create_state_store(
+    os.environ.get('STATE_STORE', 'memory'),
+    max_sessions=int(os.environ.get('STATE_STORE_SIZE', 1000))
+)
+
+# Проекты на сервере: PROJECT_STORE=sqlite:<файл>, PROJECT_COMPRESS_MIN - с какого размера (байт) сжимать
+project_store = create_project_store(
+    os.environ.get('PROJECT_STORE', 'sqlite:saved_projects/projects.db'),
+    compress_min_size=int(os.environ.get('PROJECT_COMPRESS_MIN', 4096))
+)
+
+# Фоновые задачи генерации: JOB_WORKERS - одновременных задач, JOB_QUEUE_SIZE - предел очереди,
+# JOB_STORE=memory | sqlite:<файл> - где хранить состояние задач (sqlite - общее для всех воркеров)
+job_queue = JobQueue(
+    max_workers=int(os.environ.get('JOB_WORKERS', 2)),
+    max_queue=int(os.environ.get('JOB_QUEUE_SIZE', 50)),
+    store=create_job_store(os.environ.get('JOB_STORE', 'memory'))
+)
+
+# Заранее сгенерированные альтернативы для /regenerate_ability: ALTERNATES_POOL_SIZE - альтернатив
+# на способность (0 - выключено), ALTERNATES_IDLE_THRESHOLD - сколько запросов к серверу допускается
+# при фоновой генерации
+alternates_size = int(os.environ.get('ALTERNATES_POOL_SIZE', 0))
+alternates_pool = AlternatesPool(
+    size=alternates_size,
+    idle_threshold=int(os.environ.get('ALTERNATES_IDLE_THRESHOLD', 0)),
+    max_sessions=int(os.environ.get('ALTERNATES_MAX_SESSIONS', 200))
+) if alternates_size > 0 else None
+
+def get_profile(data: dict):
+    """
+    Профиль моделей из запроса (None - профиль default)
+    """
+    profile = data.get('profile') or None
+    if profile is not None and profile not in model_registry.names():
+        raise UnknownProfileError(f"Неизвестный профиль моделей '{profile}'")
+    return profile
+
+def get_concurrency(data: dict):
+    """
+    Число одновременных запросов к Ollama из запроса (None - по умолчанию),
+    не больше max_request_concurrency()
+    """
+    concurrency = data.get('concurrency')
+    if concurrency is None:
+        return None
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        raise ValueError('Поле concurrency должно быть целым числом не меньше 1')
+    return min(concurrency, max_request_concurrency())
+
+def overloaded_response(error: OverloadedError):
+    """
+    Ответ 503 с Retry-After, когда сервер Ollama перегружен
+    """
+    return jsonify({
+        'status': 'error',
+        'message': 'Сервер генерации перегружен, повторите позже',
+        'retry_after': error.retry_after
+    }), 503, {'Retry-After': str(error.retry_after)}
+
+def get_session_id(data: dict) -> str:
+    """
+    Идентификатор состояния генерации: project_id из запроса,
+    иначе идентификатор, сохраненный в cookie-сессии браузера
+    """
+    project_id = data.get('project_id')
+    if project_id:
+        return f'project:{project_id}'
+    if 'generation_id' not in session:
+        session['generation_id'] = uuid.uuid4().hex
+    return f"session:{session['generation_id']}"
+
+def previous_abilities(data: dict, session_id: str):
+    """
+    Прежние способности сессии для инкрементальной генерации (поле incremental):
+    к LLM уходят только способности с изменённой конфигурацией
+    """
+    if not data.get('incremental'):
+        return None
+    return (state_store.get(session_id) or {}).get('abilities')
+
+def save_state(session_id: str, **fields) -> None:
+    """
+    Обновляет состояние сессии; прежнее описание персонажа остаётся -
+    его актуальность проверяется по отпечатку способностей
+    """
+    state = state_store.get(session_id) or {}
+    state.update(fields)
+    state_store.set(session_id, state)
+
+def prefetch_alternates(session_id: str, concept: str, abilities: list, llm_client, profile) -> None:
+    """
+    Ставит в фон генерацию альтернатив для способностей сессии (если пул альтернатив включён)
+    """
+    if alternates_pool is not None:
+        alternates_pool.prefetch(session_id, concept, abilities, llm_client, profile)
+
+@app.before_request
+def start_trace():
+    """Идентификатор трассировки запроса (из заголовка X-Request-ID или новый) для логов и метрик"""
+    g.trace_id = trace_id_from_header(request.headers.get('X-Request-ID'))
+    g.started_at = time.perf_counter()
+    set_trace_id(g.trace_id)
+
+@app.after_request
+def finish_trace(response):
+    """Длительность запроса в метрики и trace_id в заголовок ответа"""
+    if 'started_at' in g:
+        REQUEST_DURATION.observe(time.perf_counter() - g.started_at,
+                                 endpoint=request.url_rule.rule if request.url_rule else 'unknown',
+                                 method=request.method,
+                                 status=response.status_code)
+        response.headers['X-Trace-Id'] = g.trace_id
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    """Сбрасывает trace_id, чтобы он не попал в логи следующего запроса этого потока"""
+    set_trace_id(None)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Метрики процесса в текстовом формате Prometheus"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def index():
     """Главная страница"""
@@ -28,23 +218,26 @@ def test_llm():
         # Get URL from request or use default
         if request.method == 'POST':
             data = request.get_json() or {}
-            ollama_url = data.get('url', 'http://localhost:11434')
+            ollama_url = data.get('url')
         else:
-            ollama_url = 'http://localhost:11434'
+            ollama_url = None
         
-        # Create temporary client with the specified URL
-        from models.llm_client import OllamaClient
-        temp_client = OllamaClient(url=ollama_url)
+        # Shared pooled client for the specified URL
+        temp_client = get_client(ollama_url)
         
         is_connected = temp_client.test_connection()
         if is_connected:
             models = temp_client.get_available_models()
-            return jsonify({
+            result = {
                 'status': 'success',
                 'connected': True,
                 'models': models,
                 'message': 'Соединение с Ollama успешно'
-            })
+            }
+            # Для пула серверов - состояние каждого узла
+            if hasattr(temp_client, 'backend_status'):
+                result['backends'] = temp_client.backend_status()
+            return jsonify(result)
         else:
             return jsonify({
                 'status': 'error',
@@ -74,6 +267,27 @@ def preview_ability():
             'message': f'Ошибка создания предварительного просмотра: {str(e)}'
         })
 
+@app.route('/preview_ability_batch', methods=['POST'])
+def preview_ability_batch():
+    """Пакетный предпросмотр: распределение параметров способности по множеству выборок"""
+    try:
+        data = request.json or {}
+        preview = ability_generator.get_ability_preview_batch(
+            data.get('config', {}),
+            samples=data.get('samples', 1000),
+            bins=data.get('bins', 20),
+            include_values=bool(data.get('include_values', False))
+        )
+        return jsonify({
+            'status': 'success',
+            'preview': preview
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Ошибка создания предварительного просмотра: {str(e)}'
+        })
+
 @app.route('/generate_abilities', methods=['POST'])
 def generate_abilities():
     """Генерация способностей"""
@@ -95,24 +309,39 @@ def generate_abilities():
             })
         
         # Получаем URL из настроек (если передан)
-        ollama_url = data.get('ollama_url', 'http://localhost:11434')
+        ollama_url = data.get('ollama_url')
+        
+        concurrency = get_concurrency(data)
         
-        # Создаем временный клиент с правильным URL
-        from models.llm_client import OllamaClient
-        temp_llm_client = OllamaClient(url=ollama_url)
+        # Берем общий клиент (с пулом соединений) для этого URL
+        temp_llm_client = get_client(ollama_url)
         
-        # Создаем временный генератор с правильным клиентом
-        temp_generator = AbilityGenerator(temp_llm_client)
+        # Создаем временный генератор с правильным клиентом и профилем моделей
+        temp_generator = AbilityGenerator(temp_llm_client, profile=get_profile(data))
         
-        # Генерируем способности
-        abilities = temp_generator.generate_abilities(concept, ability_configs)
+        # Генерируем способности (concurrency - сколько запросов к Ollama выполнять одновременно)
+        # batch - несколько способностей в одном запросе к Ollama,
+        # incremental - неизменённые способности берутся из прежнего результата
+        session_id = get_session_id(data)
+        previous = previous_abilities(data, session_id)
+        abilities = temp_generator.generate_abilities(concept, ability_configs,
+                                                      max_workers=concurrency,
+                                                      batch=data.get('batch'),
+                                                      previous=previous)
+        
+        # Сохраняем результат для перегенерации и описания персонажа
+        save_state(session_id, concept=concept, abilities=abilities)
+        prefetch_alternates(session_id, concept, abilities, temp_llm_client, temp_generator.profile)
         
         return jsonify({
             'status': 'success',
             'abilities': abilities,
+            'reused': temp_generator.reused_abilities,
             'message': f'Успешно сгенерировано {len(abilities)} способностей'
         })
         
+    except OverloadedError as e:
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error generating abilities: {str(e)}")
         return jsonify({
@@ -120,6 +349,84 @@ def generate_abilities():
             'message': f'Ошибка генерации способностей: {str(e)}'
         })
 
+@app.route('/generate_abilities_stream', methods=['POST'])
+def generate_abilities_stream():
+    """
+    Потоковая генерация способностей (NDJSON).
+    Каждая строка ответа - отдельное событие: start, ability, error, progress, done.
+    """
+    data = request.json or {}
+    concept = data.get('concept', '')
+    ability_configs = data.get('abilities', [])
+    
+    if not concept:
+        return jsonify({
+            'status': 'error',
+            'message': 'Описание концепции персонажа обязательно'
+        })
+    
+    if not ability_configs:
+        return jsonify({
+            'status': 'error',
+            'message': 'Необходимо указать хотя бы одну способность'
+        })
+    
+    try:
+        profile = get_profile(data)
+        concurrency = get_concurrency(data)
+        client = get_client(data.get('ollama_url'))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        })
+    
+    temp_generator = AbilityGenerator(client, profile=profile)
+    total = len(ability_configs)
+    # Определяем сессию до начала потока, чтобы cookie успела попасть в заголовки ответа
+    session_id = get_session_id(data)
+    previous = previous_abilities(data, session_id)
+    
+    def event(payload):
+        return json.dumps(payload, ensure_ascii=False) + '\n'
+    
+    def generate():
+        yield event({'event': 'start', 'total': total})
+        completed = 0
+        abilities = [None] * total
+        try:
+            for index, ability in temp_generator.iter_abilities(concept, ability_configs,
+                                                                max_workers=concurrency,
+                                                                batch=data.get('batch'),
+                                                                previous=previous):
+                completed += 1
+                abilities[index] = ability
+                if 'error' in ability:
+                    yield event({'event': 'error', 'index': index,
+                                 'message': f"Ошибка генерации способности: {ability['error']}"})
+                yield event({'event': 'ability', 'index': index, **ability})
+                yield event({'event': 'progress', 'completed': completed, 'total': total})
+        except OverloadedError as e:
+            yield event({'event': 'error', 'message': 'Сервер генерации перегружен, повторите позже',
+                         'retry_after': e.retry_after})
+        except Exception as e:
+            logger.error(f"Error streaming abilities: {str(e)}")
+            yield event({'event': 'error', 'message': f'Ошибка генерации способностей: {str(e)}'})
+        
+        if completed == total:
+            save_state(session_id, concept=concept, abilities=abilities)
+            prefetch_alternates(session_id, concept, abilities, temp_generator.llm_client, profile)
+        yield event({
+            'event': 'done',
+            'completed': completed,
+            'total': total,
+            'reused': temp_generator.reused_abilities,
+            'message': f'Успешно сгенерировано {completed} способностей'
+        })
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/regenerate_ability/<int:ability_index>', methods=['POST'])
 def regenerate_ability(ability_index):
     """Перегенерация конкретной способности"""
@@ -134,27 +441,41 @@ def regenerate_ability(ability_index):
             })
         
         # Получаем URL из настроек (если передан)
-        ollama_url = data.get('ollama_url', 'http://localhost:11434')
-        
-        # Создаем временный клиент с правильным URL
-        from models.llm_client import OllamaClient
-        temp_llm_client = OllamaClient(url=ollama_url)
+        ollama_url = data.get('ollama_url')
         
-        # Создаем временный генератор с правильным клиентом
-        temp_generator = AbilityGenerator(temp_llm_client)
+        # Ранее сгенерированные способности этой сессии
+        session_id = get_session_id(data)
+        state = state_store.get(session_id)
+        if not state:
+            return jsonify({
+                'status': 'error',
+                'message': 'Способности еще не сгенерированы'
+            })
         
-        # Сначала генерируем способности, чтобы получить исходные данные
-        # Получаем данные о ранее сгенерированных способностях из сессии или другого источника
-        # Для простоты используем существующий генератор и обновляем его клиент
-        global ability_generator
-        ability_generator.llm_client = temp_llm_client
+        # Создаем временный генератор с общим клиентом для этого URL
+        profile = get_profile(data)
+        temp_generator = AbilityGenerator(get_client(ollama_url), profile=profile)
+        temp_generator.generated_abilities = state['abilities']
         
-        updated_ability = ability_generator.regenerate_ability_description(ability_index, concept)
+        # Готовая альтернатива из пула - без запроса к LLM (пул дополняется в фоне)
+        abilities = state['abilities']
+        alternate = None
+        if alternates_pool is not None and 0 <= ability_index < len(abilities):
+            alternate = alternates_pool.take(session_id, ability_index, abilities[ability_index], concept, profile)
+        if alternate:
+            updated_ability = abilities[ability_index]
+            updated_ability.update(name=alternate['name'], description=alternate['description'])
+        else:
+            updated_ability = temp_generator.regenerate_ability_description(ability_index, concept)
         
         if updated_ability != {}:
+            state['abilities'] = temp_generator.generated_abilities
+            state_store.set(session_id, state)
+            prefetch_alternates(session_id, concept, state['abilities'], temp_generator.llm_client, profile)
             return jsonify({
                 'status': 'success',
                 'ability': updated_ability,
+                'prefetched': bool(alternate),
                 'message': 'Способность успешно перегенерирована'
             })
         else:
@@ -163,6 +484,8 @@ def regenerate_ability(ability_index):
                 'message': 'Не удалось перегенерировать способность'
             })
             
+    except OverloadedError as e:
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error regenerating ability: {str(e)}")
         return jsonify({
@@ -178,21 +501,28 @@ def generate_summary():
         concept = data.get('concept', '')
         
         # Получаем URL из настроек (если передан)
-        ollama_url = data.get('ollama_url', 'http://localhost:11434')
+        ollama_url = data.get('ollama_url')
         
-        # Обновляем клиент глобального генератора
-        from models.llm_client import OllamaClient
-        temp_llm_client = OllamaClient(url=ollama_url)
-        global ability_generator
-        ability_generator.llm_client = temp_llm_client
+        # Генератор с общим клиентом и способностями этой сессии
+        session_id = get_session_id(data)
+        state = state_store.get(session_id) or {}
+        temp_generator = AbilityGenerator(get_client(ollama_url), profile=get_profile(data))
+        temp_generator.generated_abilities = state.get('abilities', [])
         
-        summary = ability_generator.generate_character_summary(concept)
+        # Прежнее описание переиспользуется, если способности не изменились (force - сгенерировать заново)
+        previous = None if data.get('force') else state.get('summary')
+        summary = temp_generator.generate_character_summary(concept, previous)
+        if temp_generator.summary_fingerprint is not None:
+            state['summary'] = {'summary': summary, 'fingerprint': temp_generator.summary_fingerprint}
+            state_store.set(session_id, state)
         
         return jsonify({
             'status': 'success',
             'summary': summary
         })
         
+    except OverloadedError as e:
+        return overloaded_response(e)
     except Exception as e:
         logger.error(f"Error generating summary: {str(e)}")
         return jsonify({
@@ -200,6 +530,218 @@ def generate_summary():
             'message': f'Ошибка генерации описания: {str(e)}'
         })
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """
+    Ставит генерацию способностей (и, по желанию, описания персонажа) в фоновую очередь.
+    Сразу возвращает идентификатор задачи; результат - через GET /jobs/<id>
+    """
+    data = request.json or {}
+    concept = data.get('concept', '')
+    ability_configs = data.get('abilities', [])
+    
+    if not concept:
+        return jsonify({
+            'status': 'error',
+            'message': 'Описание концепции персонажа обязательно'
+        }), 400
+    
+    if not ability_configs:
+        return jsonify({
+            'status': 'error',
+            'message': 'Необходимо указать хотя бы одну способность'
+        }), 400
+    
+    batch = data.get('batch')
+    with_summary = bool(data.get('summary', False))
+    session_id = get_session_id(data)
+    previous = previous_abilities(data, session_id)
+    try:
+        profile = get_profile(data)
+        concurrency = get_concurrency(data)
+        client = get_client(data.get('ollama_url'))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    
+    def task(job):
+        generator = AbilityGenerator(client, profile=profile)
+        generator.cancel_event = job.cancel_event
+        
+        for index, ability in generator.iter_abilities(concept, ability_configs, max_workers=concurrency,
+                                                       batch=batch, previous=previous):
+            job.check_cancelled()
+            job.add_ability(index, ability)
+        
+        generator.generated_abilities = list(job.abilities)
+        save_state(session_id, concept=concept, abilities=generator.generated_abilities)
+        prefetch_alternates(session_id, concept, generator.generated_abilities, generator.llm_client, profile)
+        if with_summary:
+            previous_summary = (state_store.get(session_id) or {}).get('summary')
+            job.summary = generator.generate_character_summary(concept, previous_summary)
+            job.check_cancelled()
+            if generator.summary_fingerprint is not None:
+                save_state(session_id, summary={'summary': job.summary, 'fingerprint': generator.summary_fingerprint})
+    
+    try:
+        job = job_queue.submit(task, total=len(ability_configs))
+    except QueueFullError:
+        return jsonify({
+            'status': 'error',
+            'message': 'Очередь генерации заполнена, повторите позже'
+        }), 503, {'Retry-After': '10'}
+    
+    return jsonify({
+        'status': 'success',
+        'job_id': job.id,
+        'job': job.to_dict()
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Статус, прогресс и частичные результаты фоновой задачи"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Задача не найдена'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'job': job
+    })
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Отмена фоновой задачи с прерыванием запросов к Ollama"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Задача не найдена'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'job': job,
+        'message': 'Задача отменяется'
+    })
+
+@app.route('/jobs', methods=['GET'])
+def jobs_stats():
+    """Состояние очереди фоновых задач"""
+    return jsonify({
+        'status': 'success',
+        'queue': job_queue.stats()
+    })
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Статистика кэша ответов LLM"""
+    cache = get_response_cache()
+    if cache is None:
+        return jsonify({
+            'status': 'success',
+            'enabled': False
+        })
+    return jsonify({
+        'status': 'success',
+        'enabled': True,
+        'stats': cache.stats()
+    })
+
+@app.route('/single_flight_stats', methods=['GET'])
+def single_flight_stats():
+    """Статистика объединения одинаковых запросов к LLM"""
+    single_flight = get_single_flight()
+    if single_flight is None:
+        return jsonify({
+            'status': 'success',
+            'enabled': False
+        })
+    return jsonify({
+        'status': 'success',
+        'enabled': True,
+        'stats': single_flight.stats()
+    })
+
+@app.route('/limiter_stats', methods=['GET'])
+def limiter_stats():
+    """Адаптивный лимит запросов к Ollama: текущий лимит, очередь, время ожидания и отказы"""
+    return jsonify({
+        'status': 'success',
+        'servers': get_limiter_stats()
+    })
+
+@app.route('/alternates_stats', methods=['GET'])
+def alternates_stats():
+    """Пул альтернатив для перегенерации: сессии, готовые альтернативы и очередь фоновой генерации"""
+    return jsonify({
+        'status': 'success',
+        'enabled': alternates_pool is not None,
+        'stats': alternates_pool.stats() if alternates_pool is not None else None
+    })
+
+@app.route('/parse_stats', methods=['GET'])
+def parse_stats():
+    """Доля ответов LLM, не разобранных с первой попытки, по моделям"""
+    return jsonify({
+        'status': 'success',
+        'stats': get_parse_stats().stats()
+    })
+
+@app.route('/model_profiles', methods=['GET'])
+def list_model_profiles():
+    """Профили моделей и модели, которых нет на сервере Ollama"""
+    return jsonify({
+        'status': 'success',
+        'profiles': model_registry.to_dict(),
+        'unavailable_models': model_registry.unavailable_models()
+    })
+
+@app.route('/model_profiles/<name>', methods=['PUT'])
+def update_model_profile(name):
+    """Добавляет или заменяет профиль моделей (сохраняется в файл MODEL_PROFILES, если он задан)"""
+    try:
+        model_registry.set_profile(name, request.json or {})
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Некорректный профиль: {str(e)}'
+        }), 400
+    
+    # Новые модели сразу сверяем со списком моделей сервера
+    models = llm_client.get_available_models()
+    if models:
+        model_registry.validate(models)
+    return jsonify({
+        'status': 'success',
+        'profile': model_registry.to_dict()[name],
+        'unavailable_models': model_registry.unavailable_models()
+    })
+
+@app.route('/model_profiles/<name>', methods=['DELETE'])
+def delete_model_profile(name):
+    """Удаляет профиль моделей"""
+    try:
+        removed = model_registry.delete_profile(name)
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    if not removed:
+        return jsonify({
+            'status': 'error',
+            'message': 'Профиль не найден'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'message': 'Профиль удалён'
+    })
+
 @app.route('/save_project', methods=['POST'])
 def save_project():
     """Отправляет данные проекта в браузер для сохранения через диалог"""
@@ -229,28 +771,100 @@ def save_project():
             'message': f'Ошибка сохранения: {str(e)}'
         })
 
-# @app.route('/load_project', methods=['GET'])
-# def load_project():
-#     """Загрузка проекта"""
-#     try:
-#         project_data = session.get('project_data', {})
-        
-#         if project_data:
-#             return jsonify({
-#                 'status': 'success',
-#                 'project': project_data
-#             })
-#         else:
-#             return jsonify({
-#                 'status': 'error',
-#                 'message': 'Сохраненный проект не найден'
-#             })
-            
-#     except Exception as e:
-#         return jsonify({
-#             'status': 'error',
-#             'message': f'Ошибка загрузки: {str(e)}'
-#         })
+def etag_response(payload: dict, etag: str):
+    """
+    JSON-ответ с ETag; если у клиента та же версия (If-None-Match) - 304 без тела
+    """
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    return response
+
+@app.route('/projects', methods=['GET'])
+def list_projects():
+    """Страница списка проектов на сервере (page, per_page, q - поиск по названию и концепции)"""
+    result = project_store.list(
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', 50, type=int),
+        query=request.args.get('q') or None
+    )
+    return jsonify({'status': 'success', **result})
+
+@app.route('/projects', methods=['POST'])
+@app.route('/projects/<project_id>', methods=['PUT'])
+def store_project(project_id=None):
+    """
+    Сохраняет проект на сервере (POST - новый, PUT - создать или заменить).
+    If-Match - сохранить, только если проект не изменился с последней загрузки
+    """
+    if_match = next(iter(request.if_match), None) if request.if_match else None
+    try:
+        meta = project_store.save(request.json or {}, project_id, if_match=if_match)
+    except ProjectConflictError as e:
+        return jsonify({
+            'status': 'error',
+            'message': 'Проект изменён в другом окне, загрузите его заново',
+            'etag': e.etag
+        }), 412
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Ошибка сохранения: {str(e)}'
+        }), 400
+    response = jsonify({'status': 'success', 'project': meta})
+    response.set_etag(meta['etag'])
+    return response, 201 if request.method == 'POST' else 200
+
+@app.route('/projects/<project_id>', methods=['GET'])
+def load_project(project_id):
+    """
+    Загрузка проекта; abilities=0 - без способностей, только их идентификаторы
+    """
+    meta = project_store.meta(project_id)
+    if meta is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Проект не найден'
+        }), 404
+    with_abilities = request.args.get('abilities', '1').lower() not in ('0', 'false', 'no')
+    etag = meta['etag'] if with_abilities else f"{meta['etag']}-meta"
+    # Неизменённый проект не читаем из хранилища и не отправляем заново
+    if etag in request.if_none_match:
+        return etag_response({}, etag)
+    project = project_store.get(project_id, with_abilities=with_abilities)
+    if project is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Проект не найден'
+        }), 404
+    return etag_response({'status': 'success', 'meta': meta, 'project': project}, etag)
+
+@app.route('/projects/<project_id>/abilities/<ability_id>', methods=['GET'])
+def load_project_ability(project_id, ability_id):
+    """Загрузка одной способности проекта"""
+    found = project_store.get_ability(project_id, ability_id)
+    if found is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Способность не найдена'
+        }), 404
+    ability, etag = found
+    return etag_response({'status': 'success', 'ability': ability}, etag)
+
+@app.route('/projects/<project_id>', methods=['DELETE'])
+def delete_project(project_id):
+    """Удаление проекта с сервера"""
+    if not project_store.delete(project_id):
+        return jsonify({
+            'status': 'error',
+            'message': 'Проект не найден'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'message': 'Проект удалён'
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
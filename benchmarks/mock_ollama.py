@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальная замена сервера Ollama для бенчмарков: /api/tags, /api/ps, /api/show и /api/chat
+(потоковый и обычный ответ) с настраиваемой задержкой, скоростью генерации,
+долей ошибок и долей ответов в неверном формате.
+
+    python benchmarks/mock_ollama.py --port 11500 --latency 0.2 --token-rate 50
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MODELS = ('gpt-oss:latest', 'llama3.1:latest', 'llama3.2:3b')
+# Примерно столько символов русского текста на один токен
+CHARS_PER_TOKEN = 4
+
+WORDS = ('пламя', 'тень', 'клинок', 'вихрь', 'щит', 'искра', 'пепел', 'ветер', 'камень', 'молния',
+         'удар', 'волна', 'печать', 'зов', 'шторм', 'лёд', 'кровь', 'свет', 'туман', 'гром')
+BATCH_COUNT_PATTERN = re.compile(r'Способности \((\d+)\)')
+
+
+class MockConfig:
+    """
+    Поведение сервера: задержка до первого токена (сек), токенов в секунду,
+    доля ответов 500 и доля ответов без ожидаемого формата
+    """
+
+    def __init__(self,
+                 latency: float = 0.1,
+                 token_rate: float = 200,
+                 error_rate: float = 0.0,
+                 malformed_rate: float = 0.0,
+                 description_words: int = 30,
+                 models=DEFAULT_MODELS,
+                 context_length: int = 8192,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.description_words = description_words
+        self.models = list(models)
+        self.context_length = context_length
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        # Модели, к которым уже обращались, считаются загруженными (/api/ps)
+        self.loaded: List[str] = []
+        self.stats = {'chat': 0, 'errors': 0, 'malformed': 0, 'prompt_tokens': 0, 'generated_tokens': 0}
+
+    def roll(self, rate: float) -> bool:
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self.rng_lock:
+            self.stats[key] += amount
+
+    def words(self, count: int) -> str:
+        with self.rng_lock:
+            return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+
+def _prompt_text(payload: Dict[str, Any]) -> str:
+    return '\n'.join(message.get('content', '') for message in payload.get('messages', []))
+
+
+def build_answer(config: MockConfig, payload: Dict[str, Any]) -> str:
+    """
+    Ответ модели в формате, который просит промпт: JSON (format: json) или текстовый шаблон;
+    пакетный промпт - по объекту на каждую способность, промпт описания персонажа - суммаризация
+    """
+    prompt = _prompt_text(payload)
+    structured = payload.get('format') == 'json'
+    name = config.words(2).capitalize()
+    description = config.words(config.description_words).capitalize() + '.'
+
+    if config.roll(config.malformed_rate):
+        config.count('malformed')
+        return f"Название: {name}. Описание: {description}"
+
+    batch = BATCH_COUNT_PATTERN.search(prompt)
+    if batch:
+        abilities = [{'id': i + 1, 'name': config.words(2).capitalize(),
+                      'description': config.words(config.description_words).capitalize() + '.'}
+                     for i in range(int(batch.group(1)))]
+        return json.dumps({'abilities': abilities}, ensure_ascii=False)
+
+    if 'суммаризация' in prompt or '"summary"' in prompt:
+        summary = config.words(config.description_words * 2).capitalize() + '.'
+        return json.dumps({'summary': summary}, ensure_ascii=False) if structured else f"(суммаризация:'{summary}')"
+
+    if structured:
+        return json.dumps({'name': name, 'description': description}, ensure_ascii=False)
+    return f"(название:'{name}';описание:'{description}')"
+
+
+def split_tokens(text: str) -> List[str]:
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config: MockConfig = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length', 0))
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json(200, {'models': [{'name': model} for model in self.config.models]})
+        elif self.path == '/api/ps':
+            self._send_json(200, {'models': [{'name': model} for model in list(self.config.loaded)]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path == '/api/show':
+            self._send_json(200, {'model_info': {'general.context_length': self.config.context_length}})
+        elif self.path == '/api/chat':
+            self._chat(payload)
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _chat(self, payload: Dict[str, Any]) -> None:
+        config = self.config
+        config.count('chat')
+        model = payload.get('model', '')
+
+        if model not in config.models:
+            self._send_json(404, {'error': f"model '{model}' not found"})
+            return
+        with config.rng_lock:
+            if model not in config.loaded:
+                config.loaded.append(model)
+        if config.roll(config.error_rate):
+            config.count('errors')
+            time.sleep(config.latency)
+            self._send_json(500, {'error': 'mock internal error'})
+            return
+
+        answer = build_answer(config, payload)
+        tokens = split_tokens(answer)
+        prompt_tokens = max(1, len(_prompt_text(payload)) // CHARS_PER_TOKEN)
+        config.count('prompt_tokens', prompt_tokens)
+
+        started = time.perf_counter()
+        time.sleep(config.latency)
+        prompt_eval_ns = int((time.perf_counter() - started) * 1e9)
+        delay = 1.0 / config.token_rate if config.token_rate > 0 else 0
+
+        if not payload.get('stream', True):
+            time.sleep(delay * len(tokens))
+            config.count('generated_tokens', len(tokens))
+            self._send_json(200, self._final_chunk(model, answer, prompt_tokens, len(tokens),
+                                                   prompt_eval_ns, started))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        sent = 0
+        try:
+            for token in tokens:
+                time.sleep(delay)
+                chunk = {'model': model, 'message': {'role': 'assistant', 'content': token}, 'done': False}
+                self.wfile.write(json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+                sent += 1
+            final = self._final_chunk(model, '', prompt_tokens, len(tokens), prompt_eval_ns, started)
+            self.wfile.write(json.dumps(final, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент закрыл соединение (ответ уже разобран или запрос отменён)
+            pass
+        finally:
+            config.count('generated_tokens', sent)
+
+    @staticmethod
+    def _final_chunk(model: str, content: str, prompt_tokens: int, eval_tokens: int,
+                     prompt_eval_ns: int, started: float) -> Dict[str, Any]:
+        total_ns = int((time.perf_counter() - started) * 1e9)
+        return {
+            'model': model,
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+            'total_duration': total_ns,
+            'load_duration': 0,
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': prompt_eval_ns,
+            'eval_count': eval_tokens,
+            'eval_duration': max(0, total_ns - prompt_eval_ns)
+        }
+
+
+class MockOllamaServer:
+    """
+    Сервер-заглушка в фоновом потоке:
+
+        with MockOllamaServer(MockConfig(latency=0.2)) as server:
+            get_client(server.url)...
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or MockConfig()
+        handler = type('ConfiguredMockOllamaHandler', (MockOllamaHandler,), {'config': self.config})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockOllamaServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True, name='mock-ollama')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'MockOllamaServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка сервера Ollama для бенчмарков')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11500)
+    parser.add_argument('--latency', type=float, default=0.1, help='задержка до первого токена, сек')
+    parser.add_argument('--token-rate', type=float, default=200, help='токенов в секунду')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 500')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='доля ответов в неверном формате')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, token_rate=args.token_rate, error_rate=args.error_rate,
+                        malformed_rate=args.malformed_rate, seed=args.seed)
+    server = MockOllamaServer(config, args.host, args.port)
+    print(f"Mock Ollama: {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
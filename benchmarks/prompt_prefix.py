@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк раскладки промпта: сколько токенов промпта Ollama вычисляет
+на каждую способность одного персонажа с общим префиксом и без него.
+
+Запросы отправляются без потоковой передачи и с num_predict=1 - измеряется
+только обработка промпта (prompt_eval_count / prompt_eval_duration из ответа Ollama).
+
+    python benchmarks/prompt_prefix.py --url http://localhost:11434 --abilities 10
+"""
+
+import os
+import sys
+import argparse
+import statistics
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.llm_client import OllamaClient
+from models.ability_generator import AbilityGenerator
+
+CONCEPT = ("Странствующий маг-алхимик, который черпает силу из вулканического пепла "
+           "и старых договоров с духами огня. Осторожен, расчётлив, не любит ближний бой.")
+
+ABILITY_CONFIG = {
+    'parameters': {
+        'Урон': {'min': 10, 'mode': 80, 'max': 200,
+                 'descriptions': {10: 'слабый', 80: 'заметный', 200: 'разрушительный'}},
+        'Перезарядка': {'min': 1, 'mode': 5, 'max': 30},
+        'Стоимость маны': {'min': 5, 'mode': 40, 'max': 120},
+        'Дальность': {'min': 1, 'mode': 15, 'max': 60}
+    },
+    'keywords': 'огонь; пепел; по площади'
+}
+
+
+def run_layout(url: str, shared_prefix: bool, abilities: int, seed: int, profile: Optional[str] = None) -> dict:
+    """
+    Отправляет abilities запросов одного персонажа и собирает статистику обработки промпта
+    """
+    client = OllamaClient(url=url, stream=False, timeout=600, shared_prefix=shared_prefix)
+    generator = AbilityGenerator(client, seed=seed)
+
+    counts, durations = [], []
+    for index in range(abilities + 1):
+        parameters = generator._generate_random_parameters(ABILITY_CONFIG['parameters'])
+        payload = client.build_ability_payload(CONCEPT, parameters, ABILITY_CONFIG['keywords'], profile)
+        payload['options']['num_predict'] = 1
+        payload['stream'] = False
+
+        response = client.session.post(f"{client.base_url}/api/chat", json=payload, timeout=(5, 600))
+        response.raise_for_status()
+        data = response.json()
+        if index == 0:
+            # Первый запрос загружает модель и заполняет кэш - в статистику не входит
+            continue
+        counts.append(data.get('prompt_eval_count', 0))
+        durations.append(data.get('prompt_eval_duration', 0) / 1e6)
+
+    return {
+        'prompt_tokens_mean': statistics.mean(counts),
+        'prompt_eval_ms_mean': statistics.mean(durations),
+        'prompt_eval_ms_median': statistics.median(durations)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк переиспользования префикса промпта в Ollama')
+    parser.add_argument('--url', default='http://localhost:11434', help='адрес Ollama')
+    parser.add_argument('--abilities', type=int, default=10, help='способностей на персонажа')
+    parser.add_argument('--seed', type=int, default=42, help='seed выборки параметров')
+    parser.add_argument('--profile', default=None, help='профиль моделей (см. models/model_profiles.py)')
+    args = parser.parse_args()
+
+    results = {
+        'legacy': run_layout(args.url, False, args.abilities, args.seed, args.profile),
+        'shared_prefix': run_layout(args.url, True, args.abilities, args.seed, args.profile)
+    }
+
+    print(f"{'раскладка':<15}{'токенов промпта':>18}{'мс (среднее)':>15}{'мс (медиана)':>15}")
+    for layout, stats in results.items():
+        print(f"{layout:<15}{stats['prompt_tokens_mean']:>18.1f}"
+              f"{stats['prompt_eval_ms_mean']:>15.1f}{stats['prompt_eval_ms_median']:>15.1f}")
+
+    legacy_ms = results['legacy']['prompt_eval_ms_mean']
+    if legacy_ms:
+        speedup = legacy_ms / max(results['shared_prefix']['prompt_eval_ms_mean'], 1e-9)
+        print(f"\nУскорение обработки промпта: x{speedup:.2f}")
+
+
+if __name__ == '__main__':
+    main()
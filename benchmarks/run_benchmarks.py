@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Воспроизводимый бенчмарк приложения без GPU: поднимает заглушку Ollama (mock_ollama.py)
+и само приложение в этом процессе, нагружает /generate_abilities, /regenerate_ability,
+/generate_summary и выборку параметров (/preview_ability_batch) на заданных уровнях
+параллельности и выводит p50/p95/p99 задержки и пропускную способность в JSON.
+
+    python benchmarks/run_benchmarks.py --concurrency 1,4,16 --requests 40 --output bench.json
+    python benchmarks/run_benchmarks.py --ollama-url http://localhost:11434   # живой сервер
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_ollama import MockConfig, MockOllamaServer
+
+SCENARIOS = ('generate_abilities', 'regenerate_ability', 'generate_summary', 'sampler')
+
+CONCEPT = ("Странствующий маг-алхимик, который черпает силу из вулканического пепла "
+           "и старых договоров с духами огня. Осторожен, расчётлив, не любит ближний бой.")
+
+ABILITY_CONFIG = {
+    'parameters': {
+        'Урон': {'min': 10, 'mode': 80, 'max': 200,
+                 'descriptions': {'10': 'слабый', '80': 'заметный', '200': 'разрушительный'}},
+        'Перезарядка': {'min': 1, 'mode': 5, 'max': 30},
+        'Стоимость маны': {'min': 5, 'mode': 40, 'max': 120},
+        'Дальность': {'min': 1, 'mode': 15, 'max': 60}
+    },
+    'keywords': 'огонь; пепел; по площади'
+}
+
+
+def start_app():
+    """
+    Запускает Flask-приложение на свободном порту в фоновом потоке, возвращает (server, base_url)
+    """
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True, name='bench-app').start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def summarize(latencies: List[float], errors: int, wall_time: float) -> Dict[str, Any]:
+    """
+    Перцентили задержки (мс) и пропускная способность (успешных запросов в секунду)
+    """
+    result = {'requests': len(latencies) + errors, 'errors': errors, 'wall_time_s': round(wall_time, 3),
+              'throughput_rps': round(len(latencies) / wall_time, 3) if wall_time > 0 else 0.0}
+    if latencies:
+        values = np.array(latencies) * 1000
+        result.update({
+            'p50_ms': round(float(np.percentile(values, 50)), 2),
+            'p95_ms': round(float(np.percentile(values, 95)), 2),
+            'p99_ms': round(float(np.percentile(values, 99)), 2),
+            'mean_ms': round(float(values.mean()), 2),
+            'max_ms': round(float(values.max()), 2)
+        })
+    return result
+
+
+class Benchmark:
+    """
+    Сценарии нагрузки на приложение; каждый сценарий - метод (номер запроса) -> успех
+    """
+
+    def __init__(self, base_url: str, ollama_url: str, abilities: int, batch: Optional[bool], samples: int):
+        self.base_url = base_url
+        self.ollama_url = ollama_url
+        self.abilities = abilities
+        self.batch = batch
+        self.samples = samples
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        # Своя сессия (пул соединений) у каждого потока нагрузки
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _post(self, path: str, body: Dict[str, Any]) -> bool:
+        response = self.session.post(f"{self.base_url}{path}", json=body, timeout=600)
+        return response.status_code == 200 and response.json().get('status') == 'success'
+
+    def _generation_body(self, project_id: str) -> Dict[str, Any]:
+        return {
+            'concept': CONCEPT,
+            'abilities': [ABILITY_CONFIG] * self.abilities,
+            'ollama_url': self.ollama_url,
+            'project_id': project_id,
+            'batch': self.batch
+        }
+
+    def prepare(self, scenario: str, count: int) -> None:
+        """
+        Перегенерации и описанию персонажа нужны ранее сгенерированные способности проекта
+        """
+        if scenario not in ('regenerate_ability', 'generate_summary'):
+            return
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: self._post('/generate_abilities', self._generation_body(f'bench-{i}')),
+                              range(count)))
+
+    def generate_abilities(self, index: int) -> bool:
+        return self._post('/generate_abilities', self._generation_body(f'bench-gen-{index}'))
+
+    def regenerate_ability(self, index: int) -> bool:
+        return self._post(f'/regenerate_ability/{index % self.abilities}',
+                          {'concept': CONCEPT, 'ollama_url': self.ollama_url, 'project_id': f'bench-{index}'})
+
+    def generate_summary(self, index: int) -> bool:
+        return self._post('/generate_summary',
+                          {'concept': CONCEPT, 'ollama_url': self.ollama_url, 'project_id': f'bench-{index}'})
+
+    def sampler(self, index: int) -> bool:
+        return self._post('/preview_ability_batch', {'config': ABILITY_CONFIG, 'samples': self.samples})
+
+    def run(self, scenario: str, concurrency: int, count: int) -> Dict[str, Any]:
+        """
+        Выполняет count запросов сценария не более чем по concurrency одновременно
+        """
+        call: Callable[[int], bool] = getattr(self, scenario)
+        self.prepare(scenario, count)
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def timed(index: int) -> None:
+            nonlocal errors
+            started = time.perf_counter()
+            try:
+                ok = call(index)
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(timed, range(count)))
+        return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк приложения с заглушкой Ollama')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"через запятую: {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', default='1,4,16', help='уровни параллельности через запятую')
+    parser.add_argument('--requests', type=int, default=20, help='запросов на сценарий и уровень')
+    parser.add_argument('--abilities', type=int, default=4, help='способностей в одном запросе генерации')
+    parser.add_argument('--batch', action='store_true', default=None,
+                        help='пакетная генерация (batch=true; по умолчанию - LLM_BATCH приложения)')
+    parser.add_argument('--samples', type=int, default=1000, help='выборок в /preview_ability_batch')
+    parser.add_argument('--latency', type=float, default=0.05, help='заглушка: задержка до первого токена, сек')
+    parser.add_argument('--token-rate', type=float, default=500, help='заглушка: токенов в секунду')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='заглушка: доля ответов 500')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='заглушка: доля ответов в неверном формате')
+    parser.add_argument('--seed', type=int, default=42, help='seed заглушки')
+    parser.add_argument('--ollama-url', default=None, help='живой сервер Ollama вместо заглушки')
+    parser.add_argument('--output', default=None, help='файл для JSON-отчёта (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+    # Логи приложения только с предупреждениями - иначе каждый запрос печатается в stderr
+    from models.tracing import configure_logging
+    configure_logging(level=logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    mock: Optional[MockOllamaServer] = None
+    if args.ollama_url:
+        ollama_url = args.ollama_url
+    else:
+        mock = MockOllamaServer(MockConfig(latency=args.latency, token_rate=args.token_rate,
+                                           error_rate=args.error_rate, malformed_rate=args.malformed_rate,
+                                           seed=args.seed)).start()
+        ollama_url = mock.url
+
+    server, base_url = start_app()
+    benchmark = Benchmark(base_url, ollama_url, args.abilities, args.batch, args.samples)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for scenario in scenarios:
+            results[scenario] = {}
+            for level in levels:
+                results[scenario][str(level)] = benchmark.run(scenario, level, args.requests)
+    finally:
+        server.shutdown()
+        if mock is not None:
+            mock.stop()
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'mock': dict(mock.config.stats) if mock is not None else None,
+        'results': results
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,369 @@
+import os
+import json
 import random
 import math
-from typing import Dict, List, Any, Tuple
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Any, Tuple, Optional, Iterator
+import numpy as np
+from models.parameter_config import compile_parameters
+from models.metrics import ERRORS, stage_timer
+from models.concurrency_limiter import OverloadedError
+from models.tracing import bind_context
+
+# Верхняя граница числа выборок в пакетном предпросмотре
+MAX_PREVIEW_SAMPLES = 100000
+PREVIEW_PERCENTILES = (5, 25, 50, 75, 95)
 # from models.llm_client import OllamaClient # Предполагаем, что этот импорт есть
 
+
+def default_concurrency() -> int:
+    """
+    Лимит параллельных запросов к LLM по умолчанию.
+    Совпадает с OLLAMA_NUM_PARALLEL сервера (если переменная задана), иначе 1.
+    """
+    try:
+        return max(1, int(os.environ.get('OLLAMA_NUM_PARALLEL', 1)))
+    except ValueError:
+        return 1
+
+
+def max_request_concurrency() -> int:
+    """
+    Верхняя граница поля concurrency в запросах к API: LLM_MAX_CONCURRENCY, иначе OLLAMA_NUM_PARALLEL.
+    Больше запросов сервер Ollama одновременно не выполнит - лишние только переполнят очередь лимита
+    """
+    try:
+        return max(1, int(os.environ.get('LLM_MAX_CONCURRENCY') or default_concurrency()))
+    except ValueError:
+        return default_concurrency()
+
+
+def default_batch_mode() -> bool:
+    """
+    Пакетная генерация по умолчанию (несколько способностей в одном запросе к LLM):
+    включается переменной окружения LLM_BATCH=1
+    """
+    return os.environ.get('LLM_BATCH', '').lower() in ('1', 'true', 'yes')
+
+
+class CancelSignal:
+    """
+    Отмена запросов одной генерации: внешнее событие (отмена задачи) или собственный флаг.
+    Флаг ставится при перегрузке сервера, чтобы остальные запросы генерации не ждали слот лимита
+    до max_wait. Для запросов к LLM ведёт себя как threading.Event (is_set)
+    """
+
+    def __init__(self, parent: Optional[threading.Event] = None):
+        self.parent = parent
+        self._event = threading.Event()
+
+    def set(self) -> None:
+        self._event.set()
+
+    def is_set(self) -> bool:
+        return self._event.is_set() or (self.parent is not None and self.parent.is_set())
+
+
+def ability_fingerprint(concept: str, config: Dict[str, Any], profile: Optional[str] = None) -> str:
+    """
+    Отпечаток способности: концепция, параметры, ключевые слова и профиль моделей.
+    Одинаковый отпечаток - прежний результат можно переиспользовать без запроса к LLM
+    """
+    data = json.dumps({
+        'concept': concept.strip(),
+        'parameters': config.get('parameters', {}),
+        'keywords': config.get('keywords', ''),
+        'profile': profile
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+
+def summary_fingerprint(concept: str, abilities: List[Dict[str, Any]], profile: Optional[str] = None) -> str:
+    """
+    Отпечаток описания персонажа: меняется только при изменении концепции
+    или названия и описания какой-либо способности
+    """
+    data = json.dumps({
+        'concept': concept.strip(),
+        'abilities': [[ability.get('name', ''), ability.get('description', '')] for ability in abilities],
+        'profile': profile
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+
 class AbilityGenerator:
     """
     Основной генератор способностей персонажей
     """
     
-    def __init__(self, llm_client):
+    def __init__(self,
+                 llm_client,
+                 max_workers: Optional[int] = None,
+                 seed: Optional[int] = None,
+                 batch: Optional[bool] = None,
+                 profile: Optional[str] = None):
         # Тип OllamaClient предполагается из контекста
         self.llm_client = llm_client
         self.generated_abilities = []
+        # Сколько способностей генерируется одновременно
+        self.max_workers = max_workers if max_workers else default_concurrency()
+        # Пакетный режим: несколько способностей в одном промпте (см. generate_ability_descriptions_batch)
+        self.batch = default_batch_mode() if batch is None else batch
+        # Профиль моделей для запросов к LLM (см. models/model_profiles.py); None - default
+        self.profile = profile
+        # Генератор случайных чисел; seed делает выборку параметров воспроизводимой
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed)
+        # threading.Event для отмены: передаётся в запросы к LLM (см. models/job_queue.py)
+        self.cancel_event = None
+        # Сколько способностей последней генерации взято из прежнего результата (инкрементальный режим)
+        self.reused_abilities = 0
+        # Отпечаток последнего описания персонажа (см. generate_character_summary)
+        self.summary_fingerprint = None
+        self.logger = logging.getLogger(__name__)
     
-    def generate_abilities(self, concept: str, ability_configs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def generate_abilities(self,
+                           concept: str,
+                           ability_configs: List[Dict[str, Any]],
+                           max_workers: Optional[int] = None,
+                           batch: Optional[bool] = None,
+                           previous: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
         """
-        Генерирует набор способностей на основе концепции и конфигураций
+        Генерирует набор способностей на основе концепции и конфигураций.
+        Запросы к LLM выполняются параллельно (не более max_workers одновременно),
+        результаты возвращаются в порядке ability_configs.
+        previous - прежние способности персонажа: неизменённые берутся из них (см. iter_abilities)
         """
-        self.generated_abilities = []
-        
-        for config in ability_configs:
-            ability = self._generate_single_ability(concept, config)
-            if ability:
-                self.generated_abilities.append(ability)
+        results = [None] * len(ability_configs)
+        for index, ability in self.iter_abilities(concept, ability_configs, max_workers, batch, previous):
+            results[index] = ability
         
+        self.generated_abilities = [ability for ability in results if ability]
         return self.generated_abilities
     
-    def _generate_single_ability(self, concept: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    def iter_abilities(self,
+                       concept: str,
+                       ability_configs: List[Dict[str, Any]],
+                       max_workers: Optional[int] = None,
+                       batch: Optional[bool] = None,
+                       previous: Optional[List[Dict[str, Any]]] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
         """
-        Генерирует одну способность
+        Генерирует способности параллельно и отдаёт пары (индекс, способность)
+        по мере готовности, не дожидаясь всего набора.
+        batch=True - несколько способностей в одном запросе к LLM (по умолчанию self.batch).
+        previous - прежние способности персонажа (инкрементальный режим): способности с тем же
+        отпечатком (см. ability_fingerprint) отдаются сразу, к LLM уходят только изменённые
         """
-        # Генерируем случайные параметры для способности
-        parameters = self._generate_random_parameters(config.get('parameters', {}))
+        fingerprints = [ability_fingerprint(concept, config, self.profile) for config in ability_configs]
+        reusable = self._reusable_abilities(previous)
+        pending = []
+        self.reused_abilities = 0
+        for index, fingerprint in enumerate(fingerprints):
+            candidates = reusable.get(fingerprint)
+            if candidates:
+                self.reused_abilities += 1
+                yield index, dict(candidates.pop(0), config=ability_configs[index])
+            else:
+                pending.append(index)
+        
+        if not pending:
+            return
+        for position, ability in self._iter_new_abilities(concept, [ability_configs[index] for index in pending],
+                                                          max_workers, batch):
+            # Запасной результат без ответа LLM помечен fingerprint=None и не переиспользуется
+            ability.setdefault('fingerprint', fingerprints[pending[position]])
+            yield pending[position], ability
+    
+    def _reusable_abilities(self, previous: Optional[List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Прежние успешные способности по отпечаткам; одинаковые конфигурации
+        получают разные прежние способности по порядку
+        """
+        reusable: Dict[str, List[Dict[str, Any]]] = {}
+        for ability in previous or []:
+            if ability and ability.get('fingerprint') and 'error' not in ability:
+                reusable.setdefault(ability['fingerprint'], []).append(ability)
+        return reusable
+    
+    def _iter_new_abilities(self,
+                            concept: str,
+                            ability_configs: List[Dict[str, Any]],
+                            max_workers: Optional[int] = None,
+                            batch: Optional[bool] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Генерирует способности через LLM; индексы - позиции в ability_configs
+        """
+        workers = max(1, min(int(max_workers or self.max_workers), len(ability_configs) or 1))
+        
+        # Параметры выбираются заранее в одном потоке, чтобы seed давал одинаковый результат
+        # независимо от порядка завершения запросов к LLM
+        parameters = [self._generate_parameters_safe(config) for config in ability_configs]
+        # После перегрузки сервера остальные запросы генерации отменяются, а не ждут слот лимита
+        cancel = CancelSignal(self.cancel_event)
+        
+        if self.batch if batch is None else batch:
+            yield from self._iter_abilities_batched(concept, ability_configs, parameters, workers, cancel)
+            return
+        
+        def run(config, params):
+            try:
+                return self._generate_single_ability_safe(concept, config, params, cancel)
+            except OverloadedError:
+                cancel.set()
+                raise
+        
+        if workers == 1:
+            for index, config in enumerate(ability_configs):
+                yield index, run(config, parameters[index])
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(bind_context(run), config, parameters[index]): index
+                for index, config in enumerate(ability_configs)
+            }
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                # Если потребитель прервал итерацию, не запускаем оставшиеся задачи
+                for future in futures:
+                    future.cancel()
+    
+    def _iter_abilities_batched(self,
+                                concept: str,
+                                ability_configs: List[Dict[str, Any]],
+                                parameters: List[Optional[Dict[str, Dict[str, Any]]]],
+                                workers: int,
+                                cancel: Optional[CancelSignal] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Пакетный вариант iter_abilities: способности группируются в пакеты по размеру контекста модели,
+        пакеты выполняются параллельно. Способности, которых нет в ответе, генерируются по одной
+        """
+        # Способности без выбранных параметров идут обычным путём
+        indices = [index for index, params in enumerate(parameters) if params is not None]
+        items = [(parameters[index], ability_configs[index].get('keywords', '')) for index in indices]
+        planned = self.llm_client.plan_ability_batches(concept, items, profile=self.profile)
+        batches = [[indices[position] for position in batch] for batch in planned]
+        batches += [[index] for index, params in enumerate(parameters) if params is None]
+        
+        cancel = cancel or CancelSignal(self.cancel_event)
+        
+        def run(batch):
+            try:
+                return self._generate_ability_batch_safe(concept, batch, ability_configs, parameters, cancel)
+            except OverloadedError:
+                cancel.set()
+                raise
+        
+        if workers == 1:
+            for batch in batches:
+                yield from run(batch)
+            return
+        
+        with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            futures = [executor.submit(bind_context(run), batch) for batch in batches]
+            try:
+                for future in as_completed(futures):
+                    yield from future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+    
+    def _generate_ability_batch_safe(self,
+                                     concept: str,
+                                     batch: List[int],
+                                     ability_configs: List[Dict[str, Any]],
+                                     parameters: List[Optional[Dict[str, Dict[str, Any]]]],
+                                     cancel_event=None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Генерирует пакет способностей одним запросом; пропущенные в ответе - отдельными запросами.
+        cancel_event - отмена запросов (по умолчанию self.cancel_event)
+        """
+        cancel_event = cancel_event or self.cancel_event
+        descriptions = [None] * len(batch)
+        if len(batch) > 1:
+            descriptions = self.llm_client.generate_ability_descriptions_batch(
+                concept,
+                [(parameters[index], ability_configs[index].get('keywords', '')) for index in batch],
+                cancel_event=cancel_event,
+                profile=self.profile
+            )
+        
+        results = []
+        for index, description in zip(batch, descriptions):
+            config = ability_configs[index]
+            if description:
+                results.append((index, {
+                    'name': description['name'],
+                    'description': description['description'],
+                    'parameters': parameters[index],
+                    'keywords': config.get('keywords', ''),
+                    'config': config
+                }))
+            else:
+                results.append((index, self._generate_single_ability_safe(concept, config, parameters[index],
+                                                                          cancel_event)))
+        return results
+    
+    def _generate_parameters_safe(self, config: Dict[str, Any]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Выбирает параметры способности; при ошибке возвращает None,
+        и способность завершится ошибкой отдельно от остальных
+        """
+        try:
+            return self._generate_random_parameters(config.get('parameters', {}))
+        except Exception as e:
+            ERRORS.inc(stage='sampling')
+            self.logger.error(f"Failed to sample ability parameters: {e}")
+            return None
+    
+    def _generate_single_ability_safe(self,
+                                      concept: str,
+                                      config: Dict[str, Any],
+                                      parameters: Optional[Dict[str, Dict[str, Any]]] = None,
+                                      cancel_event=None) -> Dict[str, Any]:
+        """
+        Генерирует одну способность; ошибка в одной способности не прерывает весь набор
+        (кроме перегрузки сервера - остальные запросы тоже будут отклонены)
+        """
+        try:
+            return self._generate_single_ability(concept, config, parameters, cancel_event)
+        except OverloadedError:
+            raise
+        except Exception as e:
+            ERRORS.inc(stage='ability')
+            self.logger.error(f"Failed to generate ability: {e}")
+            return {
+                'name': 'Сгенерированная способность',
+                'description': 'Не удалось сгенерировать описание способности',
+                'parameters': {},
+                'keywords': config.get('keywords', ''),
+                'config': config,
+                'error': str(e)
+            }
+    
+    def _generate_single_ability(self,
+                                 concept: str,
+                                 config: Dict[str, Any],
+                                 parameters: Optional[Dict[str, Dict[str, Any]]] = None,
+                                 cancel_event=None) -> Dict[str, Any]:
+        """
+        Генерирует одну способность; cancel_event - отмена запроса (по умолчанию self.cancel_event)
+        """
+        # Генерируем случайные параметры для способности (если не выбраны заранее)
+        if parameters is None:
+            parameters = self._generate_random_parameters(config.get('parameters', {}))
 
         keywords = config.get('keywords', '')
         
         # Получаем описание от LLM
-        ability_description = self.llm_client.generate_ability_description(concept, parameters, keywords)
+        ability_description = self.llm_client.generate_ability_description(concept, parameters, keywords,
+                                                                           cancel_event=cancel_event or self.cancel_event,
+                                                                           profile=self.profile)
         
         if ability_description:
             return {
@@ -53,7 +380,8 @@ class AbilityGenerator:
                 'description': f'Способность с параметрами: {parameters}',
                 'parameters': parameters,
                 'keywords': keywords,
-                'config': config
+                'config': config,
+                'fingerprint': None
             }
     
     def _generate_random_parameters(self, parameter_configs: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
@@ -66,109 +394,37 @@ class AbilityGenerator:
         Returns:
             Словарь со сгенерированными параметрами
         """
-        generated_params = {}
-        
-        for param_name, config in parameter_configs.items():
-            
-            # --- ИСПРАВЛЕННЫЙ БЛОК ДЛЯ ПРЕОБРАЗОВАНИЯ ТИПОВ ---
-            try:
-                # 1. Извлекаем и принудительно преобразуем min/max в int
-                # Значения из веб-формы (config) всегда приходят как строки.
-                min_val = int(config.get('min', 0))
-                max_val = int(config.get('max', 100))
-                
-                # 2. Извлекаем и преобразуем mode
-                mode_val_raw = config.get('mode')
-                if mode_val_raw is not None:
-                    mode_val = int(mode_val_raw)
-                else:
-                    # Если 'mode' не задан, вычисляем среднее (min_val и max_val теперь гарантированно int)
-                    mode_val = (min_val + max_val) // 2
-                    
-                # Дополнительная защита: mode_val не должен выходить за min/max
-                mode_val = max(min_val, min(max_val, mode_val))
-
-            except (ValueError, TypeError) as e:
-                # Фолбек на случай, если пользователь ввел нечисловые данные
-                print(f"Warning: Invalid number in config for {param_name}. Falling back to default: {e}")
-                min_val, max_val, mode_val = 0, 100, 50
-            # ----------------------------------------------------
-            
-            # Получаем описания значений
-            descriptions_raw = config.get('descriptions', {})
-            descriptions = {}
-
-            for k, v in descriptions_raw.items():
-                try:
-                    descriptions[int(k)] = v
-                except (ValueError, TypeError):
-                    print(f"Warning: description key '{k}' is not a number — skipping.")
-            
-            # Генерируем случайное значение
-            # Теперь min_val, mode_val, max_val гарантированно являются int
-            random_value = self._generate_weighted_random(min_val, mode_val, max_val)
-            
-            # Определяем описание на основе сгенерированного значения
-            description = self._get_value_description(random_value, descriptions)
-            
-            generated_params[param_name] = {
-                'value': random_value,
-                'description': description,
-                'raw_config': config
-            }
-        
-        return generated_params
+        # Конфигурация разбирается один раз и переиспользуется (см. models/parameter_config.py)
+        with stage_timer('sampling'):
+            return compile_parameters(parameter_configs).sample(self.rng)
     
-    def _generate_weighted_random(self, min_val: int, mode_val: int, max_val: int) -> int:
-        """
-        Генерирует случайное значение с весами в пользу модального значения
+    def _generate_random_parameter_arrays(self,
+                                          parameter_configs: Dict[str, Dict[str, Any]],
+                                          size: int) -> Dict[str, Dict[str, Any]]:
         """
-        # Создаем взвешенное распределение
-        weights = []
-        values = []
-        
-        # min_val, max_val и mode_val гарантированно int
-        # Защита от некорректных границ, хотя это должно быть обработано выше
-        if min_val > max_val:
-            min_val, max_val = max_val, min_val
-        mode_val = max(min_val, min(max_val, mode_val))
-
-        # Добавляем больше веса около модального значения
-        for val in range(min_val, max_val + 1):
-            # Вес уменьшается по мере удаления от моды
-            # val - int, mode_val - int. Ошибка здесь больше не должна возникать.
-            distance = abs(val - mode_val) 
-            weight = max(1, 10 - distance)  
-            weights.append(weight)
-            values.append(val)
-        
-        # ... (Остальная часть метода без изменений)
-        total_weight = sum(weights)
-        if total_weight == 0:
-             return mode_val
-             
-        random_weight = random.uniform(0, total_weight)
+        Векторизованный вариант _generate_random_parameters: size выборок каждого параметра сразу
         
-        cumulative_weight = 0
-        for i, weight in enumerate(weights):
-            cumulative_weight += weight
-            if random_weight <= cumulative_weight:
-                return values[i]
-        
-        return mode_val
-    
-    def _get_value_description(self, 
-                               value: int, 
-                               descriptions: Dict[int, str]) -> str:
-        """
-        Определяет описание значения на основе сгенерированного числа
+        Returns:
+            Словарь {имя параметра: {'values', 'description_keys', 'descriptions', 'min', 'mode', 'max'}},
+            где values - массив значений, description_keys - массив ключей описаний
+            (или None, если описаний нет)
         """
-        if not descriptions:
-            return f"Значение: {value}"
+        generated_params = {}
+        
+        with stage_timer('preview_sampling'):
+            for parameter in compile_parameters(parameter_configs).parameters:
+                values = parameter.sampler.sample_array(size, self.np_rng)
+                
+                generated_params[parameter.name] = {
+                    'values': values,
+                    'description_keys': parameter.describe_keys(values),
+                    'descriptions': parameter.descriptions,
+                    'min': parameter.sampler.min_val,
+                    'mode': parameter.sampler.mode_val,
+                    'max': parameter.sampler.max_val
+                }
         
-        # Находим ближайшее описание
-        closest_key = min(descriptions.keys(), key=lambda k: abs(k - value))
-        return descriptions[closest_key]
+        return generated_params
     
     def regenerate_ability_description(self, ability_index: int, concept: str) -> Dict[str, Any]:
         """
@@ -181,10 +437,14 @@ class AbilityGenerator:
 
             keywords = ability.get('keywords', '')
 
+            # Явная перегенерация - ответ из кэша не нужен
             new_description = self.llm_client.generate_ability_description(
                 concept, 
                 ability['parameters'],
-                keywords
+                keywords,
+                use_cache=False,
+                cancel_event=self.cancel_event,
+                profile=self.profile
             )
             
             if new_description:
@@ -194,16 +454,28 @@ class AbilityGenerator:
             
         return {}
     
-    def generate_character_summary(self, concept: str) -> str:
+    def generate_character_summary(self, concept: str, previous: Optional[Dict[str, str]] = None) -> str:
         """
-        Генерирует общее описание персонажа
+        Генерирует общее описание персонажа.
+        previous - прежнее описание {'summary', 'fingerprint'}: если концепция, названия и описания
+        способностей не изменились, оно возвращается без запроса к LLM.
+        Отпечаток полученного описания - в self.summary_fingerprint (None - запасной текст без LLM)
         """
+        self.summary_fingerprint = None
         if not self.generated_abilities:
             return "Способности еще не сгенерированы"
         
-        summary = self.llm_client.generate_character_summary(concept, self.generated_abilities)
+        fingerprint = summary_fingerprint(concept, self.generated_abilities, self.profile)
+        if previous and previous.get('summary') and previous.get('fingerprint') == fingerprint:
+            self.summary_fingerprint = fingerprint
+            return previous['summary']
+        
+        summary = self.llm_client.generate_character_summary(concept, self.generated_abilities,
+                                                             cancel_event=self.cancel_event,
+                                                             profile=self.profile)
         
         if summary:
+            self.summary_fingerprint = fingerprint
             return summary
         else:
             # Фолбек описание
@@ -220,4 +492,64 @@ class AbilityGenerator:
             'concept_preview': 'Предварительный просмотр - описание будет сгенерировано при финальной генерации'
         }
         
-        return preview
\ No newline at end of file
+        return preview
+    
+    def get_ability_preview_batch(self,
+                                  config: Dict[str, Any],
+                                  samples: int = 1000,
+                                  bins: int = 20,
+                                  include_values: bool = False) -> Dict[str, Any]:
+        """
+        Пакетный предпросмотр (Монте-Карло): samples выборок каждого параметра за один вызов
+        и статистика по ним - гистограмма, среднее, перцентили, частоты описаний
+        """
+        samples = max(1, min(int(samples), MAX_PREVIEW_SAMPLES))
+        bins = max(1, int(bins))
+        arrays = self._generate_random_parameter_arrays(config.get('parameters', {}), samples)
+        
+        parameters = {}
+        for param_name, data in arrays.items():
+            values = data['values']
+            
+            # Для целых значений ширина корзины не меньше 1
+            bin_count = min(bins, data['max'] - data['min'] + 1)
+            counts, edges = np.histogram(values, bins=bin_count,
+                                         range=(data['min'] - 0.5, data['max'] + 0.5))
+            
+            stats = {
+                'mean': float(values.mean()),
+                'std': float(values.std()),
+                'min': int(values.min()),
+                'max': int(values.max()),
+                'percentiles': {
+                    f'p{p}': float(v) for p, v in zip(PREVIEW_PERCENTILES, np.percentile(values, PREVIEW_PERCENTILES))
+                },
+                'histogram': {
+                    'counts': counts.tolist(),
+                    'bin_edges': edges.tolist()
+                }
+            }
+            
+            if data['description_keys'] is not None:
+                keys, key_counts = np.unique(data['description_keys'], return_counts=True)
+                stats['descriptions'] = [
+                    {
+                        'key': int(key),
+                        'description': data['descriptions'][int(key)],
+                        'count': int(count),
+                        'frequency': float(count) / samples
+                    }
+                    for key, count in zip(keys, key_counts)
+                ]
+            else:
+                stats['descriptions'] = []
+            
+            if include_values:
+                stats['values'] = values.tolist()
+            
+            parameters[param_name] = stats
+        
+        return {
+            'samples': samples,
+            'parameters': parameters
+        }
\ No newline at end of file
@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from models.metrics import ALTERNATES
+from models.tracing import new_trace_id, set_trace_id
+
+# Как часто фоновый поток проверяет, освободился ли сервер
+IDLE_POLL_INTERVAL = 0.5
+
+
+class AlternateSlot:
+    """
+    Очередь альтернатив (название и описание) для одной способности.
+    Альтернативы годятся, пока не изменились отпечаток способности, выбранные значения параметров
+    (повторная генерация без изменений конфигурации выбирает их заново), концепция и профиль
+    """
+
+    def __init__(self, ability: Dict[str, Any], concept: str, llm_client, profile: Optional[str]):
+        self.fingerprint = ability.get('fingerprint')
+        self.parameters = ability.get('parameters', {})
+        self.keywords = ability.get('keywords', '')
+        self.concept = concept
+        self.llm_client = llm_client
+        self.profile = profile
+        self.names = {ability.get('name')}
+        self.alternates = deque()
+        self.scheduled = False
+
+    def matches(self, ability: Dict[str, Any], concept: str, profile: Optional[str]) -> bool:
+        return (self.fingerprint is not None and ability.get('fingerprint') == self.fingerprint
+                and ability.get('parameters', {}) == self.parameters
+                and concept == self.concept and profile == self.profile)
+
+    def remember(self, name: Optional[str]) -> None:
+        """
+        Название уже показано пользователю: убирает его из очереди и не принимает повторно.
+        Прямая перегенерация и фоновый запрос с тем же промптом объединяются single-flight
+        в один вызов - без этого пул отдал бы тот же ответ при следующей перегенерации
+        """
+        self.names.add(name)
+        self.alternates = deque(alternate for alternate in self.alternates if alternate['name'] != name)
+
+
+class AlternatesPool:
+    """
+    Заранее сгенерированные альтернативы для перегенерации способностей.
+
+    После генерации фоновый поток дополняет очередь каждой способности до size альтернатив.
+    Запросы идут по одному и только когда у сервера не больше idle_threshold своих запросов
+    (выполняющихся и ждущих слот лимита) - фоновая генерация не отнимает время у пользователей.
+    Перегенерация забирает готовую альтернативу без запроса к LLM, очередь дополняется снова.
+    Хранится в памяти процесса, не больше max_sessions сессий; давно не использованные вытесняются
+    """
+
+    def __init__(self, size: int = 2, idle_threshold: int = 0, max_sessions: int = 200):
+        self.size = size
+        self.idle_threshold = idle_threshold
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> {индекс способности: AlternateSlot}
+        self._tasks = deque()  # (session_id, индекс, AlternateSlot) - очереди, которые нужно дополнить
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self.logger = logging.getLogger(__name__)
+
+    def prefetch(self,
+                 session_id: str,
+                 concept: str,
+                 abilities: List[Dict[str, Any]],
+                 llm_client,
+                 profile: Optional[str] = None) -> None:
+        """
+        Заводит очереди альтернатив для способностей сессии после генерации.
+        Очереди способностей с прежним отпечатком сохраняются, остальные сбрасываются
+        """
+        with self._cond:
+            previous = self._sessions.pop(session_id, {})
+            slots = {}
+            for index, ability in enumerate(abilities):
+                if not ability or 'error' in ability or ability.get('fingerprint') is None:
+                    continue
+                slot = previous.get(index)
+                if slot is None or not slot.matches(ability, concept, profile):
+                    slot = AlternateSlot(ability, concept, llm_client, profile)
+                else:
+                    slot.remember(ability.get('name'))
+                slots[index] = slot
+                self._schedule(session_id, index, slot)
+            self._sessions[session_id] = slots
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def take(self,
+             session_id: str,
+             index: int,
+             ability: Dict[str, Any],
+             concept: str,
+             profile: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """
+        Следующая альтернатива для способности (None - очередь пуста или устарела).
+        Очередь дополняется в фоне
+        """
+        with self._cond:
+            slot = self._sessions.get(session_id, {}).get(index)
+            if slot is None or not slot.matches(ability, concept, profile):
+                ALTERNATES.inc(outcome='miss')
+                return None
+            self._sessions.move_to_end(session_id)
+            slot.remember(ability.get('name'))
+            alternate = slot.alternates.popleft() if slot.alternates else None
+            ALTERNATES.inc(outcome='hit' if alternate else 'miss')
+            self._schedule(session_id, index, slot)
+            return alternate
+
+    def drop(self, session_id: str) -> None:
+        with self._cond:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            slots = [slot for session in self._sessions.values() for slot in session.values()]
+            return {
+                'sessions': len(self._sessions),
+                'abilities': len(slots),
+                'alternates': sum(len(slot.alternates) for slot in slots),
+                'pending': len(self._tasks)
+            }
+
+    def _schedule(self, session_id: str, index: int, slot: AlternateSlot) -> None:
+        # Вызывается под self._cond
+        if slot.scheduled or len(slot.alternates) >= self.size:
+            return
+        slot.scheduled = True
+        self._tasks.append((session_id, index, slot))
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True, name='alternates-pool')
+            self._worker.start()
+        self._cond.notify()
+
+    def _is_current(self, session_id: str, index: int, slot: AlternateSlot) -> bool:
+        return self._sessions.get(session_id, {}).get(index) is slot
+
+    def _next_task(self):
+        """
+        Следующая очередь для дополнения, как только её сервер свободен
+        """
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._cond.wait()
+                for _ in range(len(self._tasks)):
+                    session_id, index, slot = self._tasks.popleft()
+                    if not self._is_current(session_id, index, slot):
+                        slot.scheduled = False
+                        continue
+                    if slot.llm_client.pending_requests() <= self.idle_threshold:
+                        return session_id, index, slot
+                    self._tasks.append((session_id, index, slot))
+            time.sleep(IDLE_POLL_INTERVAL)
+
+    def _run(self) -> None:
+        while True:
+            session_id, index, slot = self._next_task()
+            set_trace_id(new_trace_id())
+            try:
+                alternate = slot.llm_client.generate_ability_description(
+                    slot.concept, slot.parameters, slot.keywords, use_cache=False, profile=slot.profile)
+            except Exception as e:
+                self.logger.warning(f"Failed to generate alternate for ability {index}: {e}")
+                alternate = None
+            finally:
+                set_trace_id(None)
+
+            with self._cond:
+                slot.scheduled = False
+                if not alternate:
+                    # Не повторяем сразу: очередь дополнится при следующей перегенерации
+                    ALTERNATES.inc(outcome='failed')
+                    continue
+                if not self._is_current(session_id, index, slot):
+                    continue
+                if alternate['name'] in slot.names:
+                    # Модель повторяется - не тратим на неё фоновые запросы до следующей перегенерации
+                    ALTERNATES.inc(outcome='duplicate')
+                    continue
+                ALTERNATES.inc(outcome='generated')
+                slot.names.add(alternate['name'])
+                slot.alternates.append(alternate)
+                self._schedule(session_id, index, slot)
@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+from models.ability_generator import AbilityGenerator
+from models.tracing import bind_context, new_trace_id, set_trace_id
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRecord:
+    """
+    Персонаж для пакетной генерации: концепция и конфигурации способностей
+    """
+
+    def __init__(self, record_id: str, concept: str, abilities: List[Dict[str, Any]]):
+        self.id = record_id
+        self.concept = concept
+        self.abilities = abilities
+
+    @classmethod
+    def from_project(cls, record_id: str, data: Dict[str, Any]) -> 'BatchRecord':
+        """
+        Запись в формате saved_projects/*.json: {"concept", "abilities": [{"config": {...}}, ...]};
+        способности можно указать и сразу конфигурациями, как в /generate_abilities
+        """
+        if not isinstance(data, dict):
+            raise ValueError("запись должна быть JSON-объектом")
+        concept = (data.get('concept') or '').strip()
+        if not concept:
+            raise ValueError("не указана концепция персонажа (concept)")
+        abilities = [ability.get('config', ability) if isinstance(ability, dict) else {}
+                     for ability in data.get('abilities') or []]
+        if not abilities:
+            raise ValueError("не указано ни одной способности (abilities)")
+        return cls(str(data.get('id') or record_id), concept, abilities)
+
+
+def load_records(paths: List[str]) -> Iterator[BatchRecord]:
+    """
+    Читает записи из файлов: .jsonl - по записи на строку, .json - проект или список проектов.
+    Идентификатор записи - поле id, иначе <файл>:<строка или номер>, где файл - путь относительно
+    общего каталога входных файлов (a/hero.json и b/hero.json не совпадают).
+    Повторяющиеся идентификаторы - ValueError: результаты и контрольная точка различают записи по id
+    """
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else ''
+    seen = set()
+    for path in paths:
+        name = os.path.relpath(os.path.abspath(path), root).replace(os.sep, '/')
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                items = [(f"{name}:{number}", line) for number, line in enumerate(f, 1) if line.strip()]
+            else:
+                data = json.load(f)
+                items = [(f"{name}:{number}", item) for number, item in enumerate(data, 1)] \
+                    if isinstance(data, list) else [(name, data)]
+        for record_id, item in items:
+            try:
+                record = BatchRecord.from_project(record_id, json.loads(item) if isinstance(item, str) else item)
+            except ValueError as e:
+                raise ValueError(f"{record_id}: {e}") from e
+            if record.id in seen:
+                raise ValueError(f"{record_id}: повторяющийся идентификатор записи '{record.id}'")
+            seen.add(record.id)
+            yield record
+
+
+def load_checkpoint(out_path: str) -> Set[str]:
+    """
+    Идентификаторы записей, уже успешно сгенерированных в out_path.
+    Строка, оборванная при аварийном завершении, пропускается - запись будет сгенерирована заново
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if result.get('status') == 'success':
+                done.add(result['id'])
+    return done
+
+
+class BatchRunner:
+    """
+    Пакетная генерация персонажей без веб-интерфейса: записи обрабатываются параллельно
+    (не более jobs одновременно), способности каждой записи - через AbilityGenerator
+    с concurrency одновременными запросами к LLM. Результаты дописываются в JSONL по мере
+    готовности, поэтому прерванный запуск продолжается с того же места (см. load_checkpoint)
+    """
+
+    def __init__(self,
+                 llm_client,
+                 jobs: int = 2,
+                 concurrency: Optional[int] = None,
+                 batch: Optional[bool] = None,
+                 profile: Optional[str] = None,
+                 summary: bool = True,
+                 seed: Optional[int] = None):
+        self.llm_client = llm_client
+        self.jobs = max(1, jobs)
+        self.concurrency = concurrency
+        self.batch = batch
+        self.profile = profile
+        self.summary = summary
+        self.seed = seed
+        # Прерывает запросы к модели всех выполняющихся записей (Ctrl+C)
+        self.cancel_event = threading.Event()
+
+    def generate(self, record: BatchRecord, number: int = 0) -> Dict[str, Any]:
+        """
+        Генерирует способности и описание одного персонажа; ошибки попадают в результат
+        """
+        set_trace_id(new_trace_id())
+        started = time.perf_counter()
+        seed = self.seed + number if self.seed is not None else None
+        generator = AbilityGenerator(self.llm_client, seed=seed, batch=self.batch, profile=self.profile)
+        generator.cancel_event = self.cancel_event
+        result = {'id': record.id, 'concept': record.concept, 'status': 'success'}
+        try:
+            abilities = generator.generate_abilities(record.concept, record.abilities,
+                                                     max_workers=self.concurrency)
+            result['abilities'] = abilities
+            # Запасная способность без ответа LLM (сервер недоступен, ответ не разобран) помечена fingerprint=None:
+            # такая запись не должна попасть в контрольную точку как успешная
+            failed = [ability.get('error', 'нет ответа модели') for ability in abilities
+                      if 'error' in ability or ability.get('fingerprint') is None]
+            if failed:
+                result.update(status='error', error=f"{len(failed)} способностей с ошибкой: {failed[0]}")
+            elif self.summary:
+                result['summary'] = generator.generate_character_summary(record.concept)
+                if generator.summary_fingerprint is None:
+                    result.update(status='error', error='Не удалось сгенерировать описание персонажа')
+        except Exception as e:
+            logger.error(f"Failed to generate record {record.id}: {e}")
+            result.update(status='error', error=str(e))
+        if self.cancel_event.is_set():
+            result.update(status='cancelled', error='Генерация прервана')
+        result['elapsed'] = round(time.perf_counter() - started, 3)
+        return result
+
+    def run(self,
+            records: List[BatchRecord],
+            out_path: str,
+            on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+            on_start: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+        """
+        Генерирует записи, которых ещё нет в out_path, и дописывает результаты в out_path.
+        on_start получает число пропущенных (уже готовых) записей,
+        on_result вызывается после записи каждого результата (прогресс)
+        """
+        done = load_checkpoint(out_path)
+        pending = [(number, record) for number, record in enumerate(records) if record.id not in done]
+        counts = {'total': len(records), 'skipped': len(records) - len(pending), 'success': 0, 'error': 0}
+        if on_start is not None:
+            on_start(counts['skipped'])
+
+        self._terminate_partial_line(out_path)
+        with open(out_path, 'a', encoding='utf-8') as out, \
+                ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [executor.submit(bind_context(self.generate), record, number) for number, record in pending]
+            try:
+                for future in as_completed(futures):
+                    result = future.result()
+                    if result['status'] == 'cancelled':
+                        continue
+                    out.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    out.flush()
+                    os.fsync(out.fileno())
+                    counts['success' if result['status'] == 'success' else 'error'] += 1
+                    if on_result is not None:
+                        on_result(result)
+            except BaseException:
+                # Ctrl+C: прерываем запросы к модели и не запускаем оставшиеся записи
+                self.cancel_event.set()
+                for future in futures:
+                    future.cancel()
+                raise
+        return counts
+
+    @staticmethod
+    def _terminate_partial_line(out_path: str) -> None:
+        """
+        Завершает строку, оборванную прошлым запуском, чтобы новая запись не склеилась с ней
+        """
+        if not os.path.exists(out_path) or os.path.getsize(out_path) == 0:
+            return
+        with open(out_path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
@@ -0,0 +1,176 @@
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from models.metrics import OLLAMA_QUEUE_WAIT, OLLAMA_REJECTED, OLLAMA_CONCURRENCY_LIMIT
+
+# Как часто ожидающий вызов проверяет собственную отмену
+WAIT_POLL_INTERVAL = 0.1
+# Границы подсказки Retry-After, секунды
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class OverloadedError(Exception):
+    """
+    Сервер Ollama перегружен: лимит одновременных запросов исчерпан и очередь заполнена
+    или ожидание слота превысило max_wait. retry_after - через сколько секунд повторить
+    """
+
+    def __init__(self, message: str, retry_after: int = MIN_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    Адаптивный лимит одновременных запросов к одному серверу Ollama (AIMD).
+
+    Задержка запроса - время до первого байта ответа: Ollama отвечает после обработки промпта,
+    поэтому сюда входит и ожидание во внутренней очереди сервера, но не длина ответа.
+    Пока задержка не превышает tolerance средних, лимит растёт на 1/limit за запрос
+    (примерно на единицу за «окно» запросов); при превышении, таймауте или ответе 5xx
+    лимит умножается на backoff, не чаще раза за среднюю длительность запроса.
+
+    Сверх лимита запросы ждут слот не дольше max_wait секунд, в очереди не больше max_queue -
+    остальные сразу получают OverloadedError вместо ожидания собственного таймаута.
+    """
+
+    def __init__(self,
+                 name: str = '',
+                 initial_limit: float = 4,
+                 min_limit: int = 1,
+                 max_limit: int = 32,
+                 max_queue: int = 64,
+                 max_wait: float = 10,
+                 tolerance: float = 2.0,
+                 backoff: float = 0.75,
+                 smoothing: float = 0.1):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.queued = 0
+        self.latency: Optional[float] = None  # экспоненциальное среднее, секунды
+        self.duration: Optional[float] = None  # сколько запрос занимает слот, экспоненциальное среднее
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._stats = {'acquired': 0, 'queued': 0, 'rejected': 0, 'wait_timeouts': 0,
+                       'increases': 0, 'decreases': 0, 'wait_seconds': 0.0}
+        OLLAMA_CONCURRENCY_LIMIT.set(self.limit, server=self.name)
+
+    def acquire(self, cancelled: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Занимает слот; при исчерпанном лимите ждёт в очереди.
+        False - вызывающий отменён во время ожидания, OverloadedError - очередь заполнена
+        или слот не освободился за max_wait
+        """
+        started = time.monotonic()
+        with self._cond:
+            if self.in_flight < self._capacity():
+                self.in_flight += 1
+                self._stats['acquired'] += 1
+                return True
+
+            if self.queued >= self.max_queue:
+                self._reject('queue_full')
+                raise OverloadedError("Ollama overloaded: request queue is full", self._retry_after())
+
+            self.queued += 1
+            self._stats['queued'] += 1
+            try:
+                deadline = started + self.max_wait
+                while self.in_flight >= self._capacity():
+                    if cancelled is not None and cancelled():
+                        return False
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['wait_timeouts'] += 1
+                        self._reject('wait_timeout')
+                        raise OverloadedError("Ollama overloaded: no free slot within "
+                                              f"{self.max_wait:g} s", self._retry_after())
+                    self._cond.wait(min(remaining, WAIT_POLL_INTERVAL))
+                self.in_flight += 1
+                self._stats['acquired'] += 1
+            finally:
+                self.queued -= 1
+                waited = time.monotonic() - started
+                self._stats['wait_seconds'] += waited
+                OLLAMA_QUEUE_WAIT.observe(waited, server=self.name)
+            return True
+
+    def release(self,
+                latency: Optional[float] = None,
+                failed: bool = False,
+                duration: Optional[float] = None) -> None:
+        """
+        Освобождает слот и подстраивает лимит.
+        latency - время до первого байта ответа (None - не учитывать запрос, например при отмене),
+        failed - таймаут или перегрузка на стороне сервера,
+        duration - полное время запроса (для оценки Retry-After)
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if duration is not None:
+                self.duration = self._smooth(self.duration, duration)
+            if failed:
+                self._decrease()
+            elif latency is not None:
+                if self.latency is not None and latency > self.tolerance * self.latency:
+                    self._decrease()
+                elif self.in_flight + 1 >= self._capacity():
+                    # Растём только когда лимит действительно используется
+                    self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+                    self._stats['increases'] += 1
+                self.latency = self._smooth(self.latency, latency)
+            OLLAMA_CONCURRENCY_LIMIT.set(self.limit, server=self.name)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            acquired = self._stats['acquired']
+            return dict(
+                self._stats,
+                limit=round(self.limit, 2),
+                in_flight=self.in_flight,
+                waiting=self.queued,
+                latency=self.latency,
+                duration=self.duration,
+                mean_wait_seconds=self._stats['wait_seconds'] / acquired if acquired else 0.0
+            )
+
+    def _smooth(self, average: Optional[float], value: float) -> float:
+        return value if average is None else (1 - self.smoothing) * average + self.smoothing * value
+
+    def _capacity(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        # Одна волна медленных ответов - одно снижение, а не обвал до минимума
+        if now - self._last_decrease < (self.duration or self.latency or 0):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._stats['decreases'] += 1
+
+    def _reject(self, reason: str) -> None:
+        self._stats['rejected'] += 1
+        OLLAMA_REJECTED.inc(server=self.name, reason=reason)
+
+    def _retry_after(self) -> int:
+        """
+        Оценка времени, за которое очередь успеет разойтись
+        """
+        duration = self.duration or self.latency
+        if duration is None:
+            return MIN_RETRY_AFTER
+        estimate = duration * (self.queued + 1) / self._capacity()
+        return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(estimate))))
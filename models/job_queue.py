@@ -0,0 +1,303 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from models.tracing import bind_context, get_trace_id
+from models.sqlite_db import SQLiteConnections
+
+# Как часто воркер проверяет в общем хранилище отмену своих задач из других процессов
+CANCEL_POLL_INTERVAL = 1.0
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class QueueFullError(Exception):
+    """
+    Очередь задач заполнена - новая задача не принята
+    """
+
+
+class JobCancelled(Exception):
+    """
+    Задача отменена пользователем
+    """
+
+
+class Job:
+    """
+    Фоновая задача генерации: статус, прогресс и частичные результаты
+    """
+
+    def __init__(self, total: int):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'  # queued -> running -> completed | failed | cancelled
+        self.total = total
+        self.completed = 0
+        self.abilities: List[Optional[Dict[str, Any]]] = [None] * total
+        self.summary: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Трассировка запроса, создавшего задачу - в логах воркера тот же trace_id
+        self.trace_id = get_trace_id()
+        # Передаётся в AbilityGenerator/OllamaClient, чтобы прервать запросы к модели
+        self.cancel_event = threading.Event()
+        # Общее хранилище задач (см. SQLiteJobStore); None - задача видна только этому процессу
+        self.store: Optional['SQLiteJobStore'] = None
+        self._lock = threading.Lock()
+
+    def add_ability(self, index: int, ability: Dict[str, Any]) -> None:
+        with self._lock:
+            self.abilities[index] = ability
+            self.completed += 1
+        self.persist()
+
+    def persist(self) -> None:
+        """
+        Сохраняет состояние задачи в общее хранилище, чтобы её видели другие воркеры
+        """
+        if self.store is not None:
+            self.store.save(self.to_dict())
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'progress': {'completed': self.completed, 'total': self.total},
+                'abilities': list(self.abilities),
+                'summary': self.summary,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'trace_id': self.trace_id
+            }
+
+
+class SQLiteJobStore:
+    """
+    Состояние и результаты задач в SQLite, общие для всех воркеров на одной машине:
+    опрос и отмена задачи работают, даже если запрос попал не в тот процесс, где она выполняется.
+    Отмена из другого процесса - флаг cancel_requested, который проверяет процесс-исполнитель.
+    Хранится не больше max_finished завершённых задач
+    """
+
+    def __init__(self, db_path: str, max_finished: int = 1000):
+        self.db_path = db_path
+        self.max_finished = max_finished
+        self._connections = SQLiteConnections(db_path)
+        with self._connections.get() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS generation_jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, '
+                'state TEXT NOT NULL, cancel_requested INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS generation_jobs_status ON generation_jobs (status, updated_at)')
+
+    def save(self, state: Dict[str, Any]) -> None:
+        with self._connections.get() as db:
+            db.execute(
+                'INSERT INTO generation_jobs (id, status, state, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET status = excluded.status, state = excluded.state, '
+                'updated_at = excluded.updated_at',
+                (state['id'], state['status'], json.dumps(state, ensure_ascii=False), time.time())
+            )
+            if state['status'] in FINISHED_STATUSES:
+                db.execute(
+                    'DELETE FROM generation_jobs WHERE id IN (SELECT id FROM generation_jobs '
+                    'WHERE status IN (?, ?, ?) ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+                    FINISHED_STATUSES + (self.max_finished,)
+                )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connections.get().execute('SELECT state FROM generation_jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Помечает задачу для отмены; ожидающая задача сразу становится отменённой
+        """
+        with self._connections.get() as db:
+            row = db.execute('SELECT state FROM generation_jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            state = json.loads(row[0])
+            if state['status'] == 'queued':
+                state.update(status='cancelled', finished_at=time.time())
+            db.execute('UPDATE generation_jobs SET cancel_requested = 1, status = ?, state = ? WHERE id = ?',
+                       (state['status'], json.dumps(state, ensure_ascii=False), job_id))
+            return state
+
+    def cancel_requested(self, job_ids: List[str]) -> List[str]:
+        if not job_ids:
+            return []
+        rows = self._connections.get().execute(
+            f"SELECT id FROM generation_jobs WHERE cancel_requested = 1 AND id IN ({', '.join('?' * len(job_ids))})",
+            job_ids
+        ).fetchall()
+        return [job_id for job_id, in rows]
+
+    def status_counts(self) -> Dict[str, int]:
+        return dict(self._connections.get().execute('SELECT status, COUNT(*) FROM generation_jobs GROUP BY status'))
+
+
+class JobQueue:
+    """
+    Очередь фоновых задач с ограниченным пулом воркеров.
+    max_workers ограничивает одновременную нагрузку на сервер модели,
+    max_queue - число принятых, но ещё не завершённых задач.
+    Завершённые задачи хранятся (не более max_finished) для опроса результатов.
+    С общим хранилищем (store) задачи видны всем процессам-воркерам: опрос и отмена
+    работают в любом из них, выполняется задача в том процессе, который её принял
+    """
+
+    def __init__(self,
+                 max_workers: int = 2,
+                 max_queue: int = 50,
+                 max_finished: int = 1000,
+                 store: Optional[SQLiteJobStore] = None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        self.store = store
+        self.logger = logging.getLogger(__name__)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='generation-job')
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+        if store is not None:
+            threading.Thread(target=self._watch_cancellations, daemon=True, name='job-cancel-watch').start()
+
+    def submit(self, task: Callable[[Job], None], total: int) -> Job:
+        """
+        Ставит задачу в очередь. task(job) выполняется в воркере и заполняет job результатами.
+        Бросает QueueFullError, если активных задач уже max_queue
+        """
+        job = Job(total)
+        job.store = self.store
+        with self._lock:
+            if self.active_count() >= self.max_queue:
+                raise QueueFullError()
+            self._jobs[job.id] = job
+            self._forget_finished()
+        job.persist()
+        self._executor.submit(bind_context(self._run), job, task)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Состояние задачи: из этого процесса или из общего хранилища
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.store.get(job_id) if self.store is not None else None
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Отменяет задачу: ожидающая не запустится, выполняющаяся прервёт запросы к модели.
+        Задачу другого процесса отменяет её исполнитель по флагу в общем хранилище
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return self.store.request_cancel(job_id) if self.store is not None else None
+        job.cancel_event.set()
+        with self._lock:
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        if self.store is not None:
+            self.store.request_cancel(job_id)
+        job.persist()
+        return job.to_dict()
+
+    def active_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            statuses: Dict[str, int] = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            active = self.active_count()
+        return {
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'active': active,
+            # С общим хранилищем - задачи всех воркеров
+            'statuses': self.store.status_counts() if self.store is not None else statuses
+        }
+
+    def _run(self, job: Job, task: Callable[[Job], None]) -> None:
+        # Задачу могли отменить через другой воркер, пока она ждала в очереди
+        if self.store is not None and self.store.cancel_requested([job.id]):
+            job.cancel_event.set()
+        with self._lock:
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        job.persist()
+
+        try:
+            job.check_cancelled()
+            task(job)
+            job.check_cancelled()
+            status = 'completed'
+        except JobCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            self.logger.error(f"Generation job {job.id} failed: {e}")
+            job.error = str(e)
+            status = 'failed'
+
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+        job.persist()
+
+    def _watch_cancellations(self) -> None:
+        """
+        Передаёт задачам этого процесса отмену, запрошенную через другой воркер
+        """
+        while True:
+            time.sleep(CANCEL_POLL_INTERVAL)
+            with self._lock:
+                running = [job_id for job_id, job in self._jobs.items()
+                           if not job.finished and not job.cancel_event.is_set()]
+            try:
+                for job_id in self.store.cancel_requested(running):
+                    self.cancel(job_id)
+            except Exception as e:
+                self.logger.error(f"Failed to check job cancellations: {e}")
+
+    def _forget_finished(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+
+def create_job_store(spec: str = 'memory') -> Optional[SQLiteJobStore]:
+    """
+    Хранилище задач по строке настройки: 'memory' (только в процессе, None) или 'sqlite:<путь к файлу>'
+    """
+    backend, _, location = spec.partition(':')
+    if backend == 'memory':
+        return None
+    if backend == 'sqlite':
+        return SQLiteJobStore(location or 'generation_jobs.db')
+    raise ValueError(f"Unknown job store backend: {spec}")
@@ -1,34 +1,228 @@
 import requests
 import json
 import logging
-from typing import Dict, Any, Optional
+import os
+import threading
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from models.response_cache import ResponseCache
+from models.single_flight import SingleFlight
+from models.concurrency_limiter import AdaptiveLimiter, OverloadedError
+from models.metrics import (STAGE_DURATION, OLLAMA_REQUESTS, ERRORS, stage_timer, observe_ollama_response,
+                            observe_ollama_estimate)
+from models.tracing import bind_context
+from models.model_profiles import ModelRegistry, TaskSettings, get_model_registry
+from models.response_parser import (
+    ABILITY_PATTERN, SUMMARY_PATTERN, IncrementalTemplateParser, IncrementalJSONParser,
+    parse_ability, parse_summary, parse_ability_batch,
+    build_ability_repair_prompt, build_summary_repair_prompt, get_parse_stats
+)
+
+# Неизменная часть промпта способности (системное сообщение) - общий префикс для всех запросов,
+# KV-кэш которого Ollama переиспользует между способностями
+ABILITY_INSTRUCTIONS = """Ты генератор способностей для игровых персонажей.
+
+По концепции персонажа, ключевым словам и параметрам способности придумай название для способности и текстовое описание, которое суммаризирует данную способность. Обязательно учитывай ключевые слова, если они указаны. """
+ABILITY_BATCH_INSTRUCTIONS = """Ты генератор способностей для игровых персонажей.
+
+По концепции персонажа придумай для каждой способности из списка название и текстовое описание, которое суммаризирует данную способность. Обязательно учитывай ключевые слова способности, если они указаны. Ответ на русском языке, строго в формате JSON:
+{"abilities": [{"id": <номер способности>, "name": "<название способности>", "description": "<описание способности>"}]}"""
+ABILITY_JSON_FORMAT = """Ответ на русском языке, строго в формате JSON:
+{"name": "<название способности>", "description": "<описание способности>"}"""
+ABILITY_TEMPLATE_FORMAT = """Ответ на русском языке, строго по шаблону:
+(название:'<название способности>';описание:'<описание способности>')
+
+Не используй кавычки внутри названия и описания."""
+
+# Пакетная генерация: оценка длины контекста и ответа в токенах
+DEFAULT_CONTEXT_LENGTH = 2048  # num_ctx Ollama по умолчанию
+MAX_BATCH_CONTEXT = 8192       # больший контекст заметно увеличивает расход памяти GPU
+MAX_BATCH_SIZE = 8
+BATCH_OUTPUT_TOKENS = 300      # запас на ответ для одной способности
+
+# Описание персонажа: способности передаются дайджестами (название и начало описания),
+# дайджесты сверх бюджета промпта сворачиваются по группам (map-reduce)
+SUMMARY_DIGEST_CHARS = 200     # длина описания способности в дайджесте
+SUMMARY_PROMPT_TOKENS = 1500   # бюджет дайджестов в одном промпте по умолчанию
+SUMMARY_OUTPUT_TOKENS = 600    # запас контекста на ответ
+SUMMARY_PART_TOKENS = 300      # num_predict промежуточного описания группы
+SUMMARY_MAP_WORKERS = 4        # одновременных запросов для групп
+LOADED_MODELS_TTL = 10         # сколько секунд доверять списку загруженных моделей (/api/ps)
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?…])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка числа токенов (для русского текста ~3 символа на токен)
+    """
+    return len(text) // 3 + 1
+
+
+def default_structured_output() -> bool:
+    """
+    Запрашивать ли у Ollama структурированный ответ (format: json).
+    Выключается переменной окружения LLM_STRUCTURED_OUTPUT=0 для моделей,
+    которые плохо справляются с JSON
+    """
+    return os.environ.get('LLM_STRUCTURED_OUTPUT', '1').lower() not in ('0', 'false', 'no')
+
+
+def default_shared_prefix() -> bool:
+    """
+    Промпт с общим префиксом (инструкция, затем концепция, затем параметры способности).
+    Выключается переменной окружения LLM_SHARED_PREFIX=0 - прежняя раскладка одним сообщением
+    """
+    return os.environ.get('LLM_SHARED_PREFIX', '1').lower() not in ('0', 'false', 'no')
+
+
+def default_summary_budget() -> int:
+    """
+    Бюджет промпта описания персонажа в токенах: LLM_SUMMARY_BUDGET или SUMMARY_PROMPT_TOKENS
+    """
+    try:
+        return max(200, int(os.environ.get('LLM_SUMMARY_BUDGET', SUMMARY_PROMPT_TOKENS)))
+    except ValueError:
+        return SUMMARY_PROMPT_TOKENS
+
+
+def default_summary_on_loaded_model() -> bool:
+    """
+    Генерировать описание персонажа на уже загруженной модели способностей, если модель описания
+    не загружена. LLM_SUMMARY_MODEL=profile - всегда модель из профиля
+    """
+    return os.environ.get('LLM_SUMMARY_MODEL', 'loaded').lower() != 'profile'
+
+
+def ability_digest(ability: Dict[str, Any], max_chars: int = SUMMARY_DIGEST_CHARS) -> str:
+    """
+    Краткая запись способности для описания персонажа: название и первые предложения описания
+    """
+    name = ability.get('name') or 'Безымянная способность'
+    description = ' '.join((ability.get('description') or 'Без описания').split())
+    if len(description) > max_chars:
+        digest = ''
+        for sentence in SENTENCE_END_PATTERN.split(description):
+            if len(digest) + len(sentence) + 1 > max_chars:
+                break
+            digest = f"{digest} {sentence}".strip()
+        # Первое предложение длиннее лимита - обрезаем по границе слова
+        description = digest or description[:max_chars].rsplit(' ', 1)[0] + '…'
+    return f"{name}: {description}"
+
+
+def prompt_text(messages: List[Dict[str, str]]) -> str:
+    """
+    Текст всех сообщений запроса (для ключа кэша и оценки длины)
+    """
+    return "\n\n".join(message['content'] for message in messages)
+
+
+def create_session(pool_size: int = 16, retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """
+    Создаёт HTTP-сессию с пулом keep-alive соединений и повторами
+    при ошибках соединения и ответах 5xx
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,  # Повтор после начала генерации только удвоит нагрузку на модель
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'POST']),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
 
 class OllamaClient:
     """
     Клиент для работы с локальной LLM через Ollama API
     """
     
-    def __init__(self, url: str = "http://localhost:11434"):
-        self.base_url = url
+    def __init__(self,
+                 url: str = "http://localhost:11434",
+                 stream: bool = True,
+                 timeout: float = 30,
+                 connect_timeout: float = 5,
+                 session: Optional[requests.Session] = None,
+                 cache: Optional[ResponseCache] = None,
+                 structured_output: Optional[bool] = None,
+                 shared_prefix: Optional[bool] = None,
+                 registry: Optional[ModelRegistry] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 limiter: Optional[AdaptiveLimiter] = None):
+        self.base_url = url.rstrip('/')
+        # stream=True - читаем ответ /api/chat по мере генерации токенов
+        # и прерываем запрос, как только шаблон ответа закрыт
+        self.stream = stream
+        # Для потокового режима это таймаут ожидания очередного фрагмента, а не всей генерации
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.session = session or create_session()
+        # Необязательный кэш ответов (см. models/response_cache.py)
+        self.cache = cache
+        # format: json - ответ в JSON вместо текстового шаблона (см. models/response_parser.py)
+        self.structured_output = default_structured_output() if structured_output is None else structured_output
+        # Раскладка промпта с общим префиксом для переиспользования KV-кэша Ollama
+        self.shared_prefix = default_shared_prefix() if shared_prefix is None else shared_prefix
+        # Профили моделей: модель, опции, num_ctx и keep_alive для каждой задачи (см. models/model_profiles.py)
+        self.registry = registry
+        # Объединение одинаковых одновременных запросов (см. models/single_flight.py)
+        self.single_flight = single_flight
+        # Адаптивный лимит одновременных запросов /api/chat (см. models/concurrency_limiter.py)
+        self.limiter = limiter
+        # Выполняющиеся сейчас запросы /api/chat (см. pending_requests)
+        self._active_requests = 0
+        self._active_lock = threading.Lock()
+        # Описание персонажа на уже загруженной модели и бюджет его промпта (см. generate_character_summary)
+        self.summary_on_loaded_model = default_summary_on_loaded_model()
+        self.summary_budget = default_summary_budget()
+        # Длина контекста моделей (из /api/show) для подбора размера пакета
+        self._context_lengths: Dict[str, int] = {}
+        # Загруженные в память модели (из /api/ps): (время проверки, список)
+        self._loaded_models: Tuple[float, List[str]] = (0.0, [])
         self.logger = logging.getLogger(__name__)
         
+    def close(self) -> None:
+        """
+        Закрывает соединения клиента (вызывается при вытеснении из реестра get_client)
+        """
+        self.session.close()
+    
     def test_connection(self) -> bool:
         """
         Проверяет доступность Ollama сервера
         """
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self._request('GET', '/api/tags', timeout=(self.connect_timeout, 5))
             return response.status_code == 200
         except Exception as e:
             self.logger.error(f"Failed to connect to Ollama: {e}")
             return False
     
-    def get_available_models(self) -> list:
+    def get_available_models(self, connect_timeout: Optional[float] = None, retry: bool = True) -> list:
         """
-        Получает список доступных моделей
+        Получает список доступных моделей.
+        connect_timeout и retry=False - быстрая проверка (например при запуске): без повторов сессии
         """
+        timeout = (connect_timeout or self.connect_timeout, self.timeout)
         try:
-            response = requests.get(f"{self.base_url}/api/tags")
+            if retry:
+                response = self._request('GET', '/api/tags', timeout=timeout)
+            else:
+                with create_session(pool_size=1, retries=0) as session:
+                    response = self._request('GET', '/api/tags', timeout=timeout, session=session)
             if response.status_code == 200:
                 data = response.json()
                 return [model['name'] for model in data.get('models', [])]
@@ -40,92 +234,634 @@ class OllamaClient:
     def generate_ability_description(self, 
                                      concept: str, 
                                      parameters: Dict[str, Any],
-                                     keywords: str = '') -> Optional[Dict[str, str]]:
+                                     keywords: str = '',
+                                     use_cache: bool = True,
+                                     cancel_event: Optional[threading.Event] = None,
+                                     profile: Optional[str] = None) -> Optional[Dict[str, str]]:
         """
-        Генерирует название и описание способности на основе концепции и параметров
+        Генерирует название и описание способности на основе концепции и параметров.
+        use_cache=False - не брать ответ из кэша (явная перегенерация), но сохранить новый.
+        cancel_event - если установлен, запрос к модели прерывается.
+        profile - профиль моделей (например fast для черновиков, quality для финальных описаний)
         """
         try:
-            # Формируем промпт для генерации способности
-            prompt = self._build_ability_prompt(concept, parameters, keywords)
+            # Формируем запрос для генерации способности
+            with stage_timer('prompt_build'):
+                payload = self.build_ability_payload(concept, parameters, keywords, profile)
             
-            payload = {
-                "model": "gpt-oss:latest",  # Можно сделать настраиваемым
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "stream": False,
-                "options": {
-                    "num_predict": 2000,  # Увеличиваем максимальное количество токенов
-                    "temperature": 0.8,   # Немного повышаем креативность
-                    "top_p": 0.9
-                }
-            }
+            cache_key = ResponseCache.make_key(payload['model'], payload['options'],
+                                               prompt_text(payload['messages']))
+            if self.cache is not None and use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
             
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=30
-            )
+            def generate():
+                content = self._chat(payload, self._stream_parser(payload, ABILITY_PATTERN), cancel_event)
+                if content is None:
+                    return None
+                
+                with stage_timer('parse'):
+                    result = parse_ability(content)
+                outcome = 'parsed'
+                if result is None:
+                    # Короткий запрос на исправление формата вместо полной перегенерации
+                    result = parse_ability(self._repair(build_ability_repair_prompt(content),
+                                                        cancel_event, profile) or '')
+                    outcome = 'repaired' if result else 'failed'
+                get_parse_stats().record(payload['model'], 'ability', outcome)
+                
+                if self.cache is not None and result is not None:
+                    self.cache.set(cache_key, result)
+                return result
             
-            if response.status_code == 200:
-                result = response.json()
-                content = result.get('message', {}).get('content', '')
-                return self._parse_ability_response(content)
-            else:
-                self.logger.error(f"LLM request failed with status {response.status_code}")
-                return None
+            return self._coalesce(cache_key, generate, cancel_event)
                 
+        except OverloadedError:
+            raise
         except Exception as e:
+            ERRORS.inc(stage='ability')
             self.logger.error(f"Failed to generate ability description: {e}")
             return None
     
-    def generate_character_summary(self, concept: str, abilities: list) -> Optional[str]:
+    def build_ability_payload(self,
+                              concept: str,
+                              parameters: Dict[str, Any],
+                              keywords: str = '',
+                              profile: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Тело запроса /api/chat для генерации одной способности
         """
-        Генерирует общее описание персонажа на основе концепции и способностей
+        settings = self._settings('ability', profile)
+        structured = self._structured(settings)
+        return self._build_payload(
+            settings,
+            self._build_ability_messages(concept, parameters, keywords, structured),
+            json_format=structured
+        )
+    
+    def get_context_length(self, model: str) -> int:
         """
+        Длина контекста модели (из /api/show), не больше MAX_BATCH_CONTEXT.
+        Значение запоминается; при ошибке - DEFAULT_CONTEXT_LENGTH
+        """
+        context_length = self._context_lengths.get(model)
+        if context_length is not None:
+            return context_length
+        
+        context_length = DEFAULT_CONTEXT_LENGTH
         try:
-            prompt = self._build_summary_prompt(concept, abilities)
-            
-            payload = {
-                "model": "llama3.1:latest",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "stream": False
-            }
+            response = self._request('POST', '/api/show', json={"model": model},
+                                     timeout=(self.connect_timeout, self.timeout))
+            if response.status_code == 200:
+                model_info = response.json().get('model_info', {})
+                lengths = [value for key, value in model_info.items() if key.endswith('.context_length')]
+                if lengths:
+                    context_length = min(int(lengths[0]), MAX_BATCH_CONTEXT)
+        except Exception as e:
+            self.logger.warning(f"Failed to get context length for {model}: {e}")
+        
+        self._context_lengths[model] = context_length
+        return context_length
+    
+    def plan_ability_batches(self,
+                             concept: str,
+                             items: List[Tuple[Dict[str, Any], str]],
+                             max_batch_size: int = MAX_BATCH_SIZE,
+                             profile: Optional[str] = None) -> List[List[int]]:
+        """
+        Делит способности на пакеты (списки индексов в items) так,
+        чтобы промпт и ожидаемый ответ каждого пакета помещались в контекст модели.
+        Пакетный ответ возможен только в JSON: если профиль его отключает, каждая способность - отдельный пакет
+        """
+        settings = self._settings('ability', profile)
+        if not self._structured(settings):
+            return [[index] for index in range(len(items))]
+        context_length = self.get_context_length(settings.model)
+        if settings.num_ctx:
+            context_length = min(context_length, settings.num_ctx)
+        budget = context_length - estimate_tokens(prompt_text(self._build_ability_batch_messages(concept, [])))
+        
+        batches = []
+        current, used = [], 0
+        for index, (parameters, keywords) in enumerate(items):
+            cost = estimate_tokens(self._format_batch_item(index + 1, parameters, keywords)) + BATCH_OUTPUT_TOKENS
+            if current and (used + cost > budget or len(current) >= max_batch_size):
+                batches.append(current)
+                current, used = [], 0
+            current.append(index)
+            used += cost
+        if current:
+            batches.append(current)
+        
+        return batches
+    
+    def generate_ability_descriptions_batch(self,
+                                            concept: str,
+                                            items: List[Tuple[Dict[str, Any], str]],
+                                            use_cache: bool = True,
+                                            cancel_event: Optional[threading.Event] = None,
+                                            profile: Optional[str] = None) -> List[Optional[Dict[str, str]]]:
+        """
+        Генерирует названия и описания нескольких способностей одним запросом.
+        items - список пар (параметры, ключевые слова); размер пакета подбирает plan_ability_batches.
+        Возвращает список той же длины, None - способность не удалось разобрать из ответа
+        """
+        try:
+            with stage_timer('prompt_build'):
+                payload = self._build_payload(
+                    self._settings('ability', profile),
+                    self._build_ability_batch_messages(concept, items),
+                    {"num_predict": BATCH_OUTPUT_TOKENS * len(items) + 500},
+                    json_format=True
+                )
             
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=30
-            )
+            cache_key = ResponseCache.make_key(payload['model'], dict(payload['options'], format='json'),
+                                               prompt_text(payload['messages']))
+            if self.cache is not None and use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
             
-            if response.status_code == 200:
-                result = response.json()
-                content = result.get('message', {}).get('content', '')
-                return self._parse_summary_response(content)
-            else:
-                self.logger.error(f"LLM request failed with status {response.status_code}")
-                return None
+            def generate():
+                content = self._chat(payload, cancel_event=cancel_event)
+                if content is None:
+                    return None
                 
+                with stage_timer('parse'):
+                    results = parse_ability_batch(content, len(items))
+                parsed = sum(1 for result in results if result)
+                # Пропущенные способности дозапрашиваются по одной (см. AbilityGenerator)
+                get_parse_stats().record(payload['model'], 'ability_batch', 'parsed', parsed)
+                get_parse_stats().record(payload['model'], 'ability_batch', 'failed', len(items) - parsed)
+                if self.cache is not None and all(results):
+                    self.cache.set(cache_key, results)
+                return results
+            
+            return self._coalesce(cache_key, generate, cancel_event) or [None] * len(items)
+        
+        except OverloadedError:
+            raise
+        except Exception as e:
+            ERRORS.inc(stage='ability_batch')
+            self.logger.error(f"Failed to generate ability batch: {e}")
+            return [None] * len(items)
+    
+    def generate_character_summary(self,
+                                   concept: str,
+                                   abilities: list,
+                                   use_cache: bool = True,
+                                   cancel_event: Optional[threading.Event] = None,
+                                   profile: Optional[str] = None) -> Optional[str]:
+        """
+        Генерирует общее описание персонажа на основе концепции и способностей.
+        Способности передаются дайджестами (см. ability_digest); если дайджесты не помещаются
+        в бюджет промпта, группы способностей описываются параллельно, а итог строится по ним.
+        Модель - загруженная модель способностей, если модель описания не в памяти (см. _summary_settings)
+        """
+        try:
+            settings = self._summary_settings(profile)
+            digests = [ability_digest(ability) for ability in abilities]
+            return self._summarize_digests(concept, digests, settings, self._summary_prompt_budget(settings),
+                                           use_cache, cancel_event, profile)
+        
+        except OverloadedError:
+            raise
         except Exception as e:
+            ERRORS.inc(stage='summary')
             self.logger.error(f"Failed to generate character summary: {e}")
             return None
     
+    def pending_requests(self) -> int:
+        """
+        Запросы /api/chat этого клиента, которые выполняются или ждут слот лимита
+        """
+        with self._active_lock:
+            active = self._active_requests
+        return active + (self.limiter.queued if self.limiter is not None else 0)
+    
+    def get_loaded_models(self) -> List[str]:
+        """
+        Модели, загруженные сейчас в память Ollama (/api/ps); список запоминается на LOADED_MODELS_TTL секунд
+        """
+        checked_at, models = self._loaded_models
+        if time.monotonic() - checked_at < LOADED_MODELS_TTL:
+            return models
+        try:
+            response = self._request('GET', '/api/ps', timeout=(self.connect_timeout, 5))
+            models = [model['name'] for model in response.json().get('models', [])] \
+                if response.status_code == 200 else []
+        except Exception as e:
+            self.logger.warning(f"Failed to get loaded models: {e}")
+            models = []
+        self._loaded_models = (time.monotonic(), models)
+        return models
+    
+    def _summary_settings(self, profile: Optional[str] = None) -> TaskSettings:
+        """
+        Модель описания персонажа. Если модель профиля не загружена, а модель способностей
+        уже в памяти, описание строится на ней с её num_ctx и keep_alive - без загрузки второй модели
+        """
+        settings = self._settings('summary', profile)
+        if not self.summary_on_loaded_model:
+            return settings
+        loaded = self.get_loaded_models()
+        ability = self._settings('ability', profile)
+        if settings.model in loaded or ability.model not in loaded:
+            return settings
+        
+        options = {key: value for key, value in settings.options.items() if key != 'num_ctx'}
+        if ability.num_ctx:
+            options['num_ctx'] = ability.num_ctx
+        self.logger.info(f"Summary on loaded model {ability.model} instead of {settings.model}")
+        return TaskSettings(ability.model, options, ability.keep_alive)
+    
+    def _summary_prompt_budget(self, settings: TaskSettings) -> int:
+        """
+        Сколько токенов дайджестов помещается в один промпт описания
+        """
+        budget = self.summary_budget
+        if settings.num_ctx:
+            overhead = estimate_tokens(self._build_summary_prompt('', [])) + SUMMARY_OUTPUT_TOKENS
+            budget = min(budget, settings.num_ctx - overhead)
+        return max(budget, 200)
+    
+    def _summarize_digests(self,
+                           concept: str,
+                           lines: List[str],
+                           settings: TaskSettings,
+                           budget: int,
+                           use_cache: bool,
+                           cancel_event: Optional[threading.Event],
+                           profile: Optional[str],
+                           parts: bool = False) -> Optional[str]:
+        """
+        Описание по строкам (дайджестам способностей или описаниям групп, parts=True).
+        Строки сверх бюджета делятся на группы, описываемые параллельно, и итог строится по описаниям групп
+        """
+        groups = self._pack_lines(concept, lines, budget)
+        if len(groups) == 1 or len(groups) == len(lines):
+            return self._summarize(concept, lines, settings, use_cache, cancel_event, profile, parts=parts)
+        
+        def summarize_group(group):
+            return self._summarize(concept, group, settings, use_cache, cancel_event, profile,
+                                   parts=parts, partial=True)
+        
+        with ThreadPoolExecutor(max_workers=min(SUMMARY_MAP_WORKERS, len(groups))) as executor:
+            partials = list(executor.map(bind_context(summarize_group), groups))
+        partials = [partial for partial in partials if partial]
+        if not partials:
+            return None
+        return self._summarize_digests(concept, partials, settings, budget, use_cache, cancel_event, profile,
+                                       parts=True)
+    
+    def _pack_lines(self, concept: str, lines: List[str], budget: int) -> List[List[str]]:
+        """
+        Делит строки на группы, каждая из которых (вместе с концепцией) помещается в бюджет
+        """
+        budget = max(1, budget - estimate_tokens(concept))
+        groups = []
+        current, used = [], 0
+        for line in lines:
+            cost = estimate_tokens(line)
+            if current and used + cost > budget:
+                groups.append(current)
+                current, used = [], 0
+            current.append(line)
+            used += cost
+        if current or not groups:
+            groups.append(current)
+        return groups
+    
+    def _summarize(self,
+                   concept: str,
+                   lines: List[str],
+                   settings: TaskSettings,
+                   use_cache: bool,
+                   cancel_event: Optional[threading.Event],
+                   profile: Optional[str],
+                   parts: bool = False,
+                   partial: bool = False) -> Optional[str]:
+        """
+        Один запрос описания: итоговое или (partial=True) промежуточное описание группы
+        """
+        structured = self._structured(settings)
+        with stage_timer('prompt_build'):
+            prompt = self._build_summary_prompt(concept, lines, structured, parts, partial)
+        
+        payload = self._build_payload(
+            settings,
+            [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            {"num_predict": SUMMARY_PART_TOKENS} if partial else None,
+            json_format=structured
+        )
+        
+        cache_key = ResponseCache.make_key(payload['model'], payload['options'], prompt)
+        if self.cache is not None and use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        def generate():
+            content = self._chat(payload, self._stream_parser(payload, SUMMARY_PATTERN), cancel_event)
+            if content is None:
+                return None
+            
+            with stage_timer('parse'):
+                summary = parse_summary(content)
+            outcome = 'parsed'
+            if summary is None:
+                summary = parse_summary(self._repair(build_summary_repair_prompt(content),
+                                                     cancel_event, profile) or '')
+                outcome = 'repaired' if summary else 'failed'
+            get_parse_stats().record(payload['model'], 'summary_part' if partial else 'summary', outcome)
+            
+            if self.cache is not None and summary:
+                self.cache.set(cache_key, summary)
+            return summary
+        
+        return self._coalesce(cache_key, generate, cancel_event)
+    
+    def _coalesce(self, key: str, generate, cancel_event: Optional[threading.Event] = None):
+        """
+        Выполняет generate() через single-flight: одинаковые одновременные запросы
+        к этому серверу получают результат одного обращения к модели
+        """
+        if self.single_flight is None:
+            return generate()
+        cancelled = cancel_event.is_set if cancel_event is not None else None
+        return self.single_flight.do(f"{self.base_url}|{key}", generate, cancelled)
+    
+    def _stream_parser(self, payload: Dict[str, Any], pattern):
+        """
+        Инкрементальный разбор для раннего завершения потокового ответа (в формате, который просит payload)
+        """
+        return IncrementalJSONParser() if payload.get('format') == 'json' else IncrementalTemplateParser(pattern)
+    
+    def _repair(self,
+                prompt: str,
+                cancel_event: Optional[threading.Event] = None,
+                profile: Optional[str] = None) -> Optional[str]:
+        """
+        Короткий запрос к модели: привести неразобранный ответ к JSON
+        (format: json, если профиль не отключает его для модели исправления)
+        """
+        settings = self._settings('repair', profile)
+        payload = self._build_payload(
+            settings,
+            [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            json_format=settings.structured_output is not False
+        )
+        self.logger.info(f"Repairing unparsed response with {payload['model']}")
+        return self._chat(payload, IncrementalJSONParser(), cancel_event)
+    
+    def _settings(self, task: str, profile: Optional[str] = None) -> TaskSettings:
+        """
+        Модель и опции задачи из профиля (см. models/model_profiles.py)
+        """
+        return (self.registry or get_model_registry()).resolve(task, profile)
+    
+    def _structured(self, settings: TaskSettings) -> bool:
+        """
+        Просить ли модель задачи отвечать в JSON: настройка профиля или LLM_STRUCTURED_OUTPUT
+        """
+        return self.structured_output if settings.structured_output is None else settings.structured_output
+    
+    def _build_payload(self,
+                       settings: TaskSettings,
+                       messages: List[Dict[str, str]],
+                       options: Optional[Dict[str, Any]] = None,
+                       json_format: bool = False) -> Dict[str, Any]:
+        """
+        Тело запроса /api/chat: модель, опции и keep_alive профиля,
+        options дополняют или заменяют опции профиля для этого запроса
+        """
+        payload = {
+            "model": settings.model,
+            "messages": messages,
+            "options": dict(settings.options, **(options or {}))
+        }
+        if settings.keep_alive:
+            payload["keep_alive"] = settings.keep_alive
+        if json_format:
+            payload["format"] = "json"
+        return payload
+    
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """
+        HTTP-запрос к серверу Ollama (в OllamaPoolClient - к выбранному узлу);
+        session - другая HTTP-сессия вместо сессии клиента
+        """
+        session = kwargs.pop('session', None) or self.session
+        return session.request(method, f"{self.base_url}{path}", **kwargs)
+    
+    def _chat(self,
+              payload: Dict[str, Any],
+              parser: Optional[IncrementalTemplateParser] = None,
+              cancel_event: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Выполняет запрос к /api/chat и возвращает текст ответа модели.
+        В потоковом режиме читает ответ построчно и закрывает соединение,
+        как только parser сообщает о закрытом шаблоне или установлен cancel_event.
+        Длительность запроса и показатели Ollama (eval/prompt_eval) попадают в метрики.
+        При включённом limiter запрос сначала ждёт свободный слот (OverloadedError - сервер перегружен)
+        """
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        
+        model = payload.get('model', '')
+        if self.limiter is not None and not self.limiter.acquire(cancel_event.is_set if cancel_event else None):
+            OLLAMA_REQUESTS.inc(model=model, outcome='cancelled')
+            return None
+        
+        outcome = 'error'
+        timing = {}
+        started = time.perf_counter()
+        with self._active_lock:
+            self._active_requests += 1
+        try:
+            content, outcome = self._chat_request(payload, parser, cancel_event, timing)
+            return content
+        except requests.Timeout:
+            outcome = 'timeout'
+            raise
+        finally:
+            with self._active_lock:
+                self._active_requests -= 1
+            elapsed = time.perf_counter() - started
+            STAGE_DURATION.observe(elapsed, stage='ollama_call')
+            OLLAMA_REQUESTS.inc(model=model, outcome=outcome)
+            if outcome in ('http_error', 'error', 'timeout'):
+                ERRORS.inc(stage='ollama_call')
+            if self.limiter is not None:
+                # Таймаут и перегрузка сервера уменьшают лимит; отменённый запрос не учитывается
+                overloaded = outcome == 'timeout' or timing.get('status') in (429, 500, 502, 503, 504)
+                self.limiter.release(None if outcome == 'cancelled' else timing.get('first_byte'),
+                                     failed=overloaded,
+                                     duration=elapsed if outcome in ('ok', 'early_stop') else None)
+    
+    def _chat_request(self,
+                      payload: Dict[str, Any],
+                      parser: Optional[IncrementalTemplateParser],
+                      cancel_event: Optional[threading.Event],
+                      timing: Optional[Dict[str, Any]] = None) -> Tuple[Optional[str], str]:
+        """
+        Запрос к /api/chat; возвращает (текст ответа, исход запроса для метрик).
+        В timing записываются время до первого байта ответа (first_byte) и код ответа (status)
+        """
+        timing = timing if timing is not None else {}
+        payload = dict(payload, stream=self.stream)
+        started = time.perf_counter()
+        response = self._request(
+            'POST',
+            '/api/chat',
+            json=payload,
+            headers={"Content-Type": "application/json"},
+            timeout=(self.connect_timeout, self.timeout),
+            stream=self.stream
+        )
+        timing['first_byte'] = time.perf_counter() - started
+        timing['status'] = response.status_code
+        
+        if response.status_code != 200:
+            self.logger.error(f"LLM request failed with status {response.status_code}",
+                              extra={'model': payload.get('model'), 'status_code': response.status_code})
+            response.close()
+            return None, 'http_error'
+        
+        if not self.stream:
+            result = response.json()
+            observe_ollama_response(payload.get('model', ''), result)
+            return result.get('message', {}).get('content', ''), 'ok'
+        
+        chunks = []
+        outcome = 'ok'
+        first_token = None
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    self.logger.error(f"LLM stream error: {chunk['error']}", extra={'model': payload.get('model')})
+                    return None, 'error'
+                
+                if cancel_event is not None and cancel_event.is_set():
+                    # Закрытие соединения останавливает генерацию на стороне Ollama
+                    self.logger.info("LLM request cancelled")
+                    return None, 'cancelled'
+                
+                piece = chunk.get('message', {}).get('content', '')
+                chunks.append(piece)
+                if piece and first_token is None:
+                    first_token = time.perf_counter() - started
+                
+                if chunk.get('done'):
+                    # Итоговый фрагмент содержит длительности и число токенов
+                    observe_ollama_response(payload.get('model', ''), chunk)
+                    break
+                if parser is not None and parser.feed(piece):
+                    # Ответ уже полный - прерываем генерацию на стороне сервера.
+                    # Итоговой статистики Ollama в этом случае нет - записываем оценку по времени токенов
+                    outcome = 'early_stop'
+                    observe_ollama_estimate(payload.get('model', ''), first_token, time.perf_counter() - started)
+                    break
+        finally:
+            response.close()
+        
+        return ''.join(chunks), outcome
+    
     def _build_ability_prompt(self, 
                               concept: str, 
                               parameters: Dict[str, Any],
-                              keywords: str = '') -> str:
+                              keywords: str = '',
+                              structured: bool = False) -> str:
         """
-        Строит промпт для генерации описания способности
+        Строит промпт для генерации описания способности.
+        structured=True - ответ в формате JSON (для format: json)
+        """
+        params_text = self._format_parameters(parameters)
+
+        keywords_section = ""
+        if keywords and keywords.strip():
+            keywords_section = f"\nКлючевые слова для способности: {keywords}\nОбязательно учитывай эти ключевые слова при генерации описания способности.\n"
+        
+        answer_format = ABILITY_JSON_FORMAT if structured else ABILITY_TEMPLATE_FORMAT
+        
+        prompt = f"""Ты генератор способностей для игровых персонажей. 
+
+Концепция персонажа: {concept}
+
+Ключевые слова для способности: {keywords_section}
+Параметры способности: {params_text}
+
+По этим данным придумай название для способности и текстовое описание, которое суммаризирует данную способность. {answer_format}"""
+        
+        return prompt
+    
+    def _build_ability_messages(self,
+                                concept: str,
+                                parameters: Dict[str, Any],
+                                keywords: str = '',
+                                structured: bool = True) -> List[Dict[str, str]]:
+        """
+        Сообщения запроса способности (structured - ответ в JSON, иначе текстовый шаблон). С общим префиксом: неизменная инструкция (system),
+        затем концепция персонажа и только потом параметры и ключевые слова способности,
+        чтобы запросы одного персонажа совпадали в начале и Ollama не вычисляла его заново
+        """
+        if not self.shared_prefix:
+            return [{
+                "role": "user",
+                "content": self._build_ability_prompt(concept, parameters, keywords, structured)
+            }]
+        
+        answer_format = ABILITY_JSON_FORMAT if structured else ABILITY_TEMPLATE_FORMAT
+        content = f"Концепция персонажа: {concept}\n\n"
+        if keywords and keywords.strip():
+            content += f"Ключевые слова для способности: {keywords}\n"
+        content += f"Параметры способности: {self._format_parameters(parameters)}"
+        
+        return [
+            {"role": "system", "content": ABILITY_INSTRUCTIONS + answer_format},
+            {"role": "user", "content": content}
+        ]
+    
+    def _build_ability_batch_messages(self,
+                                      concept: str,
+                                      items: List[Tuple[Dict[str, Any], str]]) -> List[Dict[str, str]]:
+        """
+        Сообщения пакетного запроса (см. _build_ability_messages)
+        """
+        if not self.shared_prefix:
+            return [{"role": "user", "content": self._build_ability_batch_prompt(concept, items)}]
+        
+        items_text = "\n".join(self._format_batch_item(number, parameters, keywords)
+                               for number, (parameters, keywords) in enumerate(items, start=1))
+        content = f"""Концепция персонажа: {concept}
+
+Способности ({len(items)}):
+{items_text}
+
+Ответь для всех {len(items)} способностей, по одному объекту на каждую."""
+        
+        return [
+            {"role": "system", "content": ABILITY_BATCH_INSTRUCTIONS},
+            {"role": "user", "content": content}
+        ]
+    
+    def _format_parameters(self, parameters: Dict[str, Any]) -> str:
+        """
+        Параметры способности одной строкой для промпта
         """
         param_descriptions = []
         for param_name, param_data in parameters.items():
@@ -133,89 +869,350 @@ class OllamaClient:
             description = param_data.get('description', '')
             param_descriptions.append(f"'{param_name}': {description} (значение: {value})")
         
-        params_text = "; ".join(param_descriptions)
-
-        keywords_section = ""
+        return "; ".join(param_descriptions)
+    
+    def _format_batch_item(self, number: int, parameters: Dict[str, Any], keywords: str = '') -> str:
+        """
+        Описание одной способности в пакетном промпте
+        """
+        item = f"{number}. Параметры: {self._format_parameters(parameters)}"
         if keywords and keywords.strip():
-            keywords_section = f"\nКлючевые слова для способности: {keywords}\nОбязательно учитывай эти ключевые слова при генерации описания способности.\n"
+            item += f"\n   Ключевые слова (обязательно учитывай): {keywords}"
+        return item
+    
+    def _build_ability_batch_prompt(self, concept: str, items: List[Tuple[Dict[str, Any], str]]) -> str:
+        """
+        Строит один промпт для нескольких способностей с ответом в формате JSON.
+        items - список пар (параметры, ключевые слова)
+        """
+        items_text = "\n".join(self._format_batch_item(number, parameters, keywords)
+                               for number, (parameters, keywords) in enumerate(items, start=1))
         
         prompt = f"""Ты генератор способностей для игровых персонажей. 
 
 Концепция персонажа: {concept}
 
-Ключевые слова для способности: {keywords_section}
-Параметры способности: {params_text}
+Способности ({len(items)}):
+{items_text}
 
-По этим данным придумай название для способности и текстовое описание, которое суммаризирует данную способность. Ответ на русском языке, строго по шаблону:
-(название:'<название способности>';описание:'<описание способности>')
+Для каждой способности придумай название и текстовое описание, которое суммаризирует данную способность. Ответ на русском языке, строго в формате JSON:
+{{"abilities": [{{"id": <номер способности>, "name": "<название способности>", "description": "<описание способности>"}}]}}
 
-Не используй кавычки внутри названия и описания."""
+Ответь для всех {len(items)} способностей, по одному объекту на каждую."""
         
         return prompt
     
-    def _build_summary_prompt(self, concept: str, abilities: list) -> str:
+    def _build_summary_prompt(self,
+                              concept: str,
+                              lines: List[str],
+                              structured: bool = False,
+                              parts: bool = False,
+                              partial: bool = False) -> str:
         """
-        Строит промпт для генерации общего описания персонажа
+        Строит промпт описания персонажа по дайджестам способностей (parts=True - по описаниям
+        групп способностей); partial=True - промежуточное описание одной группы
         """
-        abilities_text = "\n".join([f"- {ability.get('name', 'Безымянная способность')}: {ability.get('description', 'Без описания')}" 
-                                   for ability in abilities])
+        items_text = "\n".join(f"- {line}" for line in lines)
+        
+        if structured:
+            answer_format = 'Ответ строго в формате JSON {"summary": "<общее описание>"}'
+        else:
+            answer_format = "Ответ строго по шаблону (суммаризация:'<общее описание>')"
+        
+        if partial:
+            task = "Кратко, в 2-3 предложениях, опиши, что объединяет эти способности персонажа."
+        else:
+            task = "По данной информации выше, опиши в целом способности этого персонажа."
+        title = "Описания групп способностей" if parts else "Способности"
         
-        prompt = f"""По данной информации выше, опиши в целом способности этого персонажа.
+        prompt = f"""{task}
 
 Концепция персонажа: {concept}
 
-Способности:
-{abilities_text}
+{title}:
+{items_text}
 
-Ответ строго по шаблону (суммаризация:'<общее описание>')"""
+{answer_format}"""
         
         return prompt
+
+
+class OllamaBackend:
+    """
+    Узел пула Ollama: состояние здоровья, число активных запросов и средняя задержка
+    """
     
-    def _parse_ability_response(self, content: str) -> Optional[Dict[str, str]]:
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.in_flight = 0
+        self.latency = None  # экспоненциальное среднее, секунды
+        self.last_error = None
+        self.last_check = None
+    
+    def record_latency(self, seconds: float, alpha: float = 0.3) -> None:
+        self.latency = seconds if self.latency is None else alpha * seconds + (1 - alpha) * self.latency
+    
+    def score(self) -> float:
+        # Меньше - лучше: активные запросы, умноженные на ожидаемую задержку
+        return (self.in_flight + 1) * (self.latency if self.latency is not None else 1.0)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'latency': self.latency,
+            'last_error': self.last_error,
+            'last_check': self.last_check
+        }
+
+
+class OllamaPoolClient(OllamaClient):
+    """
+    Клиент для нескольких серверов Ollama с тем же интерфейсом, что у OllamaClient.
+    Каждый запрос уходит на наименее загруженный здоровый узел (активные запросы и задержка),
+    при ошибке соединения повторяется на другом узле. Здоровье узлов проверяется
+    в фоне запросом /api/tags.
+    """
+    
+    def __init__(self, urls: List[str], health_interval: float = 10, **kwargs):
+        # Переключение на другой узел заменяет повторы на том же узле
+        kwargs.setdefault('session', create_session(retries=0))
+        super().__init__(url=urls[0], **kwargs)
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        # Останавливает фоновую проверку здоровья (см. close)
+        self._closed = threading.Event()
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True,
+                                               name='ollama-health-check')
+        self._health_thread.start()
+    
+    def close(self) -> None:
+        self._closed.set()
+        super().close()
+    
+    def backend_status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [backend.to_dict() for backend in self.backends]
+    
+    def check_health(self) -> None:
         """
-        Парсит ответ LLM для способности
+        Проверяет все узлы запросом /api/tags
         """
-        try:
-            # Ищем паттерн (название:'...';описание:'...')
-            import re
-            pattern = r'\(название:\'([^\']*)\';описание:\'([\s\S]*?)\'\)'
-            match = re.search(pattern, content)
+        for backend in self.backends:
+            started = time.monotonic()
+            try:
+                response = self.session.get(f"{backend.url}/api/tags", timeout=(self.connect_timeout, 5))
+                healthy = response.status_code == 200
+                error = None if healthy else f"status {response.status_code}"
+            except requests.RequestException as e:
+                healthy, error = False, str(e)
             
-            if match:
-                return {
-                    'name': match.group(1),
-                    'description': match.group(2)
-                }
-            else:
-                # Если не удалось найти паттерн, пытаемся извлечь любым способом
-                lines = content.split('\n')
-                for line in lines:
-                    if 'название' in line.lower() or 'способность' in line.lower():
-                        # Простая эвристика для извлечения
-                        return {
-                            'name': 'Сгенерированная способность',
-                            'description': content.strip()
-                        }
+            with self._lock:
+                if healthy and not backend.healthy:
+                    self.logger.info(f"Ollama backend {backend.url} is healthy again")
+                elif not healthy and backend.healthy:
+                    self.logger.warning(f"Ollama backend {backend.url} is unhealthy: {error}")
+                backend.healthy = healthy
+                backend.last_error = error
+                backend.last_check = time.time()
+                if healthy:
+                    backend.record_latency(time.monotonic() - started)
+    
+    def _health_loop(self) -> None:
+        while not self._closed.is_set():
+            try:
+                self.check_health()
+            except Exception as e:
+                self.logger.error(f"Ollama health check failed: {e}")
+            self._closed.wait(self.health_interval)
+    
+    def _acquire_backend(self, exclude: set) -> Optional[OllamaBackend]:
+        with self._lock:
+            candidates = [b for b in self.backends if b.url not in exclude and b.healthy]
+            if not candidates:
+                # Все узлы помечены больными - всё равно пробуем оставшиеся
+                candidates = [b for b in self.backends if b.url not in exclude]
+            if not candidates:
                 return None
-        except Exception as e:
-            self.logger.error(f"Failed to parse ability response: {e}")
-            return None
+            backend = min(candidates, key=lambda b: b.score())
+            backend.in_flight += 1
+            return backend
     
-    def _parse_summary_response(self, content: str) -> Optional[str]:
-        """
-        Парсит ответ LLM для суммаризации
-        """
-        try:
-            # Ищем паттерн (суммаризация:'...')
-            import re
-            pattern = r'\(суммаризация:\'([^\']*)\'\)'
-            match = re.search(pattern, content)
+    def _release_backend(self, backend: OllamaBackend) -> None:
+        with self._lock:
+            backend.in_flight -= 1
+    
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        session = kwargs.pop('session', None) or self.session
+        tried = set()
+        last_error = None
+        
+        while True:
+            backend = self._acquire_backend(tried)
+            if backend is None:
+                raise last_error or requests.ConnectionError("No Ollama backends configured")
+            tried.add(backend.url)
+            
+            started = time.monotonic()
+            try:
+                response = session.request(method, f"{backend.url}{path}", **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._release_backend(backend)
+                with self._lock:
+                    backend.healthy = False
+                    backend.last_error = str(e)
+                self.logger.warning(f"Ollama backend {backend.url} failed, trying another: {e}")
+                last_error = e
+                continue
+            
+            with self._lock:
+                backend.record_latency(time.monotonic() - started)
+            
+            if not kwargs.get('stream'):
+                self._release_backend(backend)
+                return response
             
-            if match:
-                return match.group(1)
+            # Потоковый ответ занимает узел, пока его не закроют
+            original_close = response.close
+            released = []
+            
+            def close():
+                original_close()
+                if not released:
+                    released.append(True)
+                    self._release_backend(backend)
+            
+            response.close = close
+            return response
+
+
+# Реестр клиентов процесса: один клиент (и пул соединений) на каждый адрес Ollama
+DEFAULT_OLLAMA_URL = 'http://localhost:11434'
+
+
+def split_urls(url: str) -> List[str]:
+    return [part.strip().rstrip('/') for part in url.split(',') if part.strip()]
+
+
+def default_ollama_urls() -> List[str]:
+    """
+    Серверы Ollama из настроек (OLLAMA_URLS, через запятую): из них строится пул,
+    и только они разрешены в ollama_url запросов. Пусто - разрешён любой один адрес
+    """
+    return split_urls(os.environ.get('OLLAMA_URLS', ''))
+
+
+# Сколько клиентов держит реестр get_client: адрес приходит из запроса,
+# поэтому давно не использованные клиенты вытесняются и закрываются
+MAX_CLIENTS = 32
+
+_clients: 'OrderedDict[str, OllamaClient]' = OrderedDict()
+_clients_lock = threading.Lock()
+_response_cache: Optional[ResponseCache] = None
+_single_flight: Optional[SingleFlight] = None
+_limiter_factory: Optional[Callable[[str], AdaptiveLimiter]] = None
+_ollama_urls: List[str] = default_ollama_urls()
+
+
+def set_ollama_urls(url: Optional[str]) -> None:
+    """
+    Задаёт серверы Ollama процесса (как OLLAMA_URLS): адреса через запятую, None - без ограничения
+    """
+    global _ollama_urls
+    with _clients_lock:
+        _ollama_urls = split_urls(url or '')
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    """
+    Включает общий кэш ответов для всех клиентов реестра (None - выключает)
+    """
+    global _response_cache
+    with _clients_lock:
+        _response_cache = cache
+        for client in _clients.values():
+            client.cache = cache
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    return _response_cache
+
+
+def set_single_flight(single_flight: Optional[SingleFlight]) -> None:
+    """
+    Задаёт объединение одинаковых запросов для всех клиентов процесса (None - выключить)
+    """
+    global _single_flight
+    with _clients_lock:
+        _single_flight = single_flight
+        for client in _clients.values():
+            client.single_flight = single_flight
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    return _single_flight
+
+
+def set_limiter_factory(factory: Optional[Callable[[str], AdaptiveLimiter]]) -> None:
+    """
+    Включает адаптивный лимит запросов: factory(url) создаёт ограничитель
+    для каждого адреса Ollama в реестре (None - без ограничения)
+    """
+    global _limiter_factory
+    with _clients_lock:
+        _limiter_factory = factory
+        for key, client in _clients.items():
+            client.limiter = factory(key) if factory is not None else None
+
+
+def get_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Состояние ограничителей по адресам Ollama
+    """
+    with _clients_lock:
+        clients = dict(_clients)
+    return {key: client.limiter.stats() for key, client in clients.items() if client.limiter is not None}
+
+
+def get_client(url: Optional[str] = None) -> OllamaClient:
+    """
+    Возвращает общий для процесса клиент для указанного адреса Ollama,
+    создавая его при первом обращении. Реестр хранит не больше MAX_CLIENTS клиентов,
+    давно не использованные закрываются.
+    Если серверы заданы настройкой (OLLAMA_URLS, set_ollama_urls), адрес должен быть одним из них
+    и возвращается клиент всех настроенных серверов (при нескольких - пул OllamaPoolClient).
+    Иначе допускается только один адрес: пул из адресов запроса не создаётся (ValueError)
+    """
+    urls = split_urls(url or '')
+    evicted = []
+    with _clients_lock:
+        if _ollama_urls:
+            unknown = [item for item in urls if item not in _ollama_urls]
+            if unknown:
+                raise ValueError(f"Ollama URL is not allowed: {unknown[0]} (see OLLAMA_URLS)")
+            urls = _ollama_urls
+        elif len(urls) > 1:
+            raise ValueError("Several Ollama servers must be configured with OLLAMA_URLS")
+        key = ','.join(urls or [DEFAULT_OLLAMA_URL])
+        urls = key.split(',')
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+        else:
+            limiter = _limiter_factory(key) if _limiter_factory is not None else None
+            if len(urls) > 1:
+                client = OllamaPoolClient(urls, cache=_response_cache, single_flight=_single_flight,
+                                          limiter=limiter)
             else:
-                # Если не удалось найти паттерн, возвращаем начало ответа
-                return content[:300] + '...' if len(content) > 300 else content
-        except Exception as e:
-            self.logger.error(f"Failed to parse summary response: {e}")
-            return None
\ No newline at end of file
+                client = OllamaClient(url=key, cache=_response_cache, single_flight=_single_flight,
+                                      limiter=limiter)
+            _clients[key] = client
+            while len(_clients) > MAX_CLIENTS:
+                evicted.append(_clients.popitem(last=False)[1])
+    # Генерации, ещё работающие с вытесненным клиентом, продолжат на новых соединениях
+    for old_client in evicted:
+        old_client.close()
+    return client
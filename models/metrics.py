@@ -0,0 +1,263 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм в секундах: от быстрых этапов (разбор, выборка) до генерации моделью
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PREFIX = 'abilityforge'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Монотонный счётчик с метками (Prometheus counter)
+    """
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}'
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge:
+    """
+    Текущее значение с метками (Prometheus gauge)
+    """
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}'
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """
+    Гистограмма длительностей с метками (Prometheus histogram)
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self,
+                 name: str,
+                 help_text: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [счётчики по корзинам (+Inf последней), сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        Замеряет длительность блока with
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, ('le', _format_number(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {_format_number(total)}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Набор метрик процесса и их вывод в текстовом формате Prometheus
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self,
+                  name: str,
+                  help_text: str,
+                  labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help_text}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Метрики процесса (GET /metrics)
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.histogram(
+    f'{PREFIX}_request_duration_seconds',
+    'HTTP request duration (for streaming responses - until the response starts)',
+    ('endpoint', 'method', 'status')
+)
+STAGE_DURATION = registry.histogram(
+    f'{PREFIX}_stage_duration_seconds',
+    'Duration of generation pipeline stages: prompt_build, ollama_call, parse, sampling, preview_sampling',
+    ('stage',)
+)
+OLLAMA_DURATION = registry.histogram(
+    f'{PREFIX}_ollama_duration_seconds',
+    'Ollama-reported durations from /api/chat: load, prompt_eval, eval; '
+    'prompt_eval_estimate and eval_estimate - client-side estimates for early-stopped streams',
+    ('model', 'phase')
+)
+OLLAMA_TOKENS = registry.counter(
+    f'{PREFIX}_ollama_tokens_total',
+    'Tokens processed by Ollama: prompt (prompt_eval_count) and generated (eval_count)',
+    ('model', 'kind')
+)
+OLLAMA_REQUESTS = registry.counter(
+    f'{PREFIX}_ollama_requests_total',
+    'Ollama /api/chat requests by outcome: ok, early_stop, cancelled, http_error, timeout, error',
+    ('model', 'outcome')
+)
+OLLAMA_QUEUE_WAIT = registry.histogram(
+    f'{PREFIX}_ollama_queue_wait_seconds',
+    'Time /api/chat calls waited for a slot of the adaptive concurrency limiter',
+    ('server',)
+)
+OLLAMA_REJECTED = registry.counter(
+    f'{PREFIX}_ollama_rejected_total',
+    'Ollama calls rejected by the concurrency limiter: queue_full, wait_timeout',
+    ('server', 'reason')
+)
+OLLAMA_CONCURRENCY_LIMIT = registry.gauge(
+    f'{PREFIX}_ollama_concurrency_limit',
+    'Current adaptive limit of concurrent /api/chat calls',
+    ('server',)
+)
+ALTERNATES = registry.counter(
+    f'{PREFIX}_alternates_total',
+    'Pre-generated ability alternates: hit, miss, generated, duplicate, failed',
+    ('outcome',)
+)
+ERRORS = registry.counter(
+    f'{PREFIX}_errors_total',
+    'Errors by pipeline stage',
+    ('stage',)
+)
+
+
+def stage_timer(stage: str):
+    """
+    Контекстный менеджер для замера этапа генерации
+    """
+    return STAGE_DURATION.time(stage=stage)
+
+
+def observe_ollama_response(model: str, data: Dict) -> None:
+    """
+    Учитывает длительности и число токенов из итогового ответа /api/chat (поля *_duration в наносекундах)
+    """
+    for phase in ('load', 'prompt_eval', 'eval'):
+        duration = data.get(f'{phase}_duration')
+        if duration:
+            OLLAMA_DURATION.observe(duration / 1e9, model=model, phase=phase)
+    if data.get('prompt_eval_count'):
+        OLLAMA_TOKENS.inc(data['prompt_eval_count'], model=model, kind='prompt')
+    if data.get('eval_count'):
+        OLLAMA_TOKENS.inc(data['eval_count'], model=model, kind='generated')
+
+
+def observe_ollama_estimate(model: str, first_token: Optional[float], total: float) -> None:
+    """
+    Оценка длительностей для потока, прерванного раньше итогового фрагмента (длительностей Ollama нет):
+    время до первого токена - обработка промпта (вместе с сетью и загрузкой модели), остальное - генерация
+    """
+    if first_token is None:
+        return
+    OLLAMA_DURATION.observe(first_token, model=model, phase='prompt_eval_estimate')
+    OLLAMA_DURATION.observe(max(0.0, total - first_token), model=model, phase='eval_estimate')
@@ -0,0 +1,275 @@
+import copy
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+# Задачи, для которых профиль задаёт модель и опции
+TASKS = ('ability', 'summary', 'repair')
+DEFAULT_PROFILE = 'default'
+
+# Сессия модели: сколько держать модель в памяти между запросами и размер контекста.
+# Одинаковые num_ctx в запросах к одной модели не дают Ollama перезагружать её и сбрасывать KV-кэш
+DEFAULT_KEEP_ALIVE = "30m"
+DEFAULT_NUM_CTX = 4096
+
+
+def default_num_ctx() -> int:
+    """
+    Размер контекста встроенных профилей: OLLAMA_NUM_CTX или DEFAULT_NUM_CTX
+    """
+    try:
+        return max(512, int(os.environ.get('OLLAMA_NUM_CTX', DEFAULT_NUM_CTX)))
+    except ValueError:
+        return DEFAULT_NUM_CTX
+
+
+def builtin_profiles() -> Dict[str, Dict[str, Any]]:
+    """
+    Профили по умолчанию (если файл профилей не задан).
+    fast - черновики на небольшой модели, quality - финальные описания
+    """
+    num_ctx = default_num_ctx()
+    keep_alive = os.environ.get('OLLAMA_KEEP_ALIVE', DEFAULT_KEEP_ALIVE)
+    return {
+        'default': {
+            'description': 'Сбалансированный профиль',
+            'ability': {'model': 'gpt-oss:latest', 'keep_alive': keep_alive,
+                        'options': {'num_predict': 2000, 'temperature': 0.8, 'top_p': 0.9, 'num_ctx': num_ctx}},
+            'summary': {'model': 'llama3.1:latest', 'keep_alive': keep_alive,
+                        'options': {'num_ctx': num_ctx}},
+            'repair': {'model': 'gpt-oss:latest', 'keep_alive': keep_alive,
+                       'options': {'num_predict': 600, 'temperature': 0, 'num_ctx': num_ctx}}
+        },
+        'fast': {
+            'description': 'Быстрые черновики на небольшой модели',
+            'ability': {'model': 'llama3.2:3b', 'keep_alive': keep_alive,
+                        'options': {'num_predict': 400, 'temperature': 0.8, 'top_p': 0.9, 'num_ctx': 2048}},
+            'summary': {'model': 'llama3.2:3b', 'keep_alive': keep_alive,
+                        'options': {'num_predict': 400, 'num_ctx': 2048}},
+            'repair': {'model': 'llama3.2:3b', 'keep_alive': keep_alive,
+                       'options': {'num_predict': 300, 'temperature': 0, 'num_ctx': 2048}}
+        },
+        'quality': {
+            'description': 'Финальные описания на большой модели',
+            'ability': {'model': 'gpt-oss:latest', 'keep_alive': keep_alive,
+                        'options': {'num_predict': 4000, 'temperature': 0.7, 'top_p': 0.9, 'num_ctx': 8192}},
+            'summary': {'model': 'gpt-oss:latest', 'keep_alive': keep_alive,
+                        'options': {'num_predict': 4000, 'num_ctx': 8192}},
+            'repair': {'model': 'gpt-oss:latest', 'keep_alive': keep_alive,
+                       'options': {'num_predict': 600, 'temperature': 0, 'num_ctx': 8192}}
+        }
+    }
+
+
+class UnknownProfileError(ValueError):
+    """
+    Запрошен профиль, которого нет в реестре
+    """
+
+
+class TaskSettings:
+    """
+    Модель и опции генерации Ollama для одной задачи профиля.
+    structured_output - просить ли у модели ответ в JSON (format: json);
+    None - как задано LLM_STRUCTURED_OUTPUT, false - для моделей, которые плохо справляются с JSON
+    """
+
+    def __init__(self,
+                 model: str,
+                 options: Optional[Dict[str, Any]] = None,
+                 keep_alive: Optional[str] = None,
+                 structured_output: Optional[bool] = None):
+        if not model or not isinstance(model, str):
+            raise ValueError('model is required')
+        if structured_output is not None and not isinstance(structured_output, bool):
+            raise ValueError('structured_output must be true or false')
+        self.model = model
+        self.options = dict(options or {})
+        self.keep_alive = keep_alive
+        self.structured_output = structured_output
+
+    @property
+    def num_ctx(self) -> Optional[int]:
+        return self.options.get('num_ctx')
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TaskSettings':
+        if not isinstance(data, dict):
+            raise ValueError('task settings must be an object')
+        options = data.get('options', {})
+        if not isinstance(options, dict):
+            raise ValueError('options must be an object')
+        return cls(data.get('model'), options, data.get('keep_alive'), data.get('structured_output'))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'model': self.model,
+            'options': dict(self.options),
+            'keep_alive': self.keep_alive
+        }
+        if self.structured_output is not None:
+            data['structured_output'] = self.structured_output
+        return data
+
+
+class ModelRegistry:
+    """
+    Реестр профилей моделей: профиль сопоставляет каждой задаче (ability, summary, repair)
+    модель и её опции. Загружается из JSON-файла (MODEL_PROFILES) или из встроенных профилей.
+    Задачи, не описанные в профиле, берутся из профиля default.
+    Модели, которых нет на сервере (см. validate), заменяются моделью профиля default.
+    """
+
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], path: Optional[str] = None):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        # Модели, которых нет на сервере Ollama (по последней проверке)
+        self._unavailable = set()
+
+        for name, data in profiles.items():
+            self._profiles[name] = self._parse_profile(name, data)
+        if DEFAULT_PROFILE not in self._profiles:
+            raise ValueError(f"Profile '{DEFAULT_PROFILE}' is required")
+        missing = [task for task in TASKS if task not in self._profiles[DEFAULT_PROFILE]['tasks']]
+        if missing:
+            raise ValueError(f"Profile '{DEFAULT_PROFILE}' must define tasks: {', '.join(missing)}")
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> 'ModelRegistry':
+        """
+        Загружает профили из JSON-файла; если файла нет - встроенные профили
+        (изменения через API сохраняются в path)
+        """
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(json.load(f), path=path)
+        return cls(builtin_profiles(), path=path)
+
+    @staticmethod
+    def _parse_profile(name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(data, dict):
+            raise ValueError(f"Profile '{name}' must be an object")
+        tasks = {}
+        for task in TASKS:
+            if task in data:
+                try:
+                    tasks[task] = TaskSettings.from_dict(data[task])
+                except ValueError as e:
+                    raise ValueError(f"Profile '{name}', task '{task}': {e}")
+        return {'description': data.get('description', ''), 'tasks': tasks}
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._profiles)
+
+    def resolve(self, task: str, profile: Optional[str] = None) -> TaskSettings:
+        """
+        Настройки задачи в профиле (по умолчанию - default)
+        """
+        if task not in TASKS:
+            raise ValueError(f"Unknown task '{task}'")
+        name = profile or DEFAULT_PROFILE
+
+        with self._lock:
+            if name not in self._profiles:
+                raise UnknownProfileError(f"Unknown model profile '{name}'")
+            fallback = self._profiles[DEFAULT_PROFILE]['tasks'][task]
+            settings = self._profiles[name]['tasks'].get(task, fallback)
+
+            if settings.model in self._unavailable and fallback.model not in self._unavailable:
+                self.logger.warning(f"Model {settings.model} ({name}/{task}) is not available, "
+                                    f"using {fallback.model}")
+                settings = fallback
+            return settings
+
+    def set_profile(self, name: str, data: Dict[str, Any]) -> None:
+        """
+        Добавляет или заменяет профиль и сохраняет реестр в файл (если он задан)
+        """
+        profile = self._parse_profile(name, data)
+        if name == DEFAULT_PROFILE and any(task not in profile['tasks'] for task in TASKS):
+            raise ValueError(f"Profile '{DEFAULT_PROFILE}' must define all tasks: {', '.join(TASKS)}")
+        with self._lock:
+            self._profiles[name] = profile
+        self.save()
+
+    def delete_profile(self, name: str) -> bool:
+        if name == DEFAULT_PROFILE:
+            raise ValueError(f"Profile '{DEFAULT_PROFILE}' cannot be deleted")
+        with self._lock:
+            removed = self._profiles.pop(name, None) is not None
+        if removed:
+            self.save()
+        return removed
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        data = self.to_dict()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def validate(self, available_models: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Сверяет модели профилей со списком моделей сервера (get_available_models).
+        Возвращает {профиль: {задача: модель}} для моделей, которых нет на сервере
+        """
+        available = set(available_models)
+        # Ollama добавляет тег :latest к моделям без тега
+        available |= {model[:-len(':latest')] for model in available if model.endswith(':latest')}
+
+        missing = {}
+        with self._lock:
+            models = set()
+            for name, profile in self._profiles.items():
+                for task, settings in profile['tasks'].items():
+                    models.add(settings.model)
+                    if settings.model not in available:
+                        missing.setdefault(name, {})[task] = settings.model
+            self._unavailable = {model for model in models if model not in available}
+
+        for name, tasks in missing.items():
+            for task, model in tasks.items():
+                self.logger.warning(f"Model profile '{name}': model {model} for '{task}' is not available in Ollama")
+        return missing
+
+    def unavailable_models(self) -> List[str]:
+        with self._lock:
+            return sorted(self._unavailable)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for name, profile in self._profiles.items():
+                result[name] = {'description': profile['description']}
+                for task, settings in profile['tasks'].items():
+                    result[name][task] = settings.to_dict()
+            return copy.deepcopy(result)
+
+
+# Общий для процесса реестр профилей; файл задаётся переменной окружения MODEL_PROFILES
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def set_model_registry(registry: ModelRegistry) -> None:
+    global _registry
+    with _registry_lock:
+        _registry = registry
+
+
+def get_model_registry() -> ModelRegistry:
+    """
+    Возвращает реестр профилей, загружая его при первом обращении
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry.from_file(os.environ.get('MODEL_PROFILES') or None)
+        return _registry
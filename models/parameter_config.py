@@ -0,0 +1,175 @@
+import json
+import random
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, List, Any, Tuple, Optional
+
+import numpy as np
+from models.sampling import get_sampler, WeightedSampler
+
+# До какого размера диапазона строить полную таблицу "значение -> описание"
+DENSE_TABLE_LIMIT = 4096
+
+
+class CompiledParameter:
+    """
+    Разобранная один раз конфигурация параметра способности:
+    границы, сэмплер и индекс ключей описаний для поиска ближайшего ключа
+    """
+
+    def __init__(self, name: str, config: Dict[str, Any]):
+        self.name = name
+        self.config = config
+        self.min_val, self.mode_val, self.max_val = self._parse_bounds(name, config)
+        self.descriptions = self._parse_descriptions(config)
+        self.sampler: WeightedSampler = get_sampler(self.min_val, self.mode_val, self.max_val)
+
+        # Ключи по возрастанию; порядок в конфигурации нужен для разрешения равных расстояний
+        keys = list(self.descriptions.keys())
+        self._rank = {key: rank for rank, key in enumerate(keys)}
+        self._sorted_keys = sorted(keys)
+        self._sorted_keys_array = np.array(self._sorted_keys, dtype=np.int64)
+        self._sorted_ranks_array = np.array([self._rank[key] for key in self._sorted_keys], dtype=np.int64)
+
+        # Для небольших диапазонов - готовая таблица ключей на каждое значение
+        self._low = min(self.min_val, self.max_val)
+        self._dense_keys = None
+        span = abs(self.max_val - self.min_val) + 1
+        if self.descriptions and span <= DENSE_TABLE_LIMIT:
+            values = np.arange(self._low, self._low + span, dtype=np.int64)
+            self._dense_keys = self.describe_keys(values).tolist()
+
+    @staticmethod
+    def _parse_bounds(name: str, config: Dict[str, Any]) -> Tuple[int, int, int]:
+        """
+        Извлекает (min, mode, max) из конфигурации параметра
+        """
+        try:
+            # Значения из веб-формы (config) всегда приходят как строки
+            min_val = int(config.get('min', 0))
+            max_val = int(config.get('max', 100))
+
+            mode_val_raw = config.get('mode')
+            if mode_val_raw is not None:
+                mode_val = int(mode_val_raw)
+            else:
+                # Если 'mode' не задан, вычисляем среднее
+                mode_val = (min_val + max_val) // 2
+
+            # mode_val не должен выходить за min/max
+            mode_val = max(min_val, min(max_val, mode_val))
+
+        except (ValueError, TypeError) as e:
+            # Фолбек на случай, если пользователь ввел нечисловые данные
+            print(f"Warning: Invalid number in config for {name}. Falling back to default: {e}")
+            min_val, max_val, mode_val = 0, 100, 50
+
+        return min_val, mode_val, max_val
+
+    @staticmethod
+    def _parse_descriptions(config: Dict[str, Any]) -> Dict[int, str]:
+        """
+        Описания значений с числовыми ключами (в порядке конфигурации)
+        """
+        descriptions = {}
+        for k, v in config.get('descriptions', {}).items():
+            try:
+                descriptions[int(k)] = v
+            except (ValueError, TypeError):
+                print(f"Warning: description key '{k}' is not a number — skipping.")
+        return descriptions
+
+    def describe_key(self, value: int) -> Optional[int]:
+        """
+        Ближайший к значению ключ описания. При равном расстоянии выигрывает ключ,
+        стоящий раньше в конфигурации
+        """
+        if not self._sorted_keys:
+            return None
+
+        if self._dense_keys is not None and 0 <= value - self._low < len(self._dense_keys):
+            return self._dense_keys[value - self._low]
+
+        position = bisect_left(self._sorted_keys, value)
+        if position == 0:
+            return self._sorted_keys[0]
+        if position == len(self._sorted_keys):
+            return self._sorted_keys[-1]
+
+        left, right = self._sorted_keys[position - 1], self._sorted_keys[position]
+        left_distance, right_distance = value - left, right - value
+        if right_distance < left_distance or (
+                right_distance == left_distance and self._rank[right] < self._rank[left]):
+            return right
+        return left
+
+    def describe(self, value: int) -> str:
+        """
+        Описание значения параметра
+        """
+        key = self.describe_key(value)
+        if key is None:
+            return f"Значение: {value}"
+        return self.descriptions[key]
+
+    def describe_keys(self, values: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Векторизованный describe_key для массива значений
+        """
+        if not self._sorted_keys:
+            return None
+
+        sorted_keys = self._sorted_keys_array
+        position = np.searchsorted(sorted_keys, values)
+        left = np.clip(position - 1, 0, len(sorted_keys) - 1)
+        right = np.clip(position, 0, len(sorted_keys) - 1)
+
+        left_distance = np.where(position > 0, values - sorted_keys[left], np.inf)
+        right_distance = np.where(position < len(sorted_keys), sorted_keys[right] - values, np.inf)
+
+        ranks = self._sorted_ranks_array
+        take_right = (right_distance < left_distance) | (
+            (right_distance == left_distance) & (ranks[right] < ranks[left])
+        )
+        return np.where(take_right, sorted_keys[right], sorted_keys[left])
+
+    def sample(self, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+        """
+        Одно случайное значение параметра с описанием
+        """
+        value = self.sampler.sample(rng)
+        return {
+            'value': value,
+            'description': self.describe(value),
+            'raw_config': self.config
+        }
+
+
+class CompiledAbilityConfig:
+    """
+    Набор скомпилированных параметров одной способности
+    """
+
+    def __init__(self, parameter_configs: Dict[str, Dict[str, Any]]):
+        self.parameters: List[CompiledParameter] = [
+            CompiledParameter(name, config) for name, config in parameter_configs.items()
+        ]
+
+    def sample(self, rng: Optional[random.Random] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Случайные значения всех параметров (формат AbilityGenerator._generate_random_parameters)
+        """
+        return {parameter.name: parameter.sample(rng) for parameter in self.parameters}
+
+
+@lru_cache(maxsize=512)
+def _compile_cached(serialized: str) -> CompiledAbilityConfig:
+    return CompiledAbilityConfig(json.loads(serialized))
+
+
+def compile_parameters(parameter_configs: Dict[str, Dict[str, Any]]) -> CompiledAbilityConfig:
+    """
+    Компилирует конфигурацию параметров; одинаковые конфигурации разбираются один раз.
+    Ключ кэша сохраняет порядок описаний, от которого зависит выбор при равных расстояниях
+    """
+    return _compile_cached(json.dumps(parameter_configs, ensure_ascii=False))
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from models.sqlite_db import SQLiteConnections
+
+# Данные больше этого размера (байт JSON) хранятся сжатыми
+COMPRESS_MIN_SIZE = 4096
+MAX_PAGE_SIZE = 200
+PROJECT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Поля индекса, которые отдаёт список проектов
+META_FIELDS = ('id', 'name', 'concept', 'ability_count', 'size', 'etag', 'created_at', 'updated_at')
+
+
+class ProjectConflictError(Exception):
+    """
+    Проект изменён после того, как клиент его загрузил (If-Match не совпал с текущим ETag)
+    """
+
+    def __init__(self, etag: Optional[str]):
+        super().__init__('Project was modified')
+        self.etag = etag
+
+
+def make_etag(data: Any) -> str:
+    """
+    ETag данных: хэш канонического JSON
+    """
+    encoded = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class SQLiteProjectStore:
+    """
+    Проекты на сервере в SQLite. Индекс projects (название, концепция, число способностей,
+    время изменения) позволяет листать тысячи проектов по страницам, не читая их данные.
+    Способности хранятся отдельными строками - одну способность можно загрузить без проекта.
+    JSON больше compress_min_size байт сжимается zlib
+    """
+
+    def __init__(self, db_path: str, compress_min_size: int = COMPRESS_MIN_SIZE):
+        self.db_path = db_path
+        self.compress_min_size = compress_min_size
+        self._connections = SQLiteConnections(db_path)
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connections.get() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS projects ('
+                'id TEXT PRIMARY KEY, name TEXT NOT NULL, concept TEXT NOT NULL, '
+                'ability_count INTEGER NOT NULL, size INTEGER NOT NULL, etag TEXT NOT NULL, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL, data BLOB NOT NULL, compressed INTEGER NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS projects_updated ON projects (updated_at)')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS project_abilities ('
+                'project_id TEXT NOT NULL, ability_id TEXT NOT NULL, position INTEGER NOT NULL, '
+                'etag TEXT NOT NULL, data BLOB NOT NULL, compressed INTEGER NOT NULL, '
+                'PRIMARY KEY (project_id, ability_id))'
+            )
+
+    def _encode(self, data: Any) -> Tuple[bytes, bool, int]:
+        encoded = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        if len(encoded) >= self.compress_min_size:
+            return zlib.compress(encoded), True, len(encoded)
+        return encoded, False, len(encoded)
+
+    @staticmethod
+    def _decode(blob: bytes, compressed: int) -> Any:
+        return json.loads(zlib.decompress(blob) if compressed else blob)
+
+    def list(self, page: int = 1, per_page: int = 50, query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Страница индекса проектов, новые изменения первыми; query - поиск по названию и концепции
+        """
+        page = max(1, page)
+        per_page = min(max(1, per_page), MAX_PAGE_SIZE)
+        where, params = '', []
+        if query:
+            pattern = f"%{query.replace('%', '').replace('_', '')}%"
+            where, params = 'WHERE name LIKE ? OR concept LIKE ?', [pattern, pattern]
+        db = self._connections.get()
+        total = db.execute(f'SELECT COUNT(*) FROM projects {where}', params).fetchone()[0]
+        rows = db.execute(
+            f"SELECT {', '.join(META_FIELDS)} FROM projects {where} "
+            'ORDER BY updated_at DESC, id LIMIT ? OFFSET ?',
+            params + [per_page, (page - 1) * per_page]
+        ).fetchall()
+        return {
+            'projects': [dict(zip(META_FIELDS, row)) for row in rows],
+            'page': page,
+            'per_page': per_page,
+            'total': total
+        }
+
+    def meta(self, project_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connections.get().execute(
+            f"SELECT {', '.join(META_FIELDS)} FROM projects WHERE id = ?", (project_id,)
+        ).fetchone()
+        return dict(zip(META_FIELDS, row)) if row else None
+
+    def get(self, project_id: str, with_abilities: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Проект в том виде, в каком был сохранён; with_abilities=False - только идентификаторы способностей
+        """
+        db = self._connections.get()
+        row = db.execute('SELECT data, compressed FROM projects WHERE id = ?', (project_id,)).fetchone()
+        if row is None:
+            return None
+        project = self._decode(row[0], row[1])
+        if with_abilities:
+            project['abilities'] = [
+                self._decode(data, compressed) for data, compressed in db.execute(
+                    'SELECT data, compressed FROM project_abilities WHERE project_id = ? ORDER BY position',
+                    (project_id,))
+            ]
+        else:
+            project['ability_ids'] = [ability_id for ability_id, in db.execute(
+                'SELECT ability_id FROM project_abilities WHERE project_id = ? ORDER BY position', (project_id,))]
+        return project
+
+    def get_ability(self, project_id: str, ability_id: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        Одна способность проекта и её ETag
+        """
+        row = self._connections.get().execute(
+            'SELECT data, compressed, etag FROM project_abilities WHERE project_id = ? AND ability_id = ?',
+            (project_id, ability_id)
+        ).fetchone()
+        return (self._decode(row[0], row[1]), row[2]) if row else None
+
+    def save(self,
+             project: Dict[str, Any],
+             project_id: Optional[str] = None,
+             if_match: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Создаёт или заменяет проект; возвращает его запись индекса.
+        if_match - ETag, который клиент видел последним: если проект с тех пор изменён - ProjectConflictError
+        """
+        if not isinstance(project, dict):
+            raise ValueError('project must be an object')
+        project_id = project_id or uuid.uuid4().hex
+        if not PROJECT_ID_PATTERN.match(project_id):
+            raise ValueError('project id may contain only letters, digits, "-" and "_" (up to 64)')
+        abilities = project.get('abilities') or []
+        if not isinstance(abilities, list):
+            raise ValueError('abilities must be a list')
+
+        # У каждой способности должен быть идентификатор для частичной загрузки
+        abilities = [dict(ability, id=str(ability.get('id') or f'ability_{position}'))
+                     if isinstance(ability, dict) else None for position, ability in enumerate(abilities)]
+        if None in abilities:
+            raise ValueError('ability must be an object')
+        if len({ability['id'] for ability in abilities}) != len(abilities):
+            raise ValueError('ability ids must be unique')
+        ability_rows, abilities_size = [], 0
+        for position, ability in enumerate(abilities):
+            blob, compressed, size = self._encode(ability)
+            abilities_size += size
+            ability_rows.append((project_id, ability['id'], position, make_etag(ability), blob, int(compressed)))
+
+        concept = project.get('concept') or ''
+        name = (project.get('name') or concept[:60] or 'Без названия').strip()
+        body = {key: value for key, value in project.items() if key != 'abilities'}
+        etag = make_etag(dict(body, abilities=abilities))
+        blob, compressed, size = self._encode(body)
+        size += abilities_size
+
+        with self._connections.get() as db:
+            db.execute('BEGIN IMMEDIATE')
+            current = db.execute('SELECT etag, created_at FROM projects WHERE id = ?', (project_id,)).fetchone()
+            if if_match is not None and if_match != '*' and (current is None or current[0] != if_match):
+                raise ProjectConflictError(current[0] if current else None)
+            now = time.time()
+            db.execute(
+                'INSERT OR REPLACE INTO projects (id, name, concept, ability_count, size, etag, created_at, '
+                'updated_at, data, compressed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (project_id, name, concept, len(ability_rows), size, etag,
+                 current[1] if current else now, now, blob, int(compressed))
+            )
+            db.execute('DELETE FROM project_abilities WHERE project_id = ?', (project_id,))
+            db.executemany(
+                'INSERT INTO project_abilities (project_id, ability_id, position, etag, data, compressed) '
+                'VALUES (?, ?, ?, ?, ?, ?)', ability_rows
+            )
+        return self.meta(project_id)
+
+    def delete(self, project_id: str) -> bool:
+        with self._connections.get() as db:
+            db.execute('DELETE FROM project_abilities WHERE project_id = ?', (project_id,))
+            return db.execute('DELETE FROM projects WHERE id = ?', (project_id,)).rowcount > 0
+
+
+def create_project_store(spec: str = 'sqlite:saved_projects/projects.db',
+                         compress_min_size: int = COMPRESS_MIN_SIZE) -> SQLiteProjectStore:
+    """
+    Создаёт хранилище проектов по строке настройки 'sqlite:<путь к файлу>'
+    """
+    backend, _, location = spec.partition(':')
+    if backend == 'sqlite':
+        return SQLiteProjectStore(location or 'saved_projects/projects.db', compress_min_size=compress_min_size)
+    raise ValueError(f"Unknown project store backend: {spec}")
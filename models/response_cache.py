@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class ResponseCache:
+    """
+    Кэш ответов LLM с адресацией по содержимому запроса.
+    Первый уровень - LRU в памяти с TTL и ограничением числа записей,
+    второй (необязательный) - SQLite на диске, переживает перезапуск.
+    """
+
+    def __init__(self,
+                 max_entries: int = 1024,
+                 ttl: float = 24 * 3600,
+                 db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.logger = logging.getLogger(__name__)
+
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS responses '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, options: Optional[Dict[str, Any]], prompt: str) -> str:
+        """
+        Ключ кэша: хэш от модели, опций генерации и текста промпта
+        """
+        raw = json.dumps([model, options or {}, prompt], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Возвращает сохранённый ответ или None, если его нет или срок истёк
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._memory[key]
+
+            value = self._get_from_disk(key, now)
+            if value is not None:
+                self._stats['disk_hits'] += 1
+                self._put_in_memory(key, value, now)
+                return value
+
+            self._stats['misses'] += 1
+            return None
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Сохраняет ответ в памяти и, если настроено, на диске
+        """
+        now = time.time()
+        with self._lock:
+            self._stats['sets'] += 1
+            self._put_in_memory(key, value, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)',
+                        (key, json.dumps(value, ensure_ascii=False), now + self.ttl)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    self.logger.error(f"Failed to write response cache: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM responses')
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Счётчики попаданий и промахов для подбора размера кэша
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._memory)
+            stats['max_entries'] = self.max_entries
+            stats['ttl'] = self.ttl
+            stats['disk'] = self._db is not None
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def _put_in_memory(self, key: str, value: Any, now: float) -> None:
+        self._memory[key] = (now + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[Any]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                'SELECT value, expires_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.logger.error(f"Failed to read response cache: {e}")
+            return None
+
+        if row is None:
+            return None
+        if row[1] <= now:
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._db.commit()
+            return None
+        return json.loads(row[0])
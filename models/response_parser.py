@@ -0,0 +1,272 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+# Допустимые кавычки вокруг значений в шаблоне ответа
+_OPEN_QUOTE = r'[\'"«“]'
+_CLOSE_QUOTE = r'[\'"»”]'
+
+# Шаблоны ответов модели. Терпимы к пробелам, регистру и виду кавычек;
+# значения могут содержать кавычки - шаблон закрывается кавычкой и скобкой в конце строки
+ABILITY_PATTERN = re.compile(
+    r'\(\s*название\s*:\s*' + _OPEN_QUOTE + r'(?P<name>.*?)' + _CLOSE_QUOTE +
+    r'\s*;\s*описание\s*:\s*' + _OPEN_QUOTE + r'(?P<description>[\s\S]*?)' + _CLOSE_QUOTE +
+    r'\s*\)(?=\s*(?:\n|$))',
+    re.IGNORECASE
+)
+SUMMARY_PATTERN = re.compile(
+    r'\(\s*суммаризация\s*:\s*' + _OPEN_QUOTE + r'(?P<summary>[\s\S]*?)' + _CLOSE_QUOTE +
+    r'\s*\)(?=\s*(?:\n|$))',
+    re.IGNORECASE
+)
+# Отдельный JSON-объект в ответе пакетной генерации (если весь ответ не разобрался)
+JSON_OBJECT_PATTERN = re.compile(r'\{[^{}]*\}')
+# Обёртка ```json ... ```, которую модели иногда добавляют вокруг ответа
+CODE_FENCE_PATTERN = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+
+# Ключи JSON-ответа (модель иногда отвечает по-русски)
+NAME_KEYS = ('name', 'название')
+DESCRIPTION_KEYS = ('description', 'описание')
+SUMMARY_KEYS = ('summary', 'суммаризация', 'описание')
+
+# Сколько текста исходного ответа передавать в запрос на исправление
+REPAIR_CONTENT_LIMIT = 2000
+
+
+class IncrementalTemplateParser:
+    """
+    Инкрементальный разбор потокового ответа модели.
+    Накапливает текст и сообщает, когда шаблон ответа закрыт (закрывающая скобка и перевод строки),
+    чтобы можно было прервать генерацию и не тратить лишние токены.
+    """
+
+    def __init__(self, pattern: re.Pattern):
+        self.pattern = pattern
+        self.buffer = ''
+        self.match = None
+
+    def feed(self, text: str) -> bool:
+        """
+        Добавляет очередной фрагмент текста. Возвращает True, если шаблон найден целиком
+        """
+        if self.match:
+            return True
+
+        self.buffer += text
+        # Шаблон закрывается скобкой и переводом строки после неё
+        if ')' in text or '\n' in text:
+            match = self.pattern.search(self.buffer)
+            # Скобка в самом конце буфера ещё не конец ответа: '...') может оказаться цитатой
+            # внутри описания, а шаблон закроется в следующих фрагментах. Такой ответ
+            # дочитывается до конца потока и разбирается целиком
+            if match is not None and '\n' in self.buffer[match.end():]:
+                self.match = match
+        return self.match is not None
+
+
+class IncrementalJSONParser:
+    """
+    Инкрементальный разбор потокового JSON-ответа (format: json).
+    Сообщает, когда закрыт внешний объект, чтобы прервать генерацию
+    (модель иногда продолжает выводить пробелы после конца объекта).
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, text: str) -> bool:
+        """
+        Добавляет очередной фрагмент текста. Возвращает True, если JSON-объект закрыт
+        """
+        if self.complete:
+            return True
+
+        self.buffer += text
+        for char in text:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+                self.started = True
+            elif char in '}]':
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    self.complete = True
+                    break
+        return self.complete
+
+
+def _first_value(data: Dict[str, Any], keys) -> Optional[str]:
+    for key in keys:
+        value = data.get(key)
+        if isinstance(value, str) and value.strip():
+            return value.strip()
+    return None
+
+
+def load_json(content: str) -> Optional[Any]:
+    """
+    Разбирает JSON из ответа модели: без обёртки ```json и текста до первой скобки
+    """
+    text = CODE_FENCE_PATTERN.sub('', content.strip())
+    start = min((i for i in (text.find('{'), text.find('[')) if i >= 0), default=-1)
+    if start < 0:
+        return None
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text[start:])
+        return value
+    except ValueError:
+        return None
+
+
+def parse_ability(content: str) -> Optional[Dict[str, str]]:
+    """
+    Извлекает название и описание способности из JSON-ответа или шаблона
+    (название:'...';описание:'...'). None - ответ не разобран
+    """
+    data = load_json(content)
+    if isinstance(data, dict):
+        name = _first_value(data, NAME_KEYS)
+        description = _first_value(data, DESCRIPTION_KEYS)
+        if name and description:
+            return {'name': name, 'description': description}
+
+    match = ABILITY_PATTERN.search(content)
+    if match and match.group('name').strip() and match.group('description').strip():
+        return {
+            'name': match.group('name').strip(),
+            'description': match.group('description').strip()
+        }
+    return None
+
+
+def parse_summary(content: str) -> Optional[str]:
+    """
+    Извлекает описание персонажа из JSON-ответа или шаблона (суммаризация:'...').
+    None - ответ не разобран
+    """
+    data = load_json(content)
+    if isinstance(data, dict):
+        summary = _first_value(data, SUMMARY_KEYS)
+        if summary:
+            return summary
+
+    match = SUMMARY_PATTERN.search(content)
+    if match and match.group('summary').strip():
+        return match.group('summary').strip()
+    return None
+
+
+def parse_ability_batch(content: str, count: int) -> List[Optional[Dict[str, str]]]:
+    """
+    Парсит JSON-ответ пакетной генерации. Если ответ целиком не разбирается,
+    извлекает отдельные объекты; способности без ответа остаются None
+    """
+    results = [None] * count
+
+    data = load_json(content)
+    entries = data.get('abilities') if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        entries = []
+        for match in JSON_OBJECT_PATTERN.finditer(content):
+            try:
+                entries.append(json.loads(match.group(0)))
+            except ValueError:
+                continue
+
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        name = _first_value(entry, NAME_KEYS)
+        description = _first_value(entry, DESCRIPTION_KEYS)
+        if not name or not description:
+            continue
+
+        # Номер способности из ответа, иначе - по порядку
+        try:
+            index = int(entry.get('id', position + 1)) - 1
+        except (TypeError, ValueError):
+            index = position
+        if 0 <= index < count and results[index] is None:
+            results[index] = {'name': name, 'description': description}
+
+    return results
+
+
+def build_ability_repair_prompt(content: str) -> str:
+    """
+    Короткий промпт для исправления неразобранного ответа со способностью
+    """
+    return f"""Ниже ответ с названием и описанием игровой способности в неверном формате. Не придумывай ничего нового, только перенеси название и описание в JSON:
+{{"name": "<название способности>", "description": "<описание способности>"}}
+
+Ответ:
+{content[:REPAIR_CONTENT_LIMIT]}"""
+
+
+def build_summary_repair_prompt(content: str) -> str:
+    """
+    Короткий промпт для исправления неразобранного описания персонажа
+    """
+    return f"""Ниже описание способностей персонажа в неверном формате. Не придумывай ничего нового, только перенеси текст описания в JSON:
+{{"summary": "<общее описание>"}}
+
+Ответ:
+{content[:REPAIR_CONTENT_LIMIT]}"""
+
+
+class ParseStats:
+    """
+    Счётчики разбора ответов по моделям и видам ответа:
+    parsed - разобран сразу, repaired - после запроса на исправление, failed - не разобран
+    """
+
+    OUTCOMES = ('parsed', 'repaired', 'failed')
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, kind: str, outcome: str, count: int = 1) -> None:
+        with self._lock:
+            kinds = self._counts.setdefault(model, {})
+            counts = kinds.setdefault(kind, dict.fromkeys(self.OUTCOMES, 0))
+            counts[outcome] += count
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Счётчики и доля ответов, не разобранных с первой попытки
+        """
+        with self._lock:
+            result = {}
+            for model, kinds in self._counts.items():
+                result[model] = {}
+                for kind, counts in kinds.items():
+                    total = sum(counts.values())
+                    result[model][kind] = dict(
+                        counts,
+                        total=total,
+                        failure_rate=(counts['repaired'] + counts['failed']) / total if total else 0.0
+                    )
+            return result
+
+
+# Общие для процесса счётчики разбора (см. GET /parse_stats)
+_parse_stats = ParseStats()
+
+
+def get_parse_stats() -> ParseStats:
+    return _parse_stats
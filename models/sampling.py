@@ -0,0 +1,94 @@
+import random
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from typing import Optional
+
+import numpy as np
+
+# Вес значения: max(1, PEAK_HEIGHT - расстояние до моды).
+# Распределение - "треугольник" шириной 9 в каждую сторону поверх ровного основания веса 1.
+PEAK_HEIGHT = 10
+PEAK_RADIUS = PEAK_HEIGHT - 2  # дальше этого расстояния вес равен 1
+
+
+class WeightedSampler:
+    """
+    Выборка целых чисел из [min_val, max_val] с весом max(1, 10 - |x - mode|).
+    Вместо перебора всего диапазона распределение разбито на две части:
+    пик около моды (не более 17 значений, таблица накопленных весов)
+    и ровное основание, из которого значение выбирается за O(1).
+    """
+
+    def __init__(self, min_val: int, mode_val: int, max_val: int):
+        if min_val > max_val:
+            min_val, max_val = max_val, min_val
+        mode_val = max(min_val, min(max_val, mode_val))
+
+        self.min_val = min_val
+        self.mode_val = mode_val
+        self.max_val = max_val
+
+        # Пик: значения с весом больше 1
+        self.peak_low = max(min_val, mode_val - PEAK_RADIUS)
+        self.peak_high = min(max_val, mode_val + PEAK_RADIUS)
+        peak_weights = [PEAK_HEIGHT - abs(value - mode_val)
+                        for value in range(self.peak_low, self.peak_high + 1)]
+        self.peak_cdf = list(accumulate(peak_weights))
+        self.peak_total = self.peak_cdf[-1]
+        self._peak_cdf_array = np.array(self.peak_cdf, dtype=np.float64)
+
+        # Основание: значения с весом 1 слева и справа от пика
+        self.left_count = self.peak_low - min_val
+        self.right_count = max_val - self.peak_high
+        self.total = self.peak_total + self.left_count + self.right_count
+
+    def sample(self, rng: Optional[random.Random] = None) -> int:
+        """
+        Одно случайное значение
+        """
+        u = (rng or random).random() * self.total
+
+        if u < self.peak_total:
+            return self.peak_low + min(bisect_right(self.peak_cdf, u), len(self.peak_cdf) - 1)
+
+        offset = int(u - self.peak_total)
+        if offset < self.left_count:
+            return self.min_val + offset
+        return min(self.max_val, self.peak_high + 1 + offset - self.left_count)
+
+    def sample_array(self, size: int, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        Массив из size случайных значений (векторизованно через NumPy)
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        u = rng.random(size) * self.total
+        result = np.empty(size, dtype=np.int64)
+
+        in_peak = u < self.peak_total
+        peak_index = np.searchsorted(self._peak_cdf_array, u[in_peak], side='right')
+        result[in_peak] = self.peak_low + np.minimum(peak_index, len(self.peak_cdf) - 1)
+
+        offset = (u[~in_peak] - self.peak_total).astype(np.int64)
+        result[~in_peak] = np.where(
+            offset < self.left_count,
+            self.min_val + offset,
+            np.minimum(self.max_val, self.peak_high + 1 + offset - self.left_count)
+        )
+        return result
+
+    def probabilities(self) -> np.ndarray:
+        """
+        Точные вероятности всех значений диапазона (для проверки и предпросмотра)
+        """
+        values = np.arange(self.min_val, self.max_val + 1)
+        weights = np.maximum(1, PEAK_HEIGHT - np.abs(values - self.mode_val))
+        return weights / weights.sum()
+
+
+@lru_cache(maxsize=1024)
+def get_sampler(min_val: int, mode_val: int, max_val: int) -> WeightedSampler:
+    """
+    Сэмплер для тройки (min, mode, max), кэшируется между вызовами
+    """
+    return WeightedSampler(min_val, mode_val, max_val)
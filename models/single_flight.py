@@ -0,0 +1,112 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+# Как часто ожидающий запрос проверяет собственную отмену
+WAIT_POLL_INTERVAL = 0.1
+# Сверх этого числа запомненных неудач устаревшие записи удаляются
+MAX_FAILURE_ENTRIES = 1024
+
+
+class _Call:
+    """
+    Выполняющийся запрос: результат или исключение ведущего, которые получат все ожидающие
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.cancelled = False
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов к LLM: первый запрос с данным ключом
+    выполняет вызов, остальные ждут и получают тот же результат.
+    Неудачный результат (None или исключение) запоминается на negative_ttl секунд,
+    чтобы при недоступном сервере повторы не порождали лавину запросов.
+    Исключения transient_errors (например, отказ из-за перегрузки) не запоминаются.
+    """
+
+    def __init__(self, negative_ttl: float = 5, transient_errors: Tuple[Type[BaseException], ...] = ()):
+        self.negative_ttl = negative_ttl
+        self.transient_errors = transient_errors
+        self._calls: Dict[str, _Call] = {}
+        self._failures: Dict[str, float] = {}  # key -> expires_at
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'shared': 0, 'negative_hits': 0, 'failures': 0}
+
+    def do(self,
+           key: str,
+           fn: Callable[[], Any],
+           cancelled: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        Выполняет fn() или присоединяется к уже выполняющемуся вызову с тем же ключом.
+        cancelled - отмена вызывающего: ожидание прерывается (возвращается None),
+        а отменённый ведущий не запоминает неудачу и не отдаёт None ожидающим - они повторят вызов
+        """
+        while True:
+            with self._lock:
+                expires_at = self._failures.get(key)
+                if expires_at is not None:
+                    if expires_at > time.monotonic():
+                        self._stats['negative_hits'] += 1
+                        return None
+                    del self._failures[key]
+
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self._stats['calls'] += 1
+                else:
+                    self._stats['shared'] += 1
+
+            if leader:
+                return self._lead(key, call, fn, cancelled)
+
+            while not call.done.wait(WAIT_POLL_INTERVAL):
+                if cancelled is not None and cancelled():
+                    return None
+            if call.cancelled:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def _lead(self, key: str, call: _Call, fn: Callable[[], Any], cancelled: Optional[Callable[[], bool]]) -> Any:
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            failed = call.error is not None or call.result is None
+            call.cancelled = failed and cancelled is not None and cancelled()
+            transient = isinstance(call.error, self.transient_errors)
+            with self._lock:
+                del self._calls[key]
+                if failed and not call.cancelled and not transient:
+                    self._stats['failures'] += 1
+                    if self.negative_ttl > 0:
+                        self._remember_failure(key)
+            call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _remember_failure(self, key: str) -> None:
+        now = time.monotonic()
+        if len(self._failures) >= MAX_FAILURE_ENTRIES:
+            self._failures = {k: v for k, v in self._failures.items() if v > now}
+        self._failures[key] = now + self.negative_ttl
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return dict(
+                self._stats,
+                in_flight=len(self._calls),
+                negative_entries=sum(1 for expires_at in self._failures.values() if expires_at > now)
+            )
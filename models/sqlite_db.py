@@ -0,0 +1,23 @@
+import sqlite3
+import threading
+
+
+class SQLiteConnections:
+    """
+    Соединения с файлом SQLite для хранилищ (состояние генерации, задачи, проекты):
+    отдельное соединение на поток - sqlite3.Connection нельзя использовать из разных потоков;
+    WAL позволяет читать параллельно с записью, в том числе из других процессов
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=self.timeout)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+        return db
@@ -0,0 +1,139 @@
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from models.sqlite_db import SQLiteConnections
+
+
+class MemoryStateStore:
+    """
+    Хранилище состояния генерации (концепция и сгенерированные способности)
+    по идентификатору сессии или проекта. Держит в памяти не более max_sessions
+    записей и вытесняет давно не использованные.
+    Подходит для одного процесса; для нескольких воркеров используйте SQLite или файлы.
+    """
+
+    def __init__(self, max_sessions: int = 1000):
+        self.max_sessions = max_sessions
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                return None
+            self._states.move_to_end(session_id)
+            # Копия, чтобы изменения в запросе не попадали в хранилище без set()
+            return copy.deepcopy(state)
+
+    def set(self, session_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._states[session_id] = copy.deepcopy(state)
+            self._states.move_to_end(session_id)
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._states.pop(session_id, None)
+
+
+class SQLiteStateStore:
+    """
+    Хранилище состояния в SQLite: общее для всех воркеров на одной машине.
+    Сверх max_sessions удаляются записи, которые дольше всего не обновлялись.
+    """
+
+    def __init__(self, db_path: str, max_sessions: int = 10000):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self._connections = SQLiteConnections(db_path)
+        with self._connections.get() as db:
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS generation_state '
+                '(session_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+            db.execute('CREATE INDEX IF NOT EXISTS generation_state_updated ON generation_state (updated_at)')
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connections.get().execute(
+            'SELECT state FROM generation_state WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id: str, state: Dict[str, Any]) -> None:
+        with self._connections.get() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO generation_state (session_id, state, updated_at) VALUES (?, ?, ?)',
+                (session_id, json.dumps(state, ensure_ascii=False), time.time())
+            )
+            db.execute(
+                'DELETE FROM generation_state WHERE session_id IN ('
+                'SELECT session_id FROM generation_state ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_sessions,)
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._connections.get() as db:
+            db.execute('DELETE FROM generation_state WHERE session_id = ?', (session_id,))
+
+
+class FileStateStore:
+    """
+    Хранилище состояния в каталоге: один JSON-файл на сессию.
+    Запись атомарная (через временный файл), поэтому файлы можно читать из нескольких воркеров.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.logger = logging.getLogger(__name__)
+
+    def _path(self, session_id: str) -> str:
+        # Идентификатор сессии приходит от клиента - оставляем только безопасные символы
+        safe_id = ''.join(ch for ch in session_id if ch.isalnum() or ch in '-_')
+        return os.path.join(self.directory, f'{safe_id}.json')
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(session_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Failed to read state for session {session_id}: {e}")
+            return None
+
+    def set(self, session_id: str, state: Dict[str, Any]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(session_id))
+
+    def delete(self, session_id: str) -> None:
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+def create_state_store(spec: str = 'memory', max_sessions: int = 1000):
+    """
+    Создаёт хранилище по строке настройки:
+    'memory', 'sqlite:<путь к файлу>' или 'file:<каталог>'
+    """
+    backend, _, location = spec.partition(':')
+    if backend == 'memory':
+        return MemoryStateStore(max_sessions=max_sessions)
+    if backend == 'sqlite':
+        return SQLiteStateStore(location or 'generation_state.db', max_sessions=max_sessions)
+    if backend == 'file':
+        return FileStateStore(location or 'generation_state')
+    raise ValueError(f"Unknown state store backend: {spec}")
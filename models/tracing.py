@@ -0,0 +1,105 @@
+import contextvars
+import json
+import logging
+import re
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+# Идентификатор трассировки текущего запроса; переносится в потоки через bind_context
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('trace_id', default=None)
+
+# Стандартные атрибуты LogRecord - всё остальное из extra попадает в JSON-лог как есть
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'trace_id'}
+
+
+# Идентификатор из заголовка клиента попадает в логи и заголовки ответа - только короткий и безопасный
+TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def trace_id_from_header(value: Optional[str]) -> str:
+    """
+    Идентификатор трассировки из заголовка запроса (X-Request-ID); если он слишком длинный
+    или содержит другие символы, кроме букв, цифр и ._- - новый
+    """
+    if value and TRACE_ID_PATTERN.match(value):
+        return value
+    return new_trace_id()
+
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: Optional[str]) -> contextvars.Token:
+    return _trace_id.set(trace_id)
+
+
+def bind_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Оборачивает функцию так, чтобы она выполнялась с контекстом (trace_id) вызывающего потока.
+    Нужно для задач ThreadPoolExecutor и фоновых задач: новые потоки контекст не наследуют
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+class TraceIdFilter(logging.Filter):
+    """
+    Добавляет trace_id текущего запроса в каждую запись лога
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Структурированный лог: одна JSON-строка на запись
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'trace_id': getattr(record, 'trace_id', None) or _trace_id.get()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(json_format: bool = False,
+                      level: int = logging.INFO,
+                      handlers: Optional[list] = None) -> None:
+    """
+    Настраивает корневой логгер: trace_id в каждой записи, JSON или текстовый формат
+    """
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - [%(trace_id)s] %(name)s - %(message)s')
+
+    handlers = handlers or [logging.StreamHandler()]
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(TraceIdFilter())
+        root.addHandler(handler)
+    root.setLevel(level)
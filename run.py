@@ -10,7 +10,9 @@
 
 import os
 import sys
+import argparse
 import subprocess
+import threading
 import webbrowser
 import time
 import logging
@@ -19,11 +21,12 @@ from pathlib import Path
 # Добавляем текущую директорию в путь для импорта модулей
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-def setup_logging():
-    """Настройка системы логирования"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
+def setup_logging(json_format=False, level=logging.INFO):
+    """Настройка системы логирования (json_format - одна JSON-строка на запись, с trace_id запроса)"""
+    from models.tracing import configure_logging
+    configure_logging(
+        json_format=json_format,
+        level=level,
         handlers=[
             logging.FileHandler('ability_generator.log'),
             logging.StreamHandler(sys.stdout)
@@ -105,10 +108,199 @@ def open_browser(url, delay=2):
         print(f"⚠ Не удалось автоматически открыть браузер: {e}")
         print(f"Откройте вручную: {url}")
 
-def main():
+def parse_args(argv=None):
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Генератор Способностей Персонажей")
+    parser.add_argument('--serve', choices=['dev', 'prod'], default='dev',
+                        help="dev - встроенный сервер Flask, prod - многопроцессный WSGI-сервер")
+    parser.add_argument('--host', default='0.0.0.0', help="Адрес для прослушивания")
+    parser.add_argument('--port', type=int, default=5000, help="Порт веб-сервера")
+    parser.add_argument('--workers', type=int, default=2,
+                        help="Число процессов-воркеров (prod)")
+    parser.add_argument('--threads', type=int, default=8,
+                        help="Число потоков в каждом воркере (prod); запросы к LLM ждут ввода-вывода")
+    parser.add_argument('--timeout', type=int, default=600,
+                        help="Максимальное время обработки запроса в секундах (prod)")
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help="Сколько секунд ждать завершения текущих запросов при остановке (prod, только gunicorn)")
+    parser.add_argument('--log-format', choices=['text', 'json'], default=os.environ.get('LOG_FORMAT', 'text'),
+                        help="Формат логов: text или json (структурированные логи с trace_id)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Без интерактивных вопросов и открытия браузера (в режиме prod включено всегда)")
+    return parser.parse_args(argv)
+
+def parse_batch_args(argv):
+    """Аргументы пакетной генерации: run.py batch <файлы> --out <результат.jsonl>"""
+    parser = argparse.ArgumentParser(prog="run.py batch",
+                                     description="Пакетная генерация персонажей без веб-интерфейса")
+    parser.add_argument('inputs', nargs='+',
+                        help="Файлы записей: .jsonl (запись на строку) или .json в формате saved_projects")
+    parser.add_argument('--out', required=True,
+                        help="JSONL-файл результатов; при повторном запуске готовые записи пропускаются")
+    parser.add_argument('--ollama-url',
+                        default=os.environ.get('OLLAMA_URLS') or os.environ.get('OLLAMA_URL', 'http://localhost:11434'),
+                        help="Адрес Ollama (несколько через запятую - пул серверов)")
+    parser.add_argument('--jobs', type=int, default=2, help="Сколько персонажей генерировать одновременно")
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help="Одновременных запросов к LLM на персонажа (по умолчанию OLLAMA_NUM_PARALLEL)")
+    parser.add_argument('--batch', action='store_true', default=None,
+                        help="Несколько способностей в одном запросе к LLM")
+    parser.add_argument('--profile', default=None, help="Профиль моделей (см. models/model_profiles.py)")
+    parser.add_argument('--no-summary', action='store_true', help="Не генерировать описание персонажа")
+    parser.add_argument('--seed', type=int, default=None, help="Seed выборки параметров (воспроизводимый запуск)")
+    parser.add_argument('--log-format', choices=['text', 'json'], default=os.environ.get('LOG_FORMAT', 'text'),
+                        help="Формат логов: text или json")
+    parser.add_argument('--verbose', action='store_true', help="Подробные логи (по умолчанию только предупреждения)")
+    return parser.parse_args(argv)
+
+def format_duration(seconds):
+    """Длительность для вывода прогресса: 1 ч 02 мин, 3 мин 12 с, 45 с"""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} ч {seconds % 3600 // 60:02d} мин"
+    if seconds >= 60:
+        return f"{seconds // 60} мин {seconds % 60:02d} с"
+    return f"{seconds} с"
+
+def run_batch(args):
+    """
+    Пакетная генерация: читает записи, генерирует их через AbilityGenerator и дописывает
+    результаты в JSONL по мере готовности, печатая прогресс, скорость и оставшееся время
+    """
+    logger = setup_logging(json_format=args.log_format == 'json',
+                           level=logging.INFO if args.verbose else logging.WARNING)
+    
+    from models.llm_client import get_client, set_ollama_urls
+    from models.model_profiles import get_model_registry
+    from models.batch_runner import BatchRunner, load_records
+    
+    try:
+        records = list(load_records(args.inputs))
+    except (OSError, ValueError) as e:
+        print(f"Ошибка чтения записей: {e}")
+        return 1
+    if args.profile and args.profile not in get_model_registry().names():
+        print(f"Неизвестный профиль моделей '{args.profile}'")
+        return 1
+    
+    # Адреса из командной строки - настройка оператора, из нескольких строится пул
+    set_ollama_urls(args.ollama_url)
+    runner = BatchRunner(get_client(), jobs=args.jobs, concurrency=args.concurrency,
+                         batch=args.batch, profile=args.profile, summary=not args.no_summary, seed=args.seed)
+    
+    started = time.monotonic()
+    progress = {'completed': 0}
+    pending = len(records)
+    
+    def on_result(result):
+        progress['completed'] += 1
+        completed = progress['completed']
+        elapsed = time.monotonic() - started
+        rate = completed / elapsed if elapsed > 0 else 0
+        eta = format_duration((pending - completed) / rate) if rate else '?'
+        status = 'ok' if result['status'] == 'success' else f"ошибка: {result.get('error')}"
+        print(f"[{completed}/{pending}] {result['id']} - {status} ({result['elapsed']:.1f} с) | "
+              f"{rate * 60:.1f} персонажей/мин | осталось ~{eta}", flush=True)
+    
+    def on_start(skipped):
+        nonlocal pending
+        pending = len(records) - skipped
+        print(f"Записей: {len(records)}, уже готово: {skipped}, к генерации: {pending}", flush=True)
+    
+    try:
+        counts = runner.run(records, args.out, on_result=on_result, on_start=on_start)
+    except KeyboardInterrupt:
+        print(f"\nПрервано: готовые записи сохранены в {args.out}, повторный запуск продолжит с них")
+        return 130
+    
+    elapsed = time.monotonic() - started
+    print(f"\nГотово за {format_duration(elapsed)}: успешно {counts['success']}, с ошибкой {counts['error']}, "
+          f"пропущено {counts['skipped']}. Результаты: {args.out}")
+    logger.info(f"Batch finished: {counts}")
+    return 0 if counts['error'] == 0 else 2
+
+def run_production_server(args):
+    """
+    Запуск приложения под многопроцессным WSGI-сервером.
+    Используется gunicorn (воркеры gthread), если он недоступен - waitress (потоки в одном процессе).
+    Мастер-процесс gunicorn не импортирует app: каждый воркер сам создаёт соединения с Ollama и SQLite,
+    очередь задач и фоновые потоки
+    """
+    logger = logging.getLogger(__name__)
+    
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+    
+    if BaseApplication is not None:
+        class GunicornApplication(BaseApplication):
+            def __init__(self, options):
+                self.options = options
+                super().__init__()
+            
+            def load_config(self):
+                for key, value in self.options.items():
+                    self.cfg.set(key, value)
+            
+            def load(self):
+                # Вызывается в каждом воркере после fork (preload_app выключен)
+                from app import app
+                return app
+        
+        if args.workers > 1 and os.environ.get('STATE_STORE', 'memory') == 'memory':
+            logger.warning("⚠ Несколько воркеров с STATE_STORE=memory: состояние сессий не будет общим. "
+                           "Используйте STATE_STORE=sqlite:<файл>")
+        if args.workers > 1:
+            # Опрос и отмена задачи /jobs могут попасть в другой воркер - состояние задач должно быть общим
+            job_store = os.environ.get('JOB_STORE')
+            if job_store is None:
+                os.environ['JOB_STORE'] = 'sqlite:generation_jobs.db'
+                logger.info("Фоновые задачи хранятся в generation_jobs.db (JOB_STORE), общем для воркеров")
+            elif job_store == 'memory':
+                logger.error("✗ JOB_STORE=memory работает только с одним воркером: "
+                             "задайте --workers 1 или JOB_STORE=sqlite:<файл>")
+                sys.exit(1)
+        
+        options = {
+            'bind': f"{args.host}:{args.port}",
+            'workers': args.workers,
+            'threads': args.threads,
+            'worker_class': 'gthread',
+            'timeout': args.timeout,
+            'graceful_timeout': args.graceful_timeout,
+            'keepalive': 5,
+            # Каждый воркер сам открывает соединения с Ollama и SQLite
+            'preload_app': False,
+        }
+        logger.info(f"Запуск gunicorn: {args.workers} воркеров x {args.threads} потоков")
+        GunicornApplication(options).run()
+        return
+    
+    try:
+        from waitress import serve
+    except ImportError:
+        logger.error("✗ Для режима prod установите gunicorn (Linux/macOS) или waitress: pip install gunicorn waitress")
+        sys.exit(1)
+    
+    if args.workers > 1:
+        logger.warning("⚠ waitress работает в одном процессе: --workers игнорируется, используются только потоки")
+    # У waitress нет ожидания текущих запросов при остановке - --graceful-timeout не используется
+    logger.info(f"Запуск waitress: {args.threads} потоков")
+    from app import app
+    serve(app, host=args.host, port=args.port, threads=args.threads, channel_timeout=args.timeout)
+
+def main(argv=None):
     """Основная функция запуска"""
     
-    logger = setup_logging()
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'batch':
+        sys.exit(run_batch(parse_batch_args(argv[1:])))
+    
+    args = parse_args(argv)
+    headless = args.headless or args.serve == 'prod'
+    
+    logger = setup_logging(json_format=args.log_format == 'json')
     
     # Проверка зависимостей
     print("\nПроверка зависимостей...")
@@ -131,30 +323,39 @@ def main():
         print("1. Установите Docker")
         print("2. Запустите: sudo docker run -d --gpus=all -v ollama:/root/.ollama -p 57002:11434 --name ollama ollama/ollama")
         print("3. Установите модель: docker exec ollama ollama pull llama3.1:latest")
-        print("\nПродолжить запуск? (y/N): ", end="")
         
-        response = input().lower().strip()
-        if response not in ['y', 'yes', 'да', 'д']:
-            print("Запуск отменен пользователем.")
-            sys.exit(0)
+        if headless:
+            print("\nРежим без интерфейса: продолжаю запуск.")
+        else:
+            print("\nПродолжить запуск? (y/N): ", end="")
+            
+            response = input().lower().strip()
+            if response not in ['y', 'yes', 'да', 'д']:
+                print("Запуск отменен пользователем.")
+                sys.exit(0)
     
     # Запуск веб-сервера
     print("\nЗапуск веб-сервера...")
     
     try:
-        from app import app
-        print("Flask приложение загружено")
-        
         # Определяем URL для открытия
-        url = "http://localhost:5000"
+        url = f"http://localhost:{args.port}"
         
         print(f"\nСистема запущена!")
         print(f"Откройте в браузере: {url}")
         print(f"Для остановки нажмите Ctrl+C")
         print("=" * 60)
         
+        if not headless:
+            threading.Thread(target=open_browser, args=(url,), daemon=True).start()
+        
         # Запуск приложения
-        app.run(debug=False, host='0.0.0.0', port=5000)
+        if args.serve == 'prod':
+            run_production_server(args)
+        else:
+            from app import app
+            print("Flask приложение загружено")
+            app.run(debug=False, host=args.host, port=args.port, threaded=True)
         
     except KeyboardInterrupt:
         print("\n\nЗавершение работы по запросу пользователя...")
@@ -3,6 +3,8 @@ class AbilityGeneratorApp {
         this.abilities = [];
         this.concept = '';
         this.editingAbilityIndex = null;
+        // Концепция и конфигурации последней генерации (см. generateAbilities)
+        this.lastGeneratedConfig = null;
         this.settings = {
             theme: localStorage.getItem('theme') || 'light',
             ollamaUrl: localStorage.getItem('ollamaUrl') || 'http://localhost:57002'
@@ -554,27 +556,38 @@ class AbilityGeneratorApp {
 
         this.showLoading('Генерация способностей...');
         
+        const abilities = this.abilities.map(a => a.config);
+        const generatedConfig = JSON.stringify({ concept, abilities });
+        
         try {
-            const response = await fetch('/generate_abilities', {
+            const response = await fetch('/generate_abilities_stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({
                     concept: concept,
-                    abilities: this.abilities.map(a => a.config),
-                    ollama_url: this.settings.ollamaUrl
+                    abilities: abilities,
+                    ollama_url: this.settings.ollamaUrl,
+                    // Если конфигурация изменилась, неизменённые способности сервер берёт из прошлой генерации;
+                    // повторная генерация без изменений перегенерирует все способности
+                    incremental: this.lastGeneratedConfig !== null && this.lastGeneratedConfig !== generatedConfig
                 })
             });
             
-            const data = await response.json();
-            
-            if (data.status === 'success') {
-                this.showResults(data.abilities);
-                document.getElementById('resultsSection').style.display = 'block';
-            } else {
+            // Ошибки валидации приходят обычным JSON до начала потока
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!contentType.includes('application/x-ndjson')) {
+                const data = await response.json();
                 this.showError(data.message);
+                return;
             }
+            
+            this.prepareResults(this.abilities.length);
+            document.getElementById('resultsSection').style.display = 'block';
+            
+            await this.readEventStream(response, (event) => this.handleGenerationEvent(event));
+            this.lastGeneratedConfig = generatedConfig;
         } catch (error) {
             this.showError('Ошибка при генерации способностей');
         } finally {
@@ -582,47 +595,119 @@ class AbilityGeneratorApp {
         }
     }
 
-    showResults(abilities) {
+    async readEventStream(response, onEvent) {
+        /**
+         * Читает NDJSON-поток: одна строка - одно событие
+         */
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            let newlineIndex;
+            while ((newlineIndex = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newlineIndex).trim();
+                buffer = buffer.slice(newlineIndex + 1);
+                if (line) onEvent(JSON.parse(line));
+            }
+        }
+        
+        if (buffer.trim()) onEvent(JSON.parse(buffer));
+    }
+
+    handleGenerationEvent(event) {
+        switch (event.event) {
+            case 'ability':
+                // Первая готовая способность - убираем затемнение, остальные дорисовываются по мере готовности
+                this.hideLoading();
+                this.renderResultCard(event, event.index);
+                break;
+            case 'progress':
+                this.updateResultsProgress(event.completed, event.total);
+                break;
+            case 'error':
+                this.showError(event.message);
+                break;
+            case 'done':
+                this.updateResultsProgress(event.completed, event.total);
+                break;
+        }
+    }
+
+    prepareResults(total) {
         const container = document.getElementById('abilitiesResults');
         container.innerHTML = '';
         
-        abilities.forEach((ability, index) => {
-            const chartId = `radarChart_${index}`;
-            const keywords = ability.keywords || '';
-            const keywordsHtml = keywords ? `
-                <div class="result-keywords">
-                    <i class="fas fa-tags"></i> <strong>Ключевые слова:</strong> ${keywords}
+        for (let index = 0; index < total; index++) {
+            const placeholder = document.createElement('div');
+            placeholder.className = 'result-ability result-pending';
+            placeholder.id = `resultAbility_${index}`;
+            placeholder.innerHTML = `
+                <h4><i class="fas fa-spinner fa-spin"></i> Способность ${index + 1}</h4>
+                <p>Генерация описания...</p>
+            `;
+            container.appendChild(placeholder);
+        }
+    }
+
+    updateResultsProgress(completed, total) {
+        const loadingText = document.getElementById('loadingText');
+        loadingText.textContent = `Генерация способностей... ${completed}/${total}`;
+    }
+
+    showResults(abilities) {
+        this.prepareResults(abilities.length);
+        abilities.forEach((ability, index) => this.renderResultCard(ability, index));
+    }
+
+    renderResultCard(ability, index) {
+        const container = document.getElementById('abilitiesResults');
+        const chartId = `radarChart_${index}`;
+        const keywords = ability.keywords || '';
+        const keywordsHtml = keywords ? `
+            <div class="result-keywords">
+                <i class="fas fa-tags"></i> <strong>Ключевые слова:</strong> ${keywords}
+            </div>
+        ` : '';
+        
+        const abilityDiv = document.createElement('div');
+        abilityDiv.className = 'result-ability';
+        abilityDiv.id = `resultAbility_${index}`;
+        abilityDiv.innerHTML = `
+            <h4><i class="fas fa-star"></i> ${ability.name}</h4>
+            <p>${ability.description}</p>
+            ${keywordsHtml}
+            <div class="ability-content-wrapper">
+                <div class="ability-params">
+                    <h5>Параметры способности:</h5>
+                    ${Object.entries(ability.parameters).map(([name, data]) => `
+                        <div class="param-item">
+                            <div class="param-name">${name}</div>
+                            <div class="param-values">Значение: ${data.value} - ${data.description}</div>
+                        </div>
+                    `).join('')}
                 </div>
-            ` : '';
-            
-            const abilityDiv = document.createElement('div');
-            abilityDiv.className = 'result-ability';
-            abilityDiv.innerHTML = `
-                <h4><i class="fas fa-star"></i> ${ability.name}</h4>
-                <p>${ability.description}</p>
-                ${keywordsHtml}
-                <div class="ability-content-wrapper">
-                    <div class="ability-params">
-                        <h5>Параметры способности:</h5>
-                        ${Object.entries(ability.parameters).map(([name, data]) => `
-                            <div class="param-item">
-                                <div class="param-name">${name}</div>
-                                <div class="param-values">Значение: ${data.value} - ${data.description}</div>
-                            </div>
-                        `).join('')}
-                    </div>
-                    <div class="radar-chart-container">
-                        <h5><i class="fas fa-compass"></i> Роза ветров параметров</h5>
-                        <canvas id="${chartId}"></canvas>
-                    </div>
+                <div class="radar-chart-container">
+                    <h5><i class="fas fa-compass"></i> Роза ветров параметров</h5>
+                    <canvas id="${chartId}"></canvas>
                 </div>
-                <button class="ability-regenerate" onclick="app.regenerateAbility(${index})">
-                    <i class="fas fa-sync-alt"></i> Перегенерировать описание
-                </button>
-            `;
+            </div>
+            <button class="ability-regenerate" onclick="app.regenerateAbility(${index})">
+                <i class="fas fa-sync-alt"></i> Перегенерировать описание
+            </button>
+        `;
+        
+        const placeholder = document.getElementById(`resultAbility_${index}`);
+        if (placeholder) {
+            container.replaceChild(abilityDiv, placeholder);
+        } else {
             container.appendChild(abilityDiv);
-            this.createRadarChart(chartId, ability.parameters, ability.config);
-        });
+        }
+        this.createRadarChart(chartId, ability.parameters, ability.config);
     }
 
     createRadarChart(chartId, parameters, config) {
@@ -737,7 +822,7 @@ class AbilityGeneratorApp {
             const data = await response.json();
             
             if (data.status === 'success') {
-                this.showResults(data.abilities || [data.ability]);
+                this.renderResultCard(data.ability, index);
                 this.showNotification('Описание способности успешно перегенерировано', 'success');
             } else {
                 this.showError(data.message);
@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+from models.ability_generator import AbilityGenerator
+from models.concurrency_limiter import AdaptiveLimiter, OverloadedError
+
+MAX_WAIT = 10
+
+
+class OverloadedClient:
+    """
+    Клиент LLM, у которого единственный слот лимита занят: первый запрос отклоняется сразу
+    (перегрузка), остальные ждут слот в лимите, как OllamaClient._chat
+    """
+
+    def __init__(self):
+        self.limiter = AdaptiveLimiter(initial_limit=1, max_wait=MAX_WAIT)
+        self.limiter.acquire()
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.waiting = threading.Event()
+
+    def generate_ability_description(self, concept, parameters, keywords='', cancel_event=None, profile=None):
+        with self.lock:
+            self.calls += 1
+            first = self.calls == 1
+        if first:
+            # Остальные запросы уже ждут слот
+            self.waiting.wait(MAX_WAIT)
+            time.sleep(0.2)
+            raise OverloadedError('Ollama overloaded: request queue is full')
+        self.waiting.set()
+        if not self.limiter.acquire(cancel_event.is_set if cancel_event else None):
+            return None
+        self.limiter.release(0.1)
+        return {'name': 'Способность', 'description': 'Описание'}
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_overload_cancels_waiting_requests(batch):
+    client = OverloadedClient()
+    client.plan_ability_batches = lambda concept, items, profile=None: [[index] for index in range(len(items))]
+    generator = AbilityGenerator(client, max_workers=4, batch=batch)
+
+    started = time.monotonic()
+    with pytest.raises(OverloadedError):
+        generator.generate_abilities('маг', [{'parameters': {}} for _ in range(4)])
+    # Ожидающие запросы отменены, а не ждут слот до max_wait
+    assert time.monotonic() - started < MAX_WAIT / 2
@@ -0,0 +1,57 @@
+import itertools
+import time
+
+from models.alternates_pool import AlternatesPool
+
+
+class FakeClient:
+    """
+    Клиент LLM без сервера: каждое описание называет значение параметра, названия не повторяются
+    """
+
+    def __init__(self):
+        self.counter = itertools.count(1)
+
+    def pending_requests(self):
+        return 0
+
+    def generate_ability_description(self, concept, parameters, keywords='', use_cache=True, profile=None):
+        return {'name': f"Способность {next(self.counter)}",
+                'description': f"for value {parameters['power']['value']}"}
+
+
+def ability(value, name='Исходная'):
+    return {'name': name, 'fingerprint': 'same-config', 'parameters': {'power': {'value': value}}}
+
+
+def wait_filled(pool, expected, timeout=5):
+    deadline = time.monotonic() + timeout
+    while pool.stats()['alternates'] < expected:
+        assert time.monotonic() < deadline, pool.stats()
+        time.sleep(0.01)
+
+
+def test_resampled_parameters_reset_alternates():
+    pool = AlternatesPool(size=2)
+    client = FakeClient()
+    pool.prefetch('s', 'маг', [ability(47)], client)
+    wait_filled(pool, 2)
+
+    # Повторная генерация без изменений конфигурации: тот же отпечаток, новые значения
+    pool.prefetch('s', 'маг', [ability(953)], client)
+    alternate = pool.take('s', 0, ability(953), 'маг')
+    assert alternate is None or alternate['description'] == 'for value 953'
+    wait_filled(pool, 2)
+    assert pool.take('s', 0, ability(953), 'маг')['description'] == 'for value 953'
+
+
+def test_shown_name_is_not_served_again():
+    pool = AlternatesPool(size=2)
+    pool.prefetch('s', 'маг', [ability(47)], FakeClient())
+    wait_filled(pool, 2)
+    queued = [alternate['name'] for alternate in pool._sessions['s'][0].alternates]
+
+    # Прямая перегенерация вернула тот же ответ, что лежит в очереди (объединённый single-flight вызов)
+    pool.prefetch('s', 'маг', [ability(47, name=queued[0])], FakeClient())
+    alternate = pool.take('s', 0, ability(47, name=queued[0]), 'маг')
+    assert alternate['name'] == queued[1]
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from models.batch_runner import BatchRecord, BatchRunner, load_records
+
+PROJECT = {'concept': 'Огненный маг', 'abilities': [{'config': {'parameters': {}}}]}
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def test_record_ids_are_relative_to_common_root(tmp_path):
+    paths = [write_json(tmp_path / 'a' / 'hero.json', PROJECT),
+             write_json(tmp_path / 'b' / 'hero.json', [PROJECT, PROJECT])]
+    assert [record.id for record in load_records(paths)] == ['a/hero.json', 'b/hero.json:1', 'b/hero.json:2']
+
+
+def test_single_file_record_id_is_file_name(tmp_path):
+    path = tmp_path / 'heroes.jsonl'
+    path.write_text(json.dumps(PROJECT, ensure_ascii=False) + '\n\n' + json.dumps(PROJECT, ensure_ascii=False),
+                    encoding='utf-8')
+    assert [record.id for record in load_records([str(path)])] == ['heroes.jsonl:1', 'heroes.jsonl:3']
+
+
+def test_duplicate_record_ids_fail(tmp_path):
+    paths = [write_json(tmp_path / 'a' / 'hero.json', dict(PROJECT, id='hero')),
+             write_json(tmp_path / 'b' / 'hero.json', dict(PROJECT, id='hero'))]
+    with pytest.raises(ValueError, match="повторяющийся идентификатор записи 'hero'"):
+        list(load_records(paths))
+
+
+class FakeClient:
+    """
+    Клиент LLM без сервера: описания способностей и персонажа - заданные ответы (None - нет ответа модели)
+    """
+
+    def __init__(self, ability=None, summary=None):
+        self.ability = ability
+        self.summary = summary
+
+    def generate_ability_description(self, concept, parameters, keywords='', cancel_event=None, profile=None):
+        return self.ability
+
+    def generate_character_summary(self, concept, abilities, cancel_event=None, profile=None):
+        return self.summary
+
+
+def run_record(tmp_path, client):
+    out_path = str(tmp_path / 'results.jsonl')
+    record = BatchRecord.from_project('hero', PROJECT)
+    counts = BatchRunner(client, batch=False).run([record], out_path)
+    with open(out_path, encoding='utf-8') as f:
+        return counts, json.loads(f.readline())
+
+
+def test_success_with_model_answers(tmp_path):
+    counts, result = run_record(tmp_path, FakeClient({'name': 'Вспышка', 'description': 'Огонь'}, 'Маг огня'))
+    assert counts['success'] == 1 and result['status'] == 'success'
+
+
+def test_placeholder_abilities_are_errors(tmp_path):
+    # Ollama недоступен: генератор возвращает запасные способности без ответа модели
+    counts, result = run_record(tmp_path, FakeClient(None, 'Маг огня'))
+    assert counts['error'] == 1 and result['status'] == 'error'
+
+
+def test_summary_fallback_is_error(tmp_path):
+    counts, result = run_record(tmp_path, FakeClient({'name': 'Вспышка', 'description': 'Огонь'}, None))
+    assert counts['error'] == 1 and result['status'] == 'error'
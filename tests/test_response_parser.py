@@ -0,0 +1,71 @@
+"""
+Потоковый разбор шаблонного ответа: при любом разбиении ответа на фрагменты
+раннее завершение не должно обрезать описание
+"""
+
+import pytest
+
+from models.response_parser import (
+    ABILITY_PATTERN, SUMMARY_PATTERN, IncrementalTemplateParser, parse_ability, parse_summary
+)
+
+ABILITY_ANSWERS = [
+    "(название:'Огненный вал';описание:'Выпускает волну (как 'пламя') и оглушает врагов')",
+    "(название:'Огненный вал';описание:'Выпускает волну (как 'пламя') и оглушает врагов')\n",
+    "Вот ответ:\n(название: «Пепел»; описание: «Облако пепла ('пыль') слепит»)  \nДополнительный текст",
+]
+SUMMARY_ANSWERS = [
+    "(суммаризация:'Маг огня (и 'пепла') держится на расстоянии')",
+    "(суммаризация:'Маг огня держится на расстоянии')\nещё текст (с 'кавычками')",
+]
+
+
+def stream(text, boundaries, pattern):
+    """
+    Подаёт текст фрагментами, разрезанными по boundaries, как _chat_request:
+    возвращает текст, прочитанный до раннего завершения (или весь текст)
+    """
+    parser = IncrementalTemplateParser(pattern)
+    received = []
+    for start, end in zip((0,) + boundaries, boundaries + (len(text),)):
+        received.append(text[start:end])
+        if parser.feed(text[start:end]):
+            break
+    return ''.join(received)
+
+
+@pytest.mark.parametrize('text', ABILITY_ANSWERS)
+def test_ability_stream_matches_full_parse_at_every_boundary(text):
+    expected = parse_ability(text)
+    assert expected is not None
+    for boundary in range(1, len(text)):
+        assert parse_ability(stream(text, (boundary,), ABILITY_PATTERN)) == expected, boundary
+
+
+@pytest.mark.parametrize('text', SUMMARY_ANSWERS)
+def test_summary_stream_matches_full_parse_at_every_boundary(text):
+    expected = parse_summary(text)
+    assert expected is not None
+    for boundary in range(1, len(text)):
+        assert parse_summary(stream(text, (boundary,), SUMMARY_PATTERN)) == expected, boundary
+
+
+@pytest.mark.parametrize('text', ABILITY_ANSWERS)
+def test_ability_stream_char_by_char(text):
+    assert parse_ability(stream(text, tuple(range(1, len(text))), ABILITY_PATTERN)) == parse_ability(text)
+
+
+def test_inner_quote_at_chunk_end_does_not_stop_early():
+    text = "(название:'Огненный вал';описание:'Выпускает волну (как 'пламя')"
+    parser = IncrementalTemplateParser(ABILITY_PATTERN)
+    assert not parser.feed(text)
+    assert not parser.feed(" и оглушает врагов')")
+    assert parser.feed("\n")
+    assert parse_ability(parser.buffer)['description'] == "Выпускает волну (как 'пламя') и оглушает врагов"
+
+
+def test_stops_early_after_closed_template():
+    text = "(название:'Вал';описание:'Волна огня')\nЛишний текст, который модель продолжает писать"
+    received = stream(text, tuple(range(1, len(text))), ABILITY_PATTERN)
+    assert len(received) < len(text)
+    assert parse_ability(received) == {'name': 'Вал', 'description': 'Волна огня'}
@@ -0,0 +1,80 @@
+"""
+Проверка распределения WeightedSampler: выборки (по одной и массивом NumPy) сравниваются
+критерием хи-квадрат с весами прежнего сэмплера max(1, 10 - |x - mode|) с перебором диапазона
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from models.sampling import WeightedSampler
+
+DRAWS = 200_000
+# Квантиль нормального распределения для уровня значимости 0.001
+Z_0999 = 3.090
+
+
+def reference_probabilities(min_val, mode_val, max_val):
+    """
+    Вероятности значений, как их задавал прежний сэмплер с перебором диапазона
+    """
+    if min_val > max_val:
+        min_val, max_val = max_val, min_val
+    mode_val = max(min_val, min(max_val, mode_val))
+    values = np.arange(min_val, max_val + 1)
+    weights = np.array([max(1, 10 - abs(value - mode_val)) for value in values], dtype=np.float64)
+    return values, weights / weights.sum()
+
+
+def chi_square_critical(df):
+    """
+    Критическое значение хи-квадрат (уровень 0.001), приближение Уилсона - Хилферти
+    """
+    h = 2 / (9 * df)
+    return df * (1 - h + Z_0999 * np.sqrt(h)) ** 3
+
+
+def assert_matches_reference(samples, min_val, mode_val, max_val):
+    values, probabilities = reference_probabilities(min_val, mode_val, max_val)
+    samples = np.asarray(samples)
+    assert samples.min() >= values[0] and samples.max() <= values[-1]
+    if len(values) == 1:
+        assert np.all(samples == values[0])
+        return
+    observed = np.bincount(samples - values[0], minlength=len(values))
+    expected = probabilities * len(samples)
+    statistic = float(((observed - expected) ** 2 / expected).sum())
+    assert statistic < chi_square_critical(len(values) - 1), statistic
+
+
+CASES = [
+    pytest.param(1, 5, 20, id='mode-inside'),
+    pytest.param(0, 500, 1000, id='wide-range'),
+    pytest.param(20, 5, 1, id='reversed-bounds'),
+    pytest.param(1, 1, 30, id='mode-at-min'),
+    pytest.param(1, 30, 30, id='mode-at-max'),
+    pytest.param(3, 100, 12, id='mode-outside-range'),
+    pytest.param(7, 7, 7, id='min-equals-max'),
+]
+
+
+@pytest.mark.parametrize('min_val, mode_val, max_val', CASES)
+def test_probabilities_match_reference(min_val, mode_val, max_val):
+    _, expected = reference_probabilities(min_val, mode_val, max_val)
+    np.testing.assert_allclose(WeightedSampler(min_val, mode_val, max_val).probabilities(), expected)
+
+
+@pytest.mark.parametrize('min_val, mode_val, max_val', CASES)
+def test_scalar_draws_match_reference(min_val, mode_val, max_val):
+    sampler = WeightedSampler(min_val, mode_val, max_val)
+    rng = random.Random(12345)
+    assert_matches_reference([sampler.sample(rng) for _ in range(DRAWS)], min_val, mode_val, max_val)
+
+
+@pytest.mark.parametrize('min_val, mode_val, max_val', CASES)
+def test_array_draws_match_reference(min_val, mode_val, max_val):
+    sampler = WeightedSampler(min_val, mode_val, max_val)
+    samples = sampler.sample_array(DRAWS, np.random.default_rng(12345))
+    assert samples.dtype == np.int64 and samples.shape == (DRAWS,)
+    assert_matches_reference(samples, min_val, mode_val, max_val)